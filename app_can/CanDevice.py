@@ -1,63 +1,206 @@
-﻿import time
+﻿import enum
+import threading
+import time
 import logging
-from ctypes import c_char_p, c_float
-from dataclasses import dataclass
+from collections.abc import Callable, Iterable
+from ctypes import addressof, c_bool, c_char_p, c_float, c_void_p, cast, memmove, memset
+from dataclasses import dataclass, field
 
-from PySide6.QtCore import Signal, Slot, QObject
+from PySide6.QtCore import Signal, Slot, QObject, QTimer, QMetaMethod, Qt
 
-from libTSCANAPI import tsapp_configure_baudrate_can, tscan_scan_devices, tscan_get_device_info, s32, size_t, \
+from app_can.CanFrame import CanFrame
+from app_can.FifoReceiver import FifoReceiver
+from app_can.RxRingBuffer import RxRingBuffer
+from app_can.TraceRecorder import TraceRecorder
+from app_can.TscanApi import tsapp_configure_baudrate_can, tscan_scan_devices, tscan_get_device_info, s32, size_t, \
     tsapp_disconnect_by_handle, tsapp_connect, tsapp_register_event_can_whandle, OnTx_RxFUNC_CAN_WHandle, \
     DLC_DATA_BYTE_CNT, TLIBCAN, tsapp_delete_cyclic_msg_can, tsapp_add_cyclic_msg_can, tsapp_transmit_can_async, \
-    tsapp_transmit_can_sync, tsapp_unregister_event_can_whandle
+    tsapp_transmit_can_sync, tsapp_unregister_event_can_whandle, tscan_get_can_channel_count, dll
 
 LOGGER = logging.getLogger(__name__)
 
 
+def _bind_pass_filter_functions():
+    """
+    Привязка функций аппаратного фильтра приёма CAN.
+    В обёртке libTSCANAPI tsfifo_add_can_canfd_pass_filter переопределяется несколько раз подряд
+    (итоговая сигнатура без флага стандартного кадра), а функция удаления фильтра не привязана,
+    поэтому берём обе функции из DLL заново
+    :return: (add, delete) или (None, None), если библиотека их не экспортирует или не загружена
+    """
+    if dll is None:
+        return None, None
+    try:
+        add_filter = dll["tsfifo_add_can_canfd_pass_filter"]
+        delete_filter = dll["tsfifo_delete_can_canfd_pass_filter"]
+    except (AttributeError, OSError):
+        return None, None
+
+    add_filter.argtypes = [size_t, s32, s32, c_bool]
+    add_filter.restype = s32
+    delete_filter.argtypes = [size_t, s32, s32]
+    delete_filter.restype = s32
+    return add_filter, delete_filter
+
+
 @dataclass
 class DeviceInfo:
-    manufacturer: c_char_p = c_char_p()
-    product: c_char_p = c_char_p()
-    serial: c_char_p = c_char_p()
+    manufacturer: c_char_p = field(default_factory=c_char_p)
+    product: c_char_p = field(default_factory=c_char_p)
+    serial: c_char_p = field(default_factory=c_char_p)
+
+
+class CanReceiveMode(enum.Enum):
+    CALLBACK = 0  # callback драйвера на каждый принятый кадр
+    FIFO = 1  # пакетное чтение FIFO адаптера в отдельном потоке
 
 
 class CanDevice(QObject):
+    # Кольцо переиспользуемых TLIBCAN для send_async/send_sync/send_frame
+    TX_POOL_SIZE = 64
+    # Период пакетной отправки эха TX кадров в UI, мс
+    TX_ECHO_INTERVAL_MS = 50
+    # Буфер принятых кадров между потоком драйвера и циклом событий Qt
+    RX_RING_CAPACITY = 8192
+    RX_BATCH_SIZE = 512
+    RX_DRAIN_INTERVAL_MS = 1
+    # Режим FIFO: кадров за одно чтение и пауза опроса при пустом FIFO, мс
+    FIFO_READ_SIZE = 256
+    FIFO_POLL_INTERVAL_MS = 1
+
     _instance = None
+    # Устройства станции по ключу (индекс адаптера, канал) и общие подключения адаптеров по серийному номеру
+    _registry: dict[tuple[int, int], "CanDevice"] = {}
+    _adapter_connections: dict[bytes, list] = {}  # serial -> [handle, количество пользователей]
+    _registry_lock = threading.Lock()
+
+    signal_new_frame = Signal(object)  # CanFrame принятого кадра
+    # Строковое представление принятого кадра, оставлено для совместимости:
+    # формируется только при наличии подключенных слотов
     signal_new_message = Signal(str, str, str, str, list)
+    signal_tx_echo = Signal(list)  # [CanFrame, ...] отправленные TX кадры пачкой
+    signal_rx_overflow = Signal(int)  # общее количество кадров, потерянных при переполнении RX буфера
+    _signal_rx_pending = Signal()
     signal_tracing_started = Signal()
     signal_tracing_stopped = Signal()
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(CanDevice, cls).__new__(cls)
-        return cls._instance
-
-    def __init__(self):
-        if not hasattr(self, "_initialized"):
-            super(CanDevice, self).__init__()
-
-            self._initialized = True
-
-            self._devices = s32(0)
-
-            self._device_info: DeviceInfo = DeviceInfo()
-            self._hardware_handle = size_t(0)
-            self._is_connect: bool = False
-            self._is_trace: bool = False
+    def __init__(self, device_index: int = -1, channel: int = -1):
+        """
+        :param device_index: индекс адаптера из tscan_scan_devices (-1 - выбирается при подключении)
+        :param channel: индекс канала CAN адаптера (-1 - задаётся при запуске trace)
+        """
+        super(CanDevice, self).__init__()
 
-            self._channel: int = -1
-            self._baud_rate: int = -1
-            self._terminator: bool = False
+        self._device_index = device_index
+        self._devices = s32(0)
 
-            self._can_tx_start_time = time.perf_counter()
-            self._refresh_time: float = 0.1
-            self._message_handler = OnTx_RxFUNC_CAN_WHandle(self._event_handler)
+        self._device_info: DeviceInfo = DeviceInfo()
+        self._hardware_handle = size_t(0)
+        self._is_connect: bool = False
+        self._is_trace: bool = False
+
+        self._channel: int = channel
+        self._baud_rate: int = -1
+        self._terminator: bool = False
+
+        self._can_tx_start_time = time.perf_counter()
+        self._refresh_time: float = 0.1
+        self._message_handler = OnTx_RxFUNC_CAN_WHandle(self._event_handler)
+
+        self._tx_pool = (TLIBCAN * self.TX_POOL_SIZE)()
+        self._tx_pool_index = 0
+        self._tx_data_offset = TLIBCAN.FData.offset
+
+        self._tx_echo_enabled = True
+        self._tx_echo_queue: list[CanFrame] = []
+        self._tx_echo_timer = QTimer(self)
+        self._tx_echo_timer.setSingleShot(True)
+        self._tx_echo_timer.setInterval(self.TX_ECHO_INTERVAL_MS)
+        self._tx_echo_timer.timeout.connect(self._flush_tx_echo)
+
+        self._legacy_message_receivers = 0
+
+        # Callback драйвера только копирует кадр в кольцо и, если пробуждение ещё не запрошено,
+        # ставит одно событие в очередь Qt; кадры разбираются пачками в потоке Qt
+        self._rx_ring = RxRingBuffer(self.RX_RING_CAPACITY)
+        self._rx_batch_size = self.RX_BATCH_SIZE
+        self._rx_wakeup_pending = False
+        self._rx_reported_overflow = 0
+        self._rx_drain_timer = QTimer(self)
+        self._rx_drain_timer.setSingleShot(True)
+        self._rx_drain_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._rx_drain_interval_ms = self.RX_DRAIN_INTERVAL_MS
+        self._rx_drain_timer.timeout.connect(self._drain_rx_ring)
+        self._signal_rx_pending.connect(self._on_rx_pending, Qt.ConnectionType.QueuedConnection)
+
+        self._receive_mode = CanReceiveMode.CALLBACK
+        self._fifo_receiver: FifoReceiver | None = None
+
+        # Аппаратные фильтры приёма: запрошенные владельцами и фактически установленные в адаптере
+        self._pass_filter_add, self._pass_filter_delete = _bind_pass_filter_functions()
+        self._pass_filter_requests: dict[object, frozenset[int]] = {}
+        self._pass_filters_installed: set[int] = set()
+
+        # Программная диспетчеризация принятых кадров по идентификатору
+        self._subscribers: dict[int, list[Callable[[CanFrame], None]]] = {}
+        # Подтверждения отправки: TX кадры этих идентификаторов из callback драйвера (кадр ушёл в шину)
+        self._tx_confirm_subscribers: dict[int, list[Callable[[CanFrame], None]]] = {}
+
+        # Запись принятых и отправленных кадров в файл (TraceRecorder)
+        self._recorder: TraceRecorder | None = None
 
     @classmethod
     def instance(cls):
+        """
+        Устройство основного окна (адаптер и канал выбираются пользователем)
+        """
         if cls._instance is None:
             cls._instance = CanDevice()
         return cls._instance
 
+    @classmethod
+    def set_instance(cls, device: "CanDevice"):
+        """
+        Замена устройства основного окна (например, на воспроизведение записи ReplayCanDevice);
+        вызывается до создания AppController
+        """
+        cls._instance = device
+
+    @classmethod
+    def for_channel(cls, device_index: int, channel: int) -> "CanDevice":
+        """
+        Устройство для канала адаптера из реестра станции; создаётся при первом обращении
+        в потоке вызывающего (таймеры и разбор RX работают в цикле событий этого потока)
+        :param device_index: индекс адаптера
+        :param channel: индекс канала CAN
+        """
+        key = (int(device_index), int(channel))
+        with cls._registry_lock:
+            device = cls._registry.get(key)
+            if device is None:
+                device = CanDevice(*key)
+                cls._registry[key] = device
+            return device
+
+    @classmethod
+    def release(cls, device: "CanDevice"):
+        """
+        Удаление устройства из реестра (после stop_trace и disconnect_device)
+        """
+        with cls._registry_lock:
+            for key, registered in list(cls._registry.items()):
+                if registered is device:
+                    del cls._registry[key]
+
+    @classmethod
+    def registered(cls) -> list["CanDevice"]:
+        with cls._registry_lock:
+            return list(cls._registry.values())
+
+    @property
+    def device_index(self) -> int:
+        return self._device_index
+
     @property
     def is_trace(self) -> bool:
         return self._is_trace
@@ -66,6 +209,179 @@ class CanDevice(QObject):
     def is_trace(self, state: bool):
         self._is_trace = state
 
+    def connectNotify(self, signal: QMetaMethod):
+        if signal.name() == b"signal_new_message":
+            self._legacy_message_receivers += 1
+        super().connectNotify(signal)
+
+    def disconnectNotify(self, signal: QMetaMethod):
+        if signal.name() == b"signal_new_message":
+            self._legacy_message_receivers = max(self._legacy_message_receivers - 1, 0)
+        super().disconnectNotify(signal)
+
+    @property
+    def pass_filters_supported(self) -> bool:
+        return self._pass_filter_add is not None
+
+    @property
+    def pass_filters(self) -> set[int]:
+        return set(self._pass_filters_installed)
+
+    def set_pass_filters(self, owner: object, identifiers: Iterable[int]):
+        """
+        Установка аппаратных фильтров приёма для владельца. Адаптер пропускает объединение
+        идентификаторов всех владельцев; пустой набор у всех владельцев снимает фильтрацию
+        :param owner: владелец набора (например, канал ISO-TP)
+        :param identifiers: расширенные идентификаторы CAN, которые должны проходить фильтр
+        """
+        values = frozenset(int(iden) & 0x1FFFFFFF for iden in identifiers)
+        if values:
+            self._pass_filter_requests[owner] = values
+        else:
+            self._pass_filter_requests.pop(owner, None)
+        self._apply_pass_filters()
+
+    def clear_pass_filters(self, owner: object):
+        self.set_pass_filters(owner, ())
+
+    def _requested_pass_filters(self) -> set[int]:
+        requested: set[int] = set()
+        for values in self._pass_filter_requests.values():
+            requested |= values
+        return requested
+
+    def _apply_pass_filters(self):
+        if not self._is_trace or not self._can_transmit():
+            return
+        if self._pass_filter_add is None:
+            if self._pass_filter_requests:
+                LOGGER.warning("Аппаратные фильтры приёма не поддерживаются библиотекой адаптера")
+            return
+
+        requested = self._requested_pass_filters()
+        for iden in self._pass_filters_installed - requested:
+            self._pass_filter_delete(self._hardware_handle, self._channel, iden)
+            self._pass_filters_installed.discard(iden)
+        for iden in requested - self._pass_filters_installed:
+            ret = self._pass_filter_add(self._hardware_handle, self._channel, iden, False)
+            if ret == 0:
+                self._pass_filters_installed.add(iden)
+            else:
+                LOGGER.error(f"Ошибка установки фильтра приёма 0x{iden:08X}: {ret}")
+
+    def _remove_pass_filters(self):
+        if self._pass_filter_delete is None or not self._can_transmit():
+            self._pass_filters_installed.clear()
+            return
+        for iden in self._pass_filters_installed:
+            self._pass_filter_delete(self._hardware_handle, self._channel, iden)
+        self._pass_filters_installed.clear()
+
+    def subscribe(self, identifier: int, handler: Callable[[CanFrame], None]):
+        """
+        Подписка на принятые кадры с заданным идентификатором
+        :param identifier: идентификатор CAN
+        :param handler: вызывается в потоке Qt для каждого кадра
+        """
+        handlers = self._subscribers.setdefault(int(identifier) & 0x1FFFFFFF, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def unsubscribe(self, identifier: int, handler: Callable[[CanFrame], None]):
+        key = int(identifier) & 0x1FFFFFFF
+        handlers = self._subscribers.get(key)
+        if handlers is None:
+            return
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            del self._subscribers[key]
+
+    def subscribe_tx_confirmation(self, identifier: int, handler: Callable[[CanFrame], None]):
+        """
+        Подписка на подтверждения отправки кадров с заданным идентификатором
+        (только при tx_confirmation_supported)
+        :param handler: вызывается в потоке Qt, когда адаптер сообщил об отправке кадра в шину
+        """
+        handlers = self._tx_confirm_subscribers.setdefault(int(identifier) & 0x1FFFFFFF, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def unsubscribe_tx_confirmation(self, identifier: int, handler: Callable[[CanFrame], None]):
+        key = int(identifier) & 0x1FFFFFFF
+        handlers = self._tx_confirm_subscribers.get(key)
+        if handler in (handlers or ()):
+            handlers.remove(handler)
+        if handlers is not None and not handlers:
+            del self._tx_confirm_subscribers[key]
+
+    @property
+    def tx_confirmation_supported(self) -> bool:
+        """
+        Подтверждения отправки приходят только через callback драйвера; в режиме FIFO отправка
+        считается выполненной, когда адаптер принял кадр в очередь
+        """
+        return self._receive_mode == CanReceiveMode.CALLBACK
+
+    @property
+    def receive_mode(self) -> CanReceiveMode:
+        return self._receive_mode
+
+    @property
+    def rx_overflow_count(self) -> int:
+        return self._rx_ring.overflow_count
+
+    @property
+    def rx_pending_count(self) -> int:
+        return len(self._rx_ring)
+
+    def configure_rx_buffer(self, capacity: int | None = None, batch_size: int | None = None,
+                            drain_interval_ms: int | None = None) -> bool:
+        """
+        Настройка буфера принятых кадров
+        :param capacity: ёмкость кольца, кадров (меняется только при остановленном trace)
+        :param batch_size: максимальное количество кадров, разбираемых за один проход
+        :param drain_interval_ms: задержка разбора после прихода первого кадра пачки, мс
+        :return: False, если ёмкость нельзя изменить во время trace
+        """
+        if batch_size is not None:
+            self._rx_batch_size = max(int(batch_size), 1)
+        if drain_interval_ms is not None:
+            self._rx_drain_interval_ms = max(int(drain_interval_ms), 0)
+        if capacity is not None and int(capacity) != self._rx_ring.capacity:
+            if self._is_trace:
+                LOGGER.warning("Ёмкость RX буфера нельзя изменить во время trace")
+                return False
+            self._rx_ring = RxRingBuffer(capacity)
+            self._rx_reported_overflow = 0
+        return True
+
+    @property
+    def recorder(self) -> TraceRecorder | None:
+        return self._recorder
+
+    def set_recorder(self, recorder: TraceRecorder | None):
+        """
+        Подключение записи кадров в файл: принятые кадры передаются пачками из разбора кольца приёма,
+        отправленные - по одному; упаковка и запись выполняются потоком TraceRecorder
+        :param recorder: запущенный TraceRecorder или None - отключить запись
+        """
+        self._recorder = recorder
+
+    @property
+    def tx_echo_enabled(self) -> bool:
+        return self._tx_echo_enabled
+
+    def set_tx_echo(self, enabled: bool):
+        """
+        Включение пакетного эха отправленных кадров (signal_tx_echo) для отображения в UI
+        :param enabled: False - отправленные кадры не копируются и не передаются в UI
+        """
+        self._tx_echo_enabled = bool(enabled)
+        if not self._tx_echo_enabled:
+            self._tx_echo_timer.stop()
+            self._tx_echo_queue = []
+
     @property
     def channel(self) -> int:
         return self._channel
@@ -107,9 +423,12 @@ class CanDevice(QObject):
         self._is_connect = state
 
     def disconnect_device(self) -> bool:
+        if self._fifo_receiver is not None:
+            self._stop_fifo_receiver()
         if self._is_connect:
             try:
-                tsapp_disconnect_by_handle(self._hardware_handle)
+                if self._release_adapter_connection():
+                    tsapp_disconnect_by_handle(self._hardware_handle)
                 self.is_connect = False
                 LOGGER.info("Успешное отключение CAN-устройства")
             except Exception as err:
@@ -117,6 +436,53 @@ class CanDevice(QObject):
             finally:
                 return not self._is_connect
 
+    def _acquire_adapter_connection(self) -> int:
+        """
+        Подключение к адаптеру, общее для всех его каналов: при повторном подключении
+        используется уже открытый handle
+        :return: код возврата tsapp_connect (0 - успех)
+        """
+        serial = self.device_info.serial.value or b""
+        with CanDevice._registry_lock:
+            connection = CanDevice._adapter_connections.get(serial)
+            if connection is not None:
+                self._hardware_handle.value = connection[0]
+                connection[1] += 1
+                return 0
+            ret = tsapp_connect(self.device_info.serial, self._hardware_handle)
+            if ret == 0 or ret == 5:
+                CanDevice._adapter_connections[serial] = [self._hardware_handle.value, 1]
+            return ret
+
+    def _release_adapter_connection(self) -> bool:
+        """
+        :return: True, если это было последнее использование подключения и адаптер нужно отключить
+        """
+        serial = self.device_info.serial.value or b""
+        with CanDevice._registry_lock:
+            connection = CanDevice._adapter_connections.get(serial)
+            if connection is None:
+                return True
+            connection[1] -= 1
+            if connection[1] > 0:
+                return False
+            del CanDevice._adapter_connections[serial]
+            return True
+
+    def channel_count(self) -> int:
+        """
+        Количество каналов CAN подключенного адаптера
+        """
+        if not self._can_transmit():
+            return 0
+        count = s32(0)
+        try:
+            ret = tscan_get_can_channel_count(self._hardware_handle, count)
+        except Exception as err:
+            LOGGER.error(f"CanDevice.channel_count(): {err}")
+            return 0
+        return count.value if ret == 0 else 0
+
     def _register_receive_event(self) -> bool:
         if self._hardware_handle.value == 0 or self._message_handler is None:
             return False
@@ -156,8 +522,8 @@ class CanDevice(QObject):
                 success = False
             if self.device_info.serial.value is None:
                 self.update_device_info(device_index)
-            ret = tsapp_connect(self.device_info.serial,
-                                self._hardware_handle)
+            self._device_index = device_index
+            ret = self._acquire_adapter_connection()
             if ret == 0 or ret == 5:
                 self.is_connect = True
             else:
@@ -191,13 +557,24 @@ class CanDevice(QObject):
             self._devices = s32(0)
         return self._devices
 
-    def start_trace(self, channel: int, baud_rate: int, terminator: bool):
+    def start_trace(self, channel: int, baud_rate: int, terminator: bool,
+                    receive_mode: CanReceiveMode = CanReceiveMode.CALLBACK):
+        """
+        Запуск отслеживания сообщений
+        :param channel: индекс канала адаптера
+        :param baud_rate: скорость, кбит/с
+        :param terminator: включить терминатор
+        :param receive_mode: CALLBACK - callback драйвера на кадр, FIFO - пакетное чтение в отдельном потоке
+        """
         if self._is_trace:
             return
         self.channel = channel
         self.baud_rate = baud_rate
         self.terminator = terminator
-        self._register_receive_event()
+        self._receive_mode = receive_mode
+        self._rx_ring.clear()
+        if receive_mode == CanReceiveMode.CALLBACK:
+            self._register_receive_event()
         ret = tsapp_configure_baudrate_can(self._hardware_handle,
                                            self.channel,
                                            self.baud_rate,
@@ -205,6 +582,9 @@ class CanDevice(QObject):
         if ret == 0 or ret == 5:
             LOGGER.info("Запуск отслеживания сообщений")
             self.is_trace = True
+            self._apply_pass_filters()
+            if receive_mode == CanReceiveMode.FIFO:
+                self._start_fifo_receiver()
 
             self.signal_tracing_started.emit()
         else:
@@ -212,30 +592,98 @@ class CanDevice(QObject):
 
     def stop_trace(self):
         if self.is_trace:
-            self._unregister_receive_event()
+            self._remove_pass_filters()
+            if self._receive_mode == CanReceiveMode.FIFO:
+                if self._fifo_receiver is not None:
+                    self._stop_fifo_receiver()
+            else:
+                self._unregister_receive_event()
             self.is_trace = False
 
         self.signal_tracing_stopped.emit()
 
+    def _start_fifo_receiver(self):
+        self._fifo_receiver = FifoReceiver(self._hardware_handle,
+                                           self._channel,
+                                           self._rx_ring,
+                                           self._notify_rx,
+                                           self.FIFO_READ_SIZE,
+                                           self.FIFO_POLL_INTERVAL_MS)
+        self._fifo_receiver.start()
+
+    def _stop_fifo_receiver(self):
+        self._fifo_receiver.stop()
+        self._fifo_receiver = None
+
     def _event_handler(self, obj, a_can):
-        # 1 - error frame
-        if a_can.contents.FProperties & 0x80:
+        # Выполняется в потоке драйвера: только копирование в кольцо, без разбора кадра
+        # [7] 1 - error frame; [0] 1 - TX.
+        # TX кадры для UI передаются пачками через signal_tx_echo, поэтому из callback берём только RX
+        # и TX кадры идентификаторов, отправка которых ожидает подтверждения.
+        properties = a_can.contents.FProperties
+        if properties & 0x80:
             return
-
-        msg = a_can.contents
-        _time = str(float(msg.FTimeUs) / 1000000.0)
-        _id = str(hex(msg.FIdentifier))
-        _data_len_code = str(msg.FDLC)
-        _data_len = DLC_DATA_BYTE_CNT[msg.FDLC]
-        _dir = 'Tx' if (msg.FProperties & 1) == 1 else 'Rx'
-        _data = [msg.FData[i] for i in range(_data_len)]
-
-        # TX кадры для UI логируются явно в send_async/send_sync.
-        # Из callback оставляем только RX, чтобы избежать дублей.
-        if _dir == 'Tx':
+        if properties & 0x01 and (a_can.contents.FIdentifier & 0x1FFFFFFF) not in self._tx_confirm_subscribers:
+            return
+        # Callback зарегистрирован на весь адаптер: кадры других каналов обрабатывают их устройства
+        if self._channel >= 0 and a_can.contents.FIdxChn != self._channel:
             return
 
-        self.signal_new_message.emit(_time, _id, _dir, _data_len_code, _data)
+        self._rx_ring.push(cast(a_can, c_void_p).value)
+        self._notify_rx()
+
+    def _notify_rx(self):
+        # Вызывается из потока драйвера или потока FIFO
+        if not self._rx_wakeup_pending:
+            self._rx_wakeup_pending = True
+            self._signal_rx_pending.emit()
+
+    @Slot()
+    def _on_rx_pending(self):
+        if not self._rx_drain_timer.isActive():
+            self._rx_drain_timer.start(self._rx_drain_interval_ms)
+
+    def _drain_rx_ring(self):
+        # Сбрасываем флаг до чтения: кадр, пришедший во время разбора, запросит новое пробуждение
+        self._rx_wakeup_pending = False
+        frames = self._rx_ring.pop_batch(self._rx_batch_size)
+        if self._recorder is not None:
+            # Подтверждения отправки уже записаны как TX в _record_tx
+            self._recorder.record_many([frame for frame in frames if not frame.is_tx]
+                                       if self._tx_confirm_subscribers else frames)
+
+        for frame in frames:
+            if frame.flags & 0x01:
+                self._dispatch_tx_confirmation(frame)
+            else:
+                self._dispatch_frame(frame)
+
+        if len(self._rx_ring) > 0:
+            # Пачка ограничена batch_size, остаток разбираем в следующем проходе цикла событий
+            self._rx_drain_timer.start(0)
+
+        overflow = self._rx_ring.overflow_count
+        if overflow != self._rx_reported_overflow:
+            LOGGER.warning(f"Переполнение RX буфера: потеряно кадров {overflow - self._rx_reported_overflow}")
+            self._rx_reported_overflow = overflow
+            self.signal_rx_overflow.emit(overflow)
+
+    def _dispatch_tx_confirmation(self, frame: CanFrame):
+        handlers = self._tx_confirm_subscribers.get(frame.identifier)
+        if handlers:
+            for handler in tuple(handlers):
+                handler(frame)
+
+    def _dispatch_frame(self, frame: CanFrame):
+        handlers = self._subscribers.get(frame.identifier)
+        if handlers:
+            for handler in tuple(handlers):
+                handler(frame)
+
+        self.signal_new_frame.emit(frame)
+        if self._legacy_message_receivers > 0:
+            self.signal_new_message.emit(str(frame.timestamp), hex(frame.identifier), 'Rx', str(frame.dlc),
+                                         list(frame.data))
 
     def _create_message(self, iden: int, dlc: int, data: list[int]) -> TLIBCAN | None:
         # [7] 0 - normal frame, 1 - error frame
@@ -257,6 +705,36 @@ class CanDevice(QObject):
                        FData=data,
                        FProperties=properties)
 
+    def create_frames(self, iden: int, count: int, dlc: int = 8):
+        """
+        Предвыделенный массив TLIBCAN с заполненным заголовком TX кадра.
+        Данные (FData) заполняются вызывающей стороной, например через ctypes.memmove
+        :param iden: идентификатор CAN
+        :param count: количество кадров
+        :param dlc: длина данных кадра
+        :return: массив (TLIBCAN * count)
+        """
+        frames = (TLIBCAN * count)()
+        properties = 0x1 | 0x4  # TX, extended frame
+        for frame in frames:
+            frame.FIdxChn = max(self._channel, 0)
+            frame.FProperties = properties
+            frame.FDLC = dlc
+            frame.FIdentifier = iden
+        return frames
+
+    def transmit(self, message: TLIBCAN, timeout: int | None = None):
+        """
+        Отправка заранее подготовленного кадра без создания нового TLIBCAN
+        :param message: кадр (например, элемент массива из create_frames)
+        :param timeout: таймаут подтверждения отправки, мс; None - асинхронная отправка
+        :return: код возврата TSCAN API или None, если устройство не подключено
+        """
+        if not self._can_transmit():
+            return None
+        message.FIdxChn = self._channel
+        return self._transmit_message(message, timeout)
+
     def send_cyclic(self, iden: int, dlc: int, data: list[int], timeout: int) -> TLIBCAN | None:
         if self._hardware_handle is None or self._hardware_handle.value == 0:
             return None
@@ -273,42 +751,78 @@ class CanDevice(QObject):
             return
         return tsapp_delete_cyclic_msg_can(self._hardware_handle, message)
 
+    def _next_tx_message(self, iden: int, dlc: int) -> TLIBCAN:
+        # Кадр из кольца: асинхронно отправленный кадр не перезаписывается до TX_POOL_SIZE следующих
+        message = self._tx_pool[self._tx_pool_index]
+        self._tx_pool_index = (self._tx_pool_index + 1) % self.TX_POOL_SIZE
+        message.FIdxChn = self._channel
+        message.FProperties = 0x1 | 0x4  # TX, extended frame
+        message.FDLC = dlc
+        message.FIdentifier = iden
+        return message
+
+    def _transmit_message(self, message: TLIBCAN, timeout: int | None):
+        if timeout is None:
+            ret = tsapp_transmit_can_async(self._hardware_handle, message)
+        else:
+            ret = tsapp_transmit_can_sync(self._hardware_handle, message, timeout)
+        self._record_tx(message)
+        return ret
+
+    def _record_tx(self, message: TLIBCAN):
+        # Отправленный кадр: в файл записи и в очередь эха для UI
+        if self._tx_echo_enabled or self._recorder is not None:
+            data_len = DLC_DATA_BYTE_CNT[message.FDLC]
+            frame = CanFrame(int(time.perf_counter() * 1000000), int(message.FIdentifier),
+                             int(message.FProperties), int(message.FDLC), bytes(message.FData)[:data_len])
+            if self._recorder is not None:
+                self._recorder.record(frame)
+            if self._tx_echo_enabled:
+                self._tx_echo_queue.append(frame)
+                if not self._tx_echo_timer.isActive():
+                    self._tx_echo_timer.start()
+
+    def _flush_tx_echo(self):
+        if not self._tx_echo_queue:
+            return
+        batch = self._tx_echo_queue
+        self._tx_echo_queue = []
+        self.signal_tx_echo.emit(batch)
+
+    def _can_transmit(self) -> bool:
+        return self._hardware_handle is not None and self._hardware_handle.value != 0 and self._channel != -1
+
+    def send_frame(self, iden: int, data: bytes | bytearray | memoryview, timeout: int | None = None):
+        """
+        Быстрая отправка кадра: данные копируются в FData кадра из кольца через ctypes.memmove
+        :param iden: идентификатор CAN
+        :param data: данные кадра (до 8 байт)
+        :param timeout: таймаут подтверждения отправки, мс; None - асинхронная отправка
+        :return: код возврата TSCAN API или None, если устройство не подключено
+        """
+        if not self._can_transmit():
+            return None
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        length = min(len(data), 8)
+        message = self._next_tx_message(iden, length)
+        memmove(addressof(message) + self._tx_data_offset, data, length)
+        return self._transmit_message(message, timeout)
+
+    def _fill_message(self, iden: int, dlc: int, data: list[int]) -> TLIBCAN:
+        message = self._next_tx_message(iden, dlc)
+        payload_len = min(max(int(dlc), 0), len(data), 8)
+        memset(addressof(message) + self._tx_data_offset, 0, 8)
+        message.FData[:payload_len] = [int(data[i]) & 0xFF for i in range(payload_len)]
+        return message
+
     @Slot(int, int, list)
     def send_async(self, iden: int, dlc: int, data: list[int]):
-        if self._hardware_handle is None or self._hardware_handle.value == 0:
+        if not self._can_transmit():
             return
-        message: TLIBCAN = self._create_message(iden, dlc, data)
-        if message is None:
-            return
-        ret = tsapp_transmit_can_async(self._hardware_handle, message)
-
-        # Явно логируем TX кадр для UI независимо от режима trace.
-        payload_len = min(max(int(dlc), 0), len(data))
-        payload = [int(data[i]) & 0xFF for i in range(payload_len)]
-        self.signal_new_message.emit(
-            f"{time.perf_counter():.6f}",
-            hex(int(iden) & 0x1FFFFFFF),
-            "Tx",
-            str(int(dlc)),
-            payload,
-        )
-
-        return ret
+        return self._transmit_message(self._fill_message(iden, dlc, data), None)
 
     def send_sync(self, iden: int, dlc: int, data: list[int], timeout: int):
-        if self._hardware_handle is None or self._hardware_handle.value == 0:
+        if not self._can_transmit():
             return
-        message: TLIBCAN = self._create_message(iden, dlc, data)
-        ret = tsapp_transmit_can_sync(self._hardware_handle, message, timeout)
-
-        payload_len = min(max(int(dlc), 0), len(data))
-        payload = [int(data[i]) & 0xFF for i in range(payload_len)]
-        self.signal_new_message.emit(
-            f"{time.perf_counter():.6f}",
-            hex(int(iden) & 0x1FFFFFFF),
-            "Tx",
-            str(int(dlc)),
-            payload,
-        )
-
-        return ret
+        return self._transmit_message(self._fill_message(iden, dlc, data), timeout)
@@ -0,0 +1,36 @@
+from typing import NamedTuple
+
+from app_can.TscanApi import DLC_DATA_BYTE_CNT, TLIBCAN
+
+
+class CanFrame(NamedTuple):
+    """
+    Компактная запись CAN кадра без преобразования полей в строки
+    """
+    timestamp_us: int  # метка времени адаптера (RX) или perf_counter (TX), мкс
+    identifier: int
+    flags: int  # FProperties: [7] error frame, [2] extended frame, [1] remote frame, [0] TX
+    dlc: int
+    data: bytes
+
+    @property
+    def is_tx(self) -> bool:
+        return bool(self.flags & 0x01)
+
+    @property
+    def is_extended(self) -> bool:
+        return bool(self.flags & 0x04)
+
+    @property
+    def is_error(self) -> bool:
+        return bool(self.flags & 0x80)
+
+    @property
+    def timestamp(self) -> float:
+        return self.timestamp_us / 1000000.0
+
+    @classmethod
+    def from_message(cls, msg: TLIBCAN) -> "CanFrame":
+        data_len = DLC_DATA_BYTE_CNT[msg.FDLC]
+        return cls(int(msg.FTimeUs), int(msg.FIdentifier), int(msg.FProperties), int(msg.FDLC),
+                   bytes(msg.FData)[:data_len])
@@ -0,0 +1,58 @@
+import logging
+from collections.abc import Callable
+
+from PySide6.QtCore import QThread
+
+from app_can.RxRingBuffer import RxRingBuffer
+from app_can.TscanApi import TLIBCAN, s32, size_t, tsfifo_receive_can_msgs, tsfifo_clear_can_receive_buffers
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FifoReceiver(QThread):
+    """
+    Поток опроса FIFO адаптера: принятые кадры читаются пачками через tsfifo_receive_can_msgs
+    в предвыделенный массив (TLIBCAN * N) и копируются в кольцевой буфер CanDevice
+    """
+
+    def __init__(self,
+                 handle: size_t,
+                 channel: int,
+                 ring: RxRingBuffer,
+                 on_frames: Callable[[], None],
+                 read_size: int = 256,
+                 poll_interval_ms: int = 1):
+        super().__init__()
+        self._handle = handle
+        self._channel = channel
+        self._ring = ring
+        self._on_frames = on_frames
+        self._read_size = max(int(read_size), 1)
+        self._poll_interval_ms = max(int(poll_interval_ms), 0)
+        self._buffer = (TLIBCAN * self._read_size)()
+        self._buffer_size = s32(0)
+
+    def run(self):
+        tsfifo_clear_can_receive_buffers(self._handle, self._channel)
+        LOGGER.info("Запуск опроса FIFO приёма CAN")
+
+        while not self.isInterruptionRequested():
+            self._buffer_size.value = self._read_size
+            # ARxTx = 0: только принятые кадры, TX кадры для UI передаются через signal_tx_echo
+            ret = tsfifo_receive_can_msgs(self._handle, self._buffer, self._buffer_size, self._channel, 0)
+            count = self._buffer_size.value if ret == 0 else 0
+
+            if count > 0:
+                # Error frame ([7] FProperties) в кольцо не попадают
+                self._ring.push_many(self._buffer, count, skip_flags=0x80)
+                self._on_frames()
+
+            if count < self._read_size:
+                # FIFO опустошён, ждём накопления следующей пачки
+                self.msleep(self._poll_interval_ms)
+
+        LOGGER.info("Останов опроса FIFO приёма CAN")
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
@@ -0,0 +1,89 @@
+from ctypes import addressof, memmove, sizeof
+
+from app_can.CanFrame import CanFrame
+from app_can.TscanApi import TLIBCAN
+
+
+class RxRingBuffer:
+    """
+    Кольцевой буфер принятых кадров для одного производителя (поток драйвера)
+    и одного потребителя (поток Qt). Слоты TLIBCAN выделены заранее, кадр копируется
+    в слот через ctypes.memmove; индексы записи и чтения изменяет только их владелец,
+    поэтому блокировки не требуются.
+    """
+
+    def __init__(self, capacity: int = 8192):
+        self._capacity = max(int(capacity), 2)
+        self._slots = (TLIBCAN * self._capacity)()
+        self._slot_size = sizeof(TLIBCAN)
+        self._base_address = addressof(self._slots)
+        self._head = 0  # количество записанных кадров (изменяет только производитель)
+        self._tail = 0  # количество прочитанных кадров (изменяет только потребитель)
+        self._overflow_count = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def overflow_count(self) -> int:
+        """
+        Количество кадров, отброшенных из-за заполнения буфера
+        """
+        return self._overflow_count
+
+    def __len__(self) -> int:
+        return self._head - self._tail
+
+    def push(self, message_address: int) -> bool:
+        """
+        Копирование кадра в буфер (вызывается из потока драйвера)
+        :param message_address: адрес структуры TLIBCAN
+        :return: False, если буфер заполнен и кадр отброшен
+        """
+        head = self._head
+        if head - self._tail >= self._capacity:
+            self._overflow_count += 1
+            return False
+        memmove(self._base_address + (head % self._capacity) * self._slot_size, message_address, self._slot_size)
+        self._head = head + 1
+        return True
+
+    def push_many(self, messages, count: int, skip_flags: int = 0) -> int:
+        """
+        Копирование нескольких подряд идущих кадров из массива TLIBCAN
+        :param messages: массив (TLIBCAN * N)
+        :param count: количество кадров в начале массива
+        :param skip_flags: кадры, у которых установлен любой из битов FProperties, пропускаются
+        :return: количество скопированных кадров
+        """
+        source = addressof(messages)
+        pushed = 0
+        for index in range(count):
+            if skip_flags and messages[index].FProperties & skip_flags:
+                continue
+            if not self.push(source + index * self._slot_size):
+                self._overflow_count += count - index - 1
+                break
+            pushed += 1
+        return pushed
+
+    def pop_batch(self, max_count: int) -> list[CanFrame]:
+        """
+        Извлечение до max_count кадров (вызывается из потока потребителя)
+        :param max_count: максимальный размер пачки
+        :return: кадры в порядке приёма
+        """
+        tail = self._tail
+        end = min(self._head, tail + max(int(max_count), 1))
+        slots = self._slots
+        capacity = self._capacity
+        frames = [CanFrame.from_message(slots[index % capacity]) for index in range(tail, end)]
+        self._tail = end
+        return frames
+
+    def clear(self):
+        self._tail = self._head
+
+    def reset_overflow_count(self):
+        self._overflow_count = 0
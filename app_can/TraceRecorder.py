@@ -0,0 +1,418 @@
+import logging
+import mmap
+import struct
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from PySide6.QtCore import QThread, Signal
+
+from app_can.CanFrame import CanFrame
+
+LOGGER = logging.getLogger(__name__)
+
+# Формат файла записи (little-endian, только добавление):
+#   заголовок  <8sHHIqq  magic, версия, канал, резерв, начало отсчёта (мкс perf_counter), то же время (мкс Unix)
+#   кадр       <BqIBBB   тип 1, время (мкс perf_counter), идентификатор, FProperties, DLC, длина; далее данные
+#   индекс     <BIqqQQ   тип 2, кадров в блоке, время первого и последнего кадра, смещение блока,
+#                        смещение предыдущего индекса
+#   окончание  <BQQ      тип 3, смещение последнего индекса, всего кадров
+# Индекс записывается после каждого блока кадров; цепочка индексов от окончания позволяет найти блок по времени
+# без чтения кадров. Файл без окончания (запись прервана) читается последовательно до последней целой записи
+TRACE_MAGIC = b"CANTRACE"
+TRACE_VERSION = 1
+
+_HEADER = struct.Struct("<8sHHIqq")
+_FRAME = struct.Struct("<BqIBBB")
+_INDEX = struct.Struct("<BIqqQQ")
+_TRAILER = struct.Struct("<BQQ")
+
+RECORD_FRAME = 1
+RECORD_INDEX = 2
+RECORD_TRAILER = 3
+
+
+@dataclass(frozen=True)
+class TraceIndexEntry:
+    frame_count: int
+    first_timestamp_us: int
+    last_timestamp_us: int
+    offset: int  # смещение первого кадра блока
+
+
+class TraceRecorder(QThread):
+    """
+    Запись кадров CAN в файл в отдельном потоке.
+    Поток Qt только добавляет пачку кадров в очередь (record_many из приёма CanDevice, record для TX),
+    упаковка и запись выполняются потоком записи раз в FLUSH_INTERVAL_MS.
+    Метки времени RX (часы адаптера) приводятся к perf_counter, как и у TX кадров.
+    При достижении max_file_bytes запись продолжается в следующий файл (<имя>_001.cantrace, ...)
+    """
+
+    DEFAULT_MAX_FILE_BYTES = 256 * 1024 * 1024
+    DEFAULT_INDEX_INTERVAL = 4096  # кадров в блоке между индексами
+    FLUSH_INTERVAL_MS = 100
+    MAX_PENDING_FRAMES = 1000000
+
+    signal_file_opened = Signal(str)
+    signal_error = Signal(str)
+
+    def __init__(self,
+                 path: str,
+                 channel: int = 0,
+                 max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                 index_interval: int = DEFAULT_INDEX_INTERVAL):
+        """
+        :param path: путь первого файла записи
+        :param channel: индекс канала CAN адаптера (сохраняется в заголовке)
+        :param max_file_bytes: размер файла, после которого начинается следующий
+        :param index_interval: кадров между индексами
+        """
+        super().__init__()
+        self._path = Path(path)
+        self._channel = max(int(channel), 0)
+        self._max_file_bytes = max(int(max_file_bytes), _HEADER.size + _INDEX.size)
+        self._index_interval = max(int(index_interval), 1)
+
+        # Очередь пачек (время постановки, кадры): пополняет поток Qt, разбирает поток записи
+        self._queue: deque[tuple[int, Iterable[CanFrame]]] = deque()
+        self._queued_frames = 0  # изменяет только поток Qt
+        self._written_frames = 0  # изменяет только поток записи
+        self._dropped_frames = 0
+        self._stop_event = threading.Event()
+
+        self._files: list[str] = []
+        self._bytes_written = 0
+        self._file = None
+        self._offset = 0
+        self._block_offset = 0
+        self._block_frames = 0
+        self._block_first_us = 0
+        self._block_last_us = 0
+        self._last_index_offset = 0
+        self._file_frames = 0
+        self._rx_anchor: tuple[int, int] | None = None  # (время адаптера, perf_counter), мкс
+
+    @property
+    def files(self) -> list[str]:
+        """
+        Файлы записи в порядке создания
+        """
+        return list(self._files)
+
+    @property
+    def frame_count(self) -> int:
+        return self._written_frames
+
+    @property
+    def dropped_count(self) -> int:
+        """
+        Кадры, отброшенные из-за переполнения очереди (запись не успевает за шиной)
+        """
+        return self._dropped_frames
+
+    @property
+    def bytes_written(self) -> int:
+        return self._bytes_written
+
+    def record(self, frame: CanFrame):
+        """
+        Постановка одного кадра в очередь записи (вызывается из потока Qt)
+        """
+        self._enqueue((frame,))
+
+    def record_many(self, frames: list[CanFrame]):
+        """
+        Постановка пачки кадров в очередь записи без копирования (вызывается из потока Qt)
+        """
+        if frames:
+            self._enqueue(frames)
+
+    def _enqueue(self, frames):
+        count = len(frames)
+        if self._queued_frames - self._written_frames + count > self.MAX_PENDING_FRAMES:
+            self._dropped_frames += count
+            return
+        self._queue.append((int(time.perf_counter() * 1000000), frames))
+        self._queued_frames += count
+
+    def stop(self):
+        """
+        Запись оставшихся кадров, закрытие файла и останов потока
+        """
+        self._stop_event.set()
+        self.wait()
+
+    def run(self):
+        try:
+            self._open_file()
+        except OSError as e:
+            LOGGER.error(f"Не удалось создать файл записи {self._path}: {e}")
+            self.signal_error.emit(f"Не удалось создать файл записи: {e}")
+            return
+
+        LOGGER.info(f"Запись CAN в {self._path}")
+        try:
+            while True:
+                stopping = self._stop_event.wait(self.FLUSH_INTERVAL_MS / 1000)
+                self._write_pending()
+                if stopping:
+                    break
+        except OSError as e:
+            LOGGER.error(f"Ошибка записи CAN: {e}")
+            self.signal_error.emit(f"Ошибка записи CAN: {e}")
+        finally:
+            self._close_file()
+        LOGGER.info(f"Запись CAN завершена: кадров {self._written_frames}, файлов {len(self._files)}")
+
+    def _write_pending(self):
+        buffer = bytearray()
+        while self._queue:
+            queued_at, frames = self._queue.popleft()
+            self._anchor_rx_clock(queued_at, frames)
+            for frame in frames:
+                timestamp_us = self._host_time_us(frame)
+                data = frame.data
+                if self._block_frames == 0:
+                    self._block_offset = self._offset + len(buffer)
+                    self._block_first_us = timestamp_us
+                buffer += _FRAME.pack(RECORD_FRAME, timestamp_us, frame.identifier, frame.flags & 0xFF,
+                                      frame.dlc & 0xFF, len(data))
+                buffer += data
+                self._block_last_us = timestamp_us
+                self._block_frames += 1
+                if self._block_frames >= self._index_interval:
+                    buffer += self._index_record(self._offset + len(buffer))
+                    if self._offset + len(buffer) >= self._max_file_bytes:
+                        self._write(buffer)
+                        buffer = bytearray()
+                        self._close_file()
+                        self._open_file()
+            self._written_frames += len(frames)
+        if buffer:
+            self._write(buffer)
+            self._file.flush()
+
+    def _anchor_rx_clock(self, queued_at: int, frames):
+        # Последний RX кадр пачки принят незадолго до постановки в очередь: по нему часы адаптера
+        # привязываются к perf_counter; привязка обновляется после сброса часов адаптера
+        for frame in reversed(frames):
+            if frame.flags & 0x01:
+                continue
+            if self._rx_anchor is None or frame.timestamp_us < self._rx_anchor[0] - 1000:
+                self._rx_anchor = (frame.timestamp_us, queued_at)
+            return
+
+    def _host_time_us(self, frame: CanFrame) -> int:
+        if frame.flags & 0x01 or self._rx_anchor is None:
+            return frame.timestamp_us
+        return self._rx_anchor[1] + (frame.timestamp_us - self._rx_anchor[0])
+
+    def _index_record(self, offset: int) -> bytes:
+        record = _INDEX.pack(RECORD_INDEX, self._block_frames, self._block_first_us, self._block_last_us,
+                             self._block_offset, self._last_index_offset)
+        self._last_index_offset = offset
+        self._file_frames += self._block_frames
+        self._block_frames = 0
+        return record
+
+    def _file_path(self, number: int) -> Path:
+        if number == 0:
+            return self._path
+        return self._path.with_name(f"{self._path.stem}_{number:03d}{self._path.suffix}")
+
+    def _open_file(self):
+        path = self._file_path(len(self._files))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "wb")
+        self._offset = 0
+        self._block_frames = 0
+        self._last_index_offset = 0
+        self._file_frames = 0
+        origin_us = int(time.perf_counter() * 1000000)
+        self._write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, self._channel, 0, origin_us, int(time.time() * 1000000)))
+        self._files.append(str(path))
+        self.signal_file_opened.emit(str(path))
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        try:
+            tail = bytearray()
+            if self._block_frames:
+                tail += self._index_record(self._offset)
+            tail += _TRAILER.pack(RECORD_TRAILER, self._last_index_offset, self._file_frames)
+            self._write(tail)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def _write(self, data: bytes | bytearray):
+        self._file.write(data)
+        self._offset += len(data)
+        self._bytes_written += len(data)
+
+
+class TraceReader:
+    """
+    Чтение файла записи TraceRecorder
+    """
+
+    def __init__(self, path: str):
+        self._path = str(path)
+        with open(self._path, "rb") as file:
+            header = file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"Файл записи слишком короткий: {self._path}")
+        magic, version, channel, _, origin_us, origin_wall_us = _HEADER.unpack(header)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError(f"Неизвестный формат файла записи: {self._path}")
+        self.channel = channel
+        self.origin_us = origin_us
+        self.origin_wall_us = origin_wall_us
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _records(self, start: int = _HEADER.size) -> Iterator[tuple[int, int, tuple]]:
+        # (тип, смещение, поля); для кадра последнее поле - данные
+        with open(self._path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            size = len(view)
+            offset = start
+            while offset < size:
+                record_type = view[offset]
+                if record_type == RECORD_FRAME:
+                    if offset + _FRAME.size > size:
+                        return
+                    fields = _FRAME.unpack_from(view, offset)
+                    end = offset + _FRAME.size + fields[5]
+                    if end > size:
+                        return
+                    yield RECORD_FRAME, offset, fields + (view[offset + _FRAME.size:end],)
+                    offset = end
+                elif record_type == RECORD_INDEX:
+                    if offset + _INDEX.size > size:
+                        return
+                    yield RECORD_INDEX, offset, _INDEX.unpack_from(view, offset)
+                    offset += _INDEX.size
+                elif record_type == RECORD_TRAILER:
+                    if offset + _TRAILER.size <= size:
+                        yield RECORD_TRAILER, offset, _TRAILER.unpack_from(view, offset)
+                    return
+                else:
+                    LOGGER.warning(f"{self._path}: неизвестная запись 0x{record_type:02X} по смещению {offset}")
+                    return
+
+    def index(self) -> list[TraceIndexEntry]:
+        """
+        Блоки кадров по индексам: по цепочке от окончания файла или, если запись прервана, чтением файла
+        """
+        entries = self._chained_index()
+        if entries is not None:
+            return entries
+
+        entries = []
+        for record_type, _, fields in self._records():
+            if record_type == RECORD_INDEX:
+                entries.append(TraceIndexEntry(fields[1], fields[2], fields[3], fields[4]))
+        return entries
+
+    def _chained_index(self) -> list[TraceIndexEntry] | None:
+        entries: list[TraceIndexEntry] = []
+        with open(self._path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            size = len(view)
+            trailer_offset = size - _TRAILER.size
+            if trailer_offset < _HEADER.size or view[trailer_offset] != RECORD_TRAILER:
+                return None
+            _, index_offset, _ = _TRAILER.unpack_from(view, trailer_offset)
+            while index_offset:
+                if not _HEADER.size <= index_offset <= trailer_offset - _INDEX.size or view[index_offset] != RECORD_INDEX:
+                    return None
+                _, count, first_us, last_us, block_offset, previous_offset = _INDEX.unpack_from(view, index_offset)
+                if previous_offset >= index_offset:
+                    return None
+                entries.append(TraceIndexEntry(count, first_us, last_us, block_offset))
+                index_offset = previous_offset
+        entries.reverse()
+        return entries
+
+    def frames(self, start_us: int | None = None) -> Iterator[CanFrame]:
+        """
+        Кадры файла; метки времени - мкс perf_counter записывающего компьютера
+        :param start_us: пропустить блоки, закончившиеся раньше этого времени (поиск по индексу)
+        """
+        offset = _HEADER.size
+        if start_us is not None:
+            for entry in self.index():
+                if entry.last_timestamp_us >= start_us:
+                    offset = entry.offset
+                    break
+        for record_type, _, fields in self._records(offset):
+            if record_type != RECORD_FRAME:
+                continue
+            _, timestamp_us, identifier, flags, dlc, _, data = fields
+            if start_us is not None and timestamp_us < start_us:
+                continue
+            yield CanFrame(timestamp_us, identifier, flags, dlc, bytes(data))
+
+    def __iter__(self) -> Iterator[CanFrame]:
+        return self.frames()
+
+
+def trace_files(path: str) -> list[str]:
+    """
+    Файлы одной записи: первый файл и продолжения <имя>_001, <имя>_002, ... по порядку
+    """
+    first = Path(path)
+    files = [str(first)] if first.exists() else []
+    number = 1
+    while True:
+        part = first.with_name(f"{first.stem}_{number:03d}{first.suffix}")
+        if not part.exists():
+            return files
+        files.append(str(part))
+        number += 1
+
+
+def export_asc(paths: Iterable[str], asc_path: str) -> int:
+    """
+    Экспорт записи в текстовый формат Vector ASC (время от начала записи, идентификаторы в hex)
+    :param paths: файлы записи по порядку (см. trace_files)
+    :return: количество экспортированных кадров
+    """
+    readers = [TraceReader(path) for path in paths]
+    if not readers:
+        return 0
+    origin_us = readers[0].origin_us
+    started = datetime.fromtimestamp(readers[0].origin_wall_us / 1000000.0)
+    date_text = started.strftime("%a %b %d %I:%M:%S.") + f"{started.microsecond // 1000:03d} " \
+        + started.strftime("%p").lower() + started.strftime(" %Y")
+
+    count = 0
+    with open(asc_path, "w", encoding="ascii", newline="\r\n") as asc:
+        asc.write(f"date {date_text}\n")
+        asc.write("base hex  timestamps absolute\n")
+        asc.write("internal events logged\n")
+        asc.write(f"Begin Triggerblock {date_text}\n")
+        asc.write(f"{0:11.6f} Start of measurement\n")
+        for reader in readers:
+            channel = reader.channel + 1
+            for frame in reader:
+                seconds = max(frame.timestamp_us - origin_us, 0) / 1000000.0
+                direction = "Tx" if frame.is_tx else "Rx"
+                identifier = f"{frame.identifier:X}x" if frame.is_extended else f"{frame.identifier:X}"
+                data = " ".join(f"{byte:02X}" for byte in frame.data)
+                if len(frame.data) > 8:
+                    # CAN FD: BRS и ESI в записи не сохраняются
+                    asc.write(f"{seconds:11.6f} CANFD {channel:3d} {direction:<4} {identifier:>9}  1 0 "
+                              f"{frame.dlc:x} {len(frame.data):2d} {data}\n")
+                else:
+                    asc.write(f"{seconds:11.6f} {channel:<2} {identifier:<15} {direction:<4} d {frame.dlc} {data}\n")
+                count += 1
+        asc.write("End TriggerBlock\n")
+    return count
@@ -0,0 +1,296 @@
+import enum
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from ctypes import addressof, c_char_p, memmove, pointer
+from pathlib import Path
+
+from PySide6.QtCore import Signal, Slot, Qt
+
+from app_can.CanDevice import CanDevice, CanReceiveMode, DeviceInfo
+from app_can.CanFrame import CanFrame
+from app_can.TraceRecorder import TraceReader, trace_files
+from app_can.TscanApi import TLIBCAN, s32, size_t
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ReplayMode(enum.Enum):
+    REALTIME = 0  # паузы между кадрами по меткам времени записи (с множителем скорости)
+    FAST = 1  # без пауз; кадры выдаются, пока кольцо приёма успевает разбираться
+    LOCKSTEP = 2  # принятые кадры после записанного TX выдаются только после отправки кадра приложением
+
+
+class ReplayCanDevice(CanDevice):
+    """
+    Устройство CAN без адаптера: кадры файла записи TraceRecorder подаются в _event_handler,
+    как callback драйвера, и дальше проходят тот же путь (кольцо приёма, _dispatch_frame, подписчики,
+    signal_new_frame). Отправленные приложением кадры не уходят в шину, но попадают в эхо и запись.
+    Записанные TX кадры в приём не подаются; в режиме LOCKSTEP каждый из них ждёт отправки кадра
+    приложением, поэтому ответы ЭБУ приходят в ответ на запросы Bootloader независимо от скорости разбора.
+    Аппаратные фильтры приёма выполняются программно
+    """
+
+    REPLAY_HANDLE = 1
+    # Кольцо приёма в режимах FAST/LOCKSTEP не переполняется: поток воспроизведения ждёт его разбора
+    BACKPRESSURE_POLL_S = 0.0005
+
+    signal_replay_finished = Signal(int)  # количество кадров, поданных в приём
+    _signal_replay_done = Signal(int)
+
+    def __init__(self,
+                 path: str | Iterable[str],
+                 mode: ReplayMode = ReplayMode.REALTIME,
+                 speed: float = 1.0,
+                 channel: int = -1):
+        """
+        :param path: первый файл записи (продолжения _001, ... находятся автоматически) или список файлов
+        :param mode: режим выдачи кадров
+        :param speed: множитель скорости для REALTIME (2.0 - вдвое быстрее записи)
+        :param channel: индекс канала (-1 - задаётся при запуске trace)
+        """
+        super().__init__(0, channel)
+        self._paths = trace_files(path) if isinstance(path, str) else [str(item) for item in path]
+        self._mode = mode
+        self._speed = speed if speed > 0 else 1.0
+
+        self._replay_thread: threading.Thread | None = None
+        self._replay_stop = threading.Event()
+        self._replayed_frames = 0
+        self._skipped_frames = 0
+        # LOCKSTEP: кадры, отправленные приложением (пополняет поток Qt, разбирает поток воспроизведения)
+        self._tx_credits = threading.Semaphore(0)
+        self._tx_sent: deque[CanFrame] = deque()
+        self._tx_mismatches = 0
+
+        self._signal_replay_done.connect(self._on_replay_done, Qt.ConnectionType.QueuedConnection)
+
+    @property
+    def paths(self) -> list[str]:
+        return list(self._paths)
+
+    @property
+    def mode(self) -> ReplayMode:
+        return self._mode
+
+    @property
+    def replayed_count(self) -> int:
+        return self._replayed_frames
+
+    @property
+    def skipped_count(self) -> int:
+        """
+        Кадры записи, не поданные в приём: CAN FD длиннее 8 байт и отсеянные фильтрами приёма
+        """
+        return self._skipped_frames
+
+    @property
+    def tx_mismatch_count(self) -> int:
+        """
+        LOCKSTEP: отправленные приложением кадры, не совпавшие с записанными TX (идентификатор или данные)
+        """
+        return self._tx_mismatches
+
+    @property
+    def is_replaying(self) -> bool:
+        return self._replay_thread is not None and self._replay_thread.is_alive()
+
+    def get_devices(self) -> s32:
+        self._devices = s32(1 if self._paths else 0)
+        return self._devices
+
+    def update_device_info(self, device_index: int):
+        name = Path(self._paths[0]).name if self._paths else ""
+        self.device_info = DeviceInfo(c_char_p(b"TraceReplay"), c_char_p(name.encode("utf-8", "replace")),
+                                      c_char_p(b"REPLAY"))
+
+    def connect_to(self, device_index: int) -> size_t:
+        if not self._paths:
+            LOGGER.error("Воспроизведение: нет файлов записи")
+            return size_t(0)
+        if self.device_info.serial.value is None:
+            self.update_device_info(device_index)
+        self._device_index = device_index
+        self._hardware_handle = size_t(self.REPLAY_HANDLE)
+        self.is_connect = True
+        LOGGER.info(f"Воспроизведение записи: {', '.join(self._paths)}")
+        return self._hardware_handle
+
+    def disconnect_device(self) -> bool:
+        self._stop_replay()
+        self.is_connect = False
+        self._hardware_handle = size_t(0)
+        return True
+
+    def channel_count(self) -> int:
+        return 1 if self._can_transmit() else 0
+
+    def start_trace(self, channel: int, baud_rate: int, terminator: bool,
+                    receive_mode: CanReceiveMode = CanReceiveMode.CALLBACK):
+        """
+        Запуск воспроизведения; скорость и терминатор сохраняются, но не влияют на выдачу кадров,
+        режим приёма всегда CALLBACK
+        """
+        if self._is_trace or not self._is_connect:
+            return
+        self.channel = channel
+        self.baud_rate = baud_rate
+        self.terminator = terminator
+        self._receive_mode = CanReceiveMode.CALLBACK
+        self._rx_ring.clear()
+        self.is_trace = True
+        self._apply_pass_filters()
+
+        self._replay_stop.clear()
+        self._replayed_frames = 0
+        self._skipped_frames = 0
+        self._tx_credits = threading.Semaphore(0)
+        self._tx_sent.clear()
+        self._tx_mismatches = 0
+        self._replay_thread = threading.Thread(target=self._replay, name="TraceReplay", daemon=True)
+        self._replay_thread.start()
+        LOGGER.info(f"Запуск воспроизведения ({self._mode.name})")
+        self.signal_tracing_started.emit()
+
+    def stop_trace(self):
+        if self.is_trace:
+            self._stop_replay()
+            self._pass_filters_installed = set()
+            self.is_trace = False
+        self.signal_tracing_stopped.emit()
+
+    def wait_finished(self, timeout: float | None = None) -> bool:
+        """
+        Ожидание окончания файла записи (поток воспроизведения завершён)
+        :return: False, если таймаут истёк раньше
+        """
+        thread = self._replay_thread
+        if thread is None:
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def _stop_replay(self):
+        thread = self._replay_thread
+        if thread is None:
+            return
+        self._replay_stop.set()
+        self._tx_credits.release()
+        thread.join()
+        self._replay_thread = None
+
+    def _apply_pass_filters(self):
+        if self._is_trace:
+            self._pass_filters_installed = self._requested_pass_filters()
+
+    def _remove_pass_filters(self):
+        self._pass_filters_installed = set()
+
+    @property
+    def pass_filters_supported(self) -> bool:
+        return True
+
+    @property
+    def tx_confirmation_supported(self) -> bool:
+        # Отправленные кадры в шину не уходят, подтверждать нечего
+        return False
+
+    def send_cyclic(self, iden: int, dlc: int, data: list[int], timeout: int) -> TLIBCAN | None:
+        if not self._can_transmit() or timeout == 0:
+            return None
+        LOGGER.warning(f"Воспроизведение: циклическая отправка 0x{iden:08X} не выполняется")
+        return self._create_message(iden, dlc, data)
+
+    def stop_cyclic(self, message: TLIBCAN):
+        return 0
+
+    def _transmit_message(self, message: TLIBCAN, timeout: int | None):
+        self._record_tx(message)
+        if self._mode == ReplayMode.LOCKSTEP:
+            data_len = min(int(message.FDLC), 8)
+            self._tx_sent.append(CanFrame(0, int(message.FIdentifier), int(message.FProperties), int(message.FDLC),
+                                          bytes(message.FData)[:data_len]))
+            self._tx_credits.release()
+        return 0
+
+    def _frames(self) -> Iterator[CanFrame]:
+        for path in self._paths:
+            try:
+                reader = TraceReader(path)
+            except (OSError, ValueError) as e:
+                LOGGER.error(f"Воспроизведение: {e}")
+                return
+            yield from reader
+
+    def _replay(self):
+        # Поток воспроизведения играет роль потока драйвера: кадр копируется в TLIBCAN и передаётся в callback
+        message = TLIBCAN()
+        message_pointer = pointer(message)
+        data_address = addressof(message) + TLIBCAN.FData.offset
+        ring = self._rx_ring
+        stop = self._replay_stop
+        realtime = self._mode == ReplayMode.REALTIME
+        lockstep = self._mode == ReplayMode.LOCKSTEP
+        first_us: int | None = None
+        started = time.perf_counter()
+
+        try:
+            for frame in self._frames():
+                if stop.is_set():
+                    break
+                if frame.is_tx:
+                    if lockstep and not self._wait_tx_credit(frame):
+                        break
+                    continue
+                if len(frame.data) > 8:
+                    self._skipped_frames += 1
+                    continue
+                installed = self._pass_filters_installed
+                if installed and frame.identifier not in installed:
+                    self._skipped_frames += 1
+                    continue
+
+                if realtime:
+                    if first_us is None:
+                        first_us = frame.timestamp_us
+                    delay = started + (frame.timestamp_us - first_us) / 1000000.0 / self._speed - time.perf_counter()
+                    if delay > 0 and stop.wait(delay):
+                        break
+                else:
+                    while len(ring) >= ring.capacity - 1:
+                        if stop.wait(self.BACKPRESSURE_POLL_S):
+                            return
+
+                message.FIdxChn = max(self._channel, 0)
+                message.FProperties = frame.flags & 0xFE
+                message.FDLC = frame.dlc
+                message.FIdentifier = frame.identifier
+                message.FTimeUs = frame.timestamp_us
+                memmove(data_address, frame.data, len(frame.data))
+                self._event_handler(None, message_pointer)
+                self._replayed_frames += 1
+        except Exception as e:
+            LOGGER.error(f"Ошибка воспроизведения: {e}")
+        finally:
+            if not stop.is_set():
+                self._signal_replay_done.emit(self._replayed_frames)
+
+    def _wait_tx_credit(self, recorded: CanFrame) -> bool:
+        self._tx_credits.acquire()
+        if self._replay_stop.is_set():
+            return False
+        sent = self._tx_sent.popleft()
+        if sent.identifier != recorded.identifier or sent.data != recorded.data:
+            self._tx_mismatches += 1
+            if self._tx_mismatches == 1:
+                LOGGER.warning(f"Воспроизведение: отправлен 0x{sent.identifier:08X} {sent.data.hex(' ').upper()}, "
+                               f"в записи 0x{recorded.identifier:08X} {recorded.data.hex(' ').upper()}")
+        return True
+
+    @Slot(int)
+    def _on_replay_done(self, count: int):
+        LOGGER.info(f"Воспроизведение завершено: кадров {count}, пропущено {self._skipped_frames}, "
+                    f"несовпадений TX {self._tx_mismatches}")
+        self.signal_replay_finished.emit(count)
@@ -0,0 +1,56 @@
+import logging
+from ctypes import CFUNCTYPE, POINTER, Structure, c_int32, c_int64, c_size_t, c_uint8
+
+LOGGER = logging.getLogger(__name__)
+
+# Единая точка импорта libTSCANAPI. Библиотека при импорте загружает DLL адаптера (на Linux - libTSCANApiOnLinux.so)
+# и без неё не импортируется; тогда типы объявляются здесь с той же раскладкой, что в libTSCANAPI.TSStructure,
+# а функции драйвера возвращают код ошибки. Так CanDevice и воспроизведение записи (TraceReplay)
+# работают на компьютере без адаптера и его библиотеки
+try:
+    from libTSCANAPI import tsapp_configure_baudrate_can, tscan_scan_devices, tscan_get_device_info, s32, size_t, \
+        tsapp_disconnect_by_handle, tsapp_connect, tsapp_register_event_can_whandle, OnTx_RxFUNC_CAN_WHandle, \
+        DLC_DATA_BYTE_CNT, TLIBCAN, tsapp_delete_cyclic_msg_can, tsapp_add_cyclic_msg_can, tsapp_transmit_can_async, \
+        tsapp_transmit_can_sync, tsapp_unregister_event_can_whandle, tscan_get_can_channel_count, \
+        tsfifo_receive_can_msgs, tsfifo_clear_can_receive_buffers
+    from libTSCANAPI.TSCommon import dll
+
+    TSCAN_AVAILABLE = True
+    TSCAN_IMPORT_ERROR = ""
+except (ImportError, OSError, NameError, AttributeError) as import_error:
+    TSCAN_AVAILABLE = False
+    TSCAN_IMPORT_ERROR = str(import_error)
+    LOGGER.warning(f"Библиотека адаптера TSCAN недоступна ({import_error}), доступно только воспроизведение записи")
+
+    # Коды возврата API: 0 - успех; этот код возвращают функции драйвера без библиотеки
+    TSCAN_NOT_AVAILABLE = -1
+
+    s32 = c_int32
+    size_t = c_size_t
+    dll = None
+
+    DLC_DATA_BYTE_CNT = (
+        0, 1, 2, 3, 4, 5, 6, 7,
+        8, 12, 16, 20, 24, 32, 48, 64
+    )
+
+    class TLIBCAN(Structure):
+        _pack_ = 1
+        _fields_ = [("FIdxChn", c_uint8),
+                    ("FProperties", c_uint8),
+                    ("FDLC", c_uint8),
+                    ("FReserved", c_uint8),
+                    ("FIdentifier", c_int32),
+                    ("FTimeUs", c_int64),
+                    ("FData", c_uint8 * 8),
+                    ]
+
+    OnTx_RxFUNC_CAN_WHandle = CFUNCTYPE(None, POINTER(c_int64), POINTER(TLIBCAN))
+
+    def _driver_unavailable(*args) -> int:
+        return TSCAN_NOT_AVAILABLE
+
+    tsapp_configure_baudrate_can = tscan_scan_devices = tscan_get_device_info = tsapp_disconnect_by_handle = \
+        tsapp_connect = tsapp_register_event_can_whandle = tsapp_delete_cyclic_msg_can = tsapp_add_cyclic_msg_can = \
+        tsapp_transmit_can_async = tsapp_transmit_can_sync = tsapp_unregister_event_can_whandle = \
+        tscan_get_can_channel_count = tsfifo_receive_can_msgs = tsfifo_clear_can_receive_buffers = _driver_unavailable
@@ -0,0 +1 @@
+"""ISO-TP transport helpers."""
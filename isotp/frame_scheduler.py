@@ -0,0 +1,96 @@
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+
+from PySide6.QtCore import QObject, QTimer, Qt
+
+from app_can.CanDevice import CanDevice
+
+if TYPE_CHECKING:
+    from isotp.isotp_channel import IsoTpChannel
+
+
+class FrameScheduler(QObject):
+    """
+    Планировщик Consecutive Frame для нескольких каналов ISO-TP на одном CanDevice.
+    Каналы, получившие FlowControl CTS, встают в очередь; на каждом тике каналы по кругу
+    отправляют не более QUANTUM фреймов в пределах бюджета шины (доля скорости CAN).
+    SF/FF/FC отправляются каналами напрямую, через планировщик идут только CF.
+    """
+
+    TICK_MS = 1
+    QUANTUM = 4  # фреймов одного канала подряд за проход
+    BITS_PER_FRAME = 160  # расширенный кадр с 8 байтами данных, bit stuffing и межкадровый интервал
+    DEFAULT_BUS_LOAD = 0.7  # доля пропускной способности шины для CF
+    DEFAULT_BAUD_RATE = 500  # кбит/с, если скорость адаптера ещё не задана
+
+    def __init__(self, can: CanDevice | None = None, bus_load: float = DEFAULT_BUS_LOAD):
+        super().__init__()
+
+        self._can = can if can is not None else CanDevice.instance()
+        self._bus_load = min(max(float(bus_load), 0.05), 1.0)
+        self._ready: deque["IsoTpChannel"] = deque()
+        self._budget = 0.0
+        self._last_tick_at = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.setInterval(self.TICK_MS)
+        self._timer.timeout.connect(self._on_tick)
+
+    @property
+    def bus_load(self) -> float:
+        return self._bus_load
+
+    def set_bus_load(self, bus_load: float):
+        self._bus_load = min(max(float(bus_load), 0.05), 1.0)
+
+    def frames_per_second(self) -> float:
+        """
+        Бюджет CF в секунду при текущей скорости шины
+        """
+        baud_rate = self._can.baud_rate if self._can.baud_rate > 0 else self.DEFAULT_BAUD_RATE
+        return baud_rate * 1000 * self._bus_load / self.BITS_PER_FRAME
+
+    def pending_channels(self) -> int:
+        return len(self._ready)
+
+    def request(self, channel: "IsoTpChannel"):
+        """
+        Постановка канала в очередь после FlowControl CTS
+        :param channel: канал с окном неотправленных CF
+        """
+        if channel in self._ready:
+            return
+        self._ready.append(channel)
+        if not self._timer.isActive():
+            self._last_tick_at = time.perf_counter()
+            self._budget = float(self.QUANTUM)
+            self._timer.start()
+
+    def cancel(self, channel: "IsoTpChannel"):
+        if channel in self._ready:
+            self._ready.remove(channel)
+        if not self._ready:
+            self._timer.stop()
+
+    def _on_tick(self):
+        now = time.perf_counter()
+        rate = self.frames_per_second()
+        # Неизрасходованный бюджет ограничен, чтобы после простоя не отправлять пачку сверх нормы
+        limit = max(self.QUANTUM * len(self._ready), rate * self.TICK_MS * 4 / 1000)
+        self._budget = min(self._budget + (now - self._last_tick_at) * rate, limit)
+        self._last_tick_at = now
+
+        idle_channels = 0
+        while self._ready and self._budget >= 1 and idle_channels < len(self._ready):
+            channel = self._ready.popleft()
+            sent = channel.send_scheduled(min(self.QUANTUM, int(self._budget)))
+            self._budget -= sent
+            # Канал, ожидающий STmin, пропускает ход; проход без отправок завершает тик
+            idle_channels = 0 if sent else idle_channels + 1
+            if channel.has_scheduled_frames() and channel not in self._ready:
+                self._ready.append(channel)
+
+        if not self._ready:
+            self._timer.stop()
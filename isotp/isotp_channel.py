@@ -0,0 +1,640 @@
+import ctypes
+import enum
+import math
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from PySide6.QtCore import QObject, QTimer, Qt, Signal
+
+from app_can.CanDevice import CanDevice
+from app_can.CanFrame import CanFrame
+from isotp.frame_scheduler import FrameScheduler
+from j1939.j1939_can_identifier import J1939CanIdentifier
+from uds.uds_identifiers import UdsIdentifiers
+
+
+class FrameType(enum.IntEnum):
+    SINGLE = 0
+    FIRST = 1
+    CONSECUTIVE = 2
+    FLOW_CONTROL = 3
+
+
+class FlowStatus(enum.IntEnum):
+    CTS = 0
+    WAIT = 1
+    OVERFLOW = 2
+
+
+def decode_st_min(raw: int) -> float:
+    """
+    Перевод STmin из FlowControl (ISO 15765-2) в секунды
+    :param raw: байт STmin
+    :return: минимальный интервал между consecutive фреймами, с
+    """
+    raw = int(raw) & 0xFF
+    if raw <= 0x7F:
+        return raw / 1000.0
+    if 0xF1 <= raw <= 0xF9:
+        return (raw - 0xF0) * 100 / 1000000.0
+    # Зарезервированные значения трактуются как максимальный STmin (127 мс)
+    return 0x7F / 1000.0
+
+
+@dataclass
+class FlowControl:
+    flow_status: int = FlowStatus.CTS
+    block_size: int = 0  # количество consecutive фреймов, которые может получить приёмник
+    sep_time: int = 0
+
+    @property
+    def sep_time_seconds(self) -> float:
+        return decode_st_min(self.sep_time)
+
+
+class IsoTpChannel(QObject):
+    """
+    Канал ISO-TP (ISO 15765-2) поверх CanDevice для пары идентификаторов tx/rx.
+    Сегментирует и собирает PDU произвольной длины (до 4095 байт),
+    обрабатывает FlowControl CTS/WAIT/OVFLW и контролирует таймауты N_As/N_Bs/N_Cr.
+    """
+    MAX_PDU_LENGTH = 4095
+    FRAME_LENGTH = 8
+    # FF + CF для PDU максимальной длины
+    MAX_FRAME_COUNT = 1 + math.ceil((MAX_PDU_LENGTH - 6) / 7)
+
+    signal_pdu_received = Signal(bytes)
+    signal_pdu_sent = Signal()
+    signal_progress = Signal(int)  # передано байт текущего PDU
+    signal_error = Signal(str)
+
+    _instance = None
+
+    def __init__(self,
+                 tx: J1939CanIdentifier,
+                 rx: J1939CanIdentifier,
+                 can: CanDevice | None = None):
+        super().__init__()
+
+        self._tx = tx
+        self._rx = rx
+        self._extra_rx_identifier: int | None = None
+        self._can = can if can is not None else CanDevice.instance()
+
+        self._padding = 0xFF
+        self._burst_mode = True
+        self._max_wait_frames = 10
+
+        # Параметры FlowControl, которые отдаём передатчику при приёме многофреймового PDU
+        self._rx_block_size = 0
+        self._rx_st_min = 0
+
+        # Передача: два предвыделенных массива TLIBCAN - текущий PDU и PDU, подготовленный заранее (prepare).
+        # PDU собирается в staging-буфер, откуда данные фреймов копируются в FData через ctypes.memmove
+        self._staging = bytearray(self.MAX_PDU_LENGTH)
+        self._staging_buffer = (ctypes.c_ubyte * self.MAX_PDU_LENGTH).from_buffer(self._staging)
+        self._staging_address = ctypes.addressof(self._staging_buffer)
+        self._frame_buffers = [self._can.create_frames(self._tx.identifier, self.MAX_FRAME_COUNT),
+                               self._can.create_frames(self._tx.identifier, self.MAX_FRAME_COUNT)]
+        self._fc_frame = self._can.create_frames(self._tx.identifier, 1)[0]
+        self._data_offset = type(self._fc_frame).FData.offset
+
+        self._tx_frames = None
+        self._tx_frame_count = 0
+        self._tx_slot = 0
+        self._tx_length = 0
+        self._tx_frame_index = 0
+        self._tx_offset = 0
+        self._prepared_slot = 1
+        self._prepared_count = 0
+        self._prepared_length = 0
+        self._tx_frames_left_in_window = 0
+        self._tx_wait_count = 0
+        self._tx_last_frame_at = 0.0
+        self._flow_control = FlowControl()
+        # Общий планировщик CF, если на одном CanDevice работают несколько каналов
+        self._scheduler: FrameScheduler | None = None
+
+        # Приём
+        self._rx_buffer: bytearray | None = None
+        self._rx_offset = 0
+        self._rx_sequence = 0
+        self._rx_frames_in_window = 0
+
+        self._n_as_ms = 1000
+        self._n_bs_ms = 1000
+        self._n_cr_ms = 1000
+
+        self._cf_timer = QTimer(self)
+        self._cf_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._cf_timer.timeout.connect(self._send_paced_frame)
+
+        self._n_bs_timer = QTimer(self)
+        self._n_bs_timer.setSingleShot(True)
+        self._n_bs_timer.timeout.connect(self._on_n_bs_timeout)
+
+        self._n_cr_timer = QTimer(self)
+        self._n_cr_timer.setSingleShot(True)
+        self._n_cr_timer.timeout.connect(self._on_n_cr_timeout)
+
+        # N_As: отправка SF/FF/FC асинхронная, подтверждение приходит TX кадром из callback драйвера
+        self._n_as_timer = QTimer(self)
+        self._n_as_timer.setSingleShot(True)
+        self._n_as_timer.timeout.connect(self._on_n_as_timeout)
+        self._tx_confirmed_action: Callable[[], None] | None = None
+        self._confirm_identifier: int | None = None
+
+        # Кадры принимаются через таблицу диспетчеризации CanDevice по идентификатору
+        self._subscribed_identifiers: set[int] = set()
+        self._pass_filter_enabled = False
+        self.refresh_identifiers()
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = IsoTpChannel(UdsIdentifiers.tx, UdsIdentifiers.rx)
+            UdsIdentifiers.add_listener(cls._instance.refresh_identifiers)
+        return cls._instance
+
+    @property
+    def tx(self) -> J1939CanIdentifier:
+        return self._tx
+
+    @property
+    def rx(self) -> J1939CanIdentifier:
+        return self._rx
+
+    @property
+    def extra_rx_identifier(self) -> int | None:
+        return self._extra_rx_identifier
+
+    @extra_rx_identifier.setter
+    def extra_rx_identifier(self, identifier: int | None):
+        self._extra_rx_identifier = identifier
+        self.refresh_identifiers()
+
+    def rx_identifiers(self) -> set[int]:
+        identifiers = {self._rx.identifier}
+        if self._extra_rx_identifier is not None:
+            identifiers.add(self._extra_rx_identifier)
+        return identifiers
+
+    def refresh_identifiers(self):
+        """
+        Обновление подписки на принятые кадры и аппаратных фильтров после изменения идентификаторов
+        """
+        identifiers = self.rx_identifiers()
+        for identifier in self._subscribed_identifiers - identifiers:
+            self._can.unsubscribe(identifier, self.on_new_frame)
+        for identifier in identifiers - self._subscribed_identifiers:
+            self._can.subscribe(identifier, self.on_new_frame)
+        self._subscribed_identifiers = identifiers
+
+        tx_identifier = self._tx.identifier & 0x1FFFFFFF
+        if tx_identifier != self._confirm_identifier:
+            if self._confirm_identifier is not None:
+                self._can.unsubscribe_tx_confirmation(self._confirm_identifier, self._on_tx_confirmed)
+            self._can.subscribe_tx_confirmation(tx_identifier, self._on_tx_confirmed)
+            self._confirm_identifier = tx_identifier
+
+        if self._pass_filter_enabled:
+            self._can.set_pass_filters(self, self._pass_filter_identifiers())
+
+    def _pass_filter_identifiers(self) -> set[int]:
+        # tx идентификатор пропускается для подтверждений отправки (N_As)
+        return self.rx_identifiers() | {self._tx.identifier}
+
+    @property
+    def pass_filter_enabled(self) -> bool:
+        return self._pass_filter_enabled
+
+    def set_pass_filter_enabled(self, enabled: bool):
+        """
+        Аппаратная фильтрация приёма: адаптер пропускает только кадры идентификаторов канала
+        :param enabled: True - установить фильтры, False - снять фильтры этого канала
+        """
+        self._pass_filter_enabled = bool(enabled)
+        if self._pass_filter_enabled:
+            self._can.set_pass_filters(self, self._pass_filter_identifiers())
+        else:
+            self._can.clear_pass_filters(self)
+
+    @property
+    def burst_mode(self) -> bool:
+        return self._burst_mode
+
+    def set_burst_mode(self, enabled: bool):
+        self._burst_mode = bool(enabled)
+
+    @property
+    def scheduler(self) -> FrameScheduler | None:
+        return self._scheduler
+
+    def set_scheduler(self, scheduler: FrameScheduler | None):
+        """
+        Передача CF через общий планировщик вместо пакетной/таймерной отправки
+        :param scheduler: планировщик или None для самостоятельной отправки
+        """
+        if self._scheduler is not None:
+            self._scheduler.cancel(self)
+        self._scheduler = scheduler
+
+    @property
+    def flow_control(self) -> FlowControl:
+        return self._flow_control
+
+    def set_timeouts(self, n_as_ms: int, n_bs_ms: int, n_cr_ms: int):
+        self._n_as_ms = max(int(n_as_ms), 1)
+        self._n_bs_ms = max(int(n_bs_ms), 1)
+        self._n_cr_ms = max(int(n_cr_ms), 1)
+
+    def set_receive_flow_control(self, block_size: int, st_min: int):
+        self._rx_block_size = int(block_size) & 0xFF
+        self._rx_st_min = int(st_min) & 0xFF
+
+    def is_busy(self) -> bool:
+        return self._tx_frames is not None
+
+    def abort(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel(self)
+        self._cf_timer.stop()
+        self._n_bs_timer.stop()
+        self._n_cr_timer.stop()
+        self._n_as_timer.stop()
+        self._tx_confirmed_action = None
+        self._tx_frames = None
+        self._rx_buffer = None
+        self.discard_prepared()
+
+    def close(self):
+        """
+        Отключение канала от CanDevice: подписки на rx идентификаторы, аппаратные фильтры
+        и оповещения об изменении UdsIdentifiers снимаются
+        """
+        self.abort()
+        UdsIdentifiers.remove_listener(self.refresh_identifiers)
+        self.set_pass_filter_enabled(False)
+        for identifier in self._subscribed_identifiers:
+            self._can.unsubscribe(identifier, self.on_new_frame)
+        self._subscribed_identifiers = set()
+        if self._confirm_identifier is not None:
+            self._can.unsubscribe_tx_confirmation(self._confirm_identifier, self._on_tx_confirmed)
+            self._confirm_identifier = None
+
+    # --------------------------------------------------------------------------------------------
+    # Передача
+    # --------------------------------------------------------------------------------------------
+
+    def prepare(self, *segments: bytes | bytearray | memoryview) -> bool:
+        """
+        Предварительная сегментация PDU в готовые CAN-фреймы (PCI, счетчик CF, заполнение).
+        Подготовленный PDU отправляется вызовом send_prepared() без повторной сборки фреймов,
+        что позволяет собрать следующий блок, пока приёмник обрабатывает текущий.
+        :param segments: части PDU (например, заголовок сервиса и срез образа прошивки),
+                         копируются подряд без промежуточной склейки
+        :return: False, если PDU некорректной длины
+        """
+        length = 0
+        for segment in segments:
+            length += memoryview(segment).nbytes
+        if length == 0 or length > self.MAX_PDU_LENGTH:
+            self.discard_prepared()
+            self.signal_error.emit(f"ISO-TP: недопустимая длина PDU ({length} байт)")
+            return False
+
+        offset = 0
+        for segment in segments:
+            view = memoryview(segment).cast("B")
+            self._staging[offset:offset + len(view)] = view
+            offset += len(view)
+
+        # Не перезаписываем массив, фреймы которого сейчас передаются
+        slot = 1 - self._tx_slot if self._tx_frames is not None else self._prepared_slot
+        self._prepared_slot = slot
+        self._prepared_count = self._segment(self._frame_buffers[slot], length)
+        self._prepared_length = length
+        return True
+
+    def has_prepared(self) -> bool:
+        return self._prepared_count > 0
+
+    def discard_prepared(self):
+        self._prepared_count = 0
+        self._prepared_length = 0
+
+    def send(self, pdu: bytes | bytearray | memoryview) -> bool:
+        """
+        Передача PDU целиком: Single Frame или First Frame + Consecutive Frames
+        :param pdu: данные уровня UDS (SID + параметры)
+        :return: False, если канал занят или PDU некорректной длины
+        """
+        if self._tx_frames is not None:
+            self.signal_error.emit("ISO-TP: канал занят передачей предыдущего PDU")
+            return False
+        if not self.prepare(pdu):
+            return False
+        return self.send_prepared()
+
+    def send_prepared(self) -> bool:
+        """
+        Передача PDU, подготовленного методом prepare()
+        :return: False, если канал занят, PDU не подготовлен или первый фрейм не отправлен
+        """
+        if self._tx_frames is not None:
+            self.signal_error.emit("ISO-TP: канал занят передачей предыдущего PDU")
+            return False
+        if self._prepared_count == 0:
+            self.signal_error.emit("ISO-TP: нет подготовленного PDU")
+            return False
+
+        frames = self._frame_buffers[self._prepared_slot]
+        count = self._prepared_count
+        length = self._prepared_length
+        self._tx_slot = self._prepared_slot
+        self.discard_prepared()
+
+        if count == 1:
+            return self._transmit(frames[0], confirm=True, on_confirmed=lambda: self._on_single_frame_sent(length))
+
+        self._tx_frames = frames
+        self._tx_frame_count = count
+        self._tx_length = length
+        self._tx_frame_index = 1
+        self._tx_offset = 6
+        self._tx_wait_count = 0
+
+        if not self._transmit(frames[0], confirm=True, on_confirmed=self._on_first_frame_sent):
+            self._tx_frames = None
+            return False
+        return True
+
+    def _on_single_frame_sent(self, length: int):
+        self.signal_progress.emit(length)
+        self.signal_pdu_sent.emit()
+
+    def _on_first_frame_sent(self):
+        self.signal_progress.emit(self._tx_offset)
+        self._n_bs_timer.start(self._n_bs_ms)
+
+    def _segment(self, frames, length: int) -> int:
+        # Данные копируются из staging-буфера прямо в FData кадров, без поэлементных циклов
+        memmove = ctypes.memmove
+        addressof = ctypes.addressof
+        source = self._staging_address
+        identifier = self._tx.identifier
+        data_offset = self._data_offset
+
+        first = frames[0]
+        first.FIdentifier = identifier
+        data = addressof(first) + data_offset
+        ctypes.memset(data, self._padding, self.FRAME_LENGTH)
+        if length <= 7:
+            first.FData[0] = length
+            memmove(data + 1, source, length)
+            return 1
+
+        first.FData[0] = 0x10 | ((length >> 8) & 0x0F)
+        first.FData[1] = length & 0xFF
+        memmove(data + 2, source, 6)
+
+        index = 1
+        sequence = 0
+        for offset in range(6, length, 7):
+            sequence = (sequence + 1) & 0x0F
+            chunk_length = min(7, length - offset)
+            frame = frames[index]
+            frame.FIdentifier = identifier
+            data = addressof(frame) + data_offset
+            if chunk_length < 7:
+                ctypes.memset(data, self._padding, self.FRAME_LENGTH)
+            frame.FData[0] = 0x20 | sequence
+            memmove(data + 1, source + offset, chunk_length)
+            index += 1
+        return index
+
+    def _send_flow_control(self) -> bool:
+        frame = self._fc_frame
+        frame.FIdentifier = self._tx.identifier
+        ctypes.memset(ctypes.addressof(frame) + self._data_offset, self._padding, self.FRAME_LENGTH)
+        frame.FData[0] = 0x30 | FlowStatus.CTS
+        frame.FData[1] = self._rx_block_size
+        frame.FData[2] = self._rx_st_min
+        return self._transmit(frame, confirm=True)
+
+    def _transmit(self, frame, confirm: bool = False, on_confirmed: Callable[[], None] | None = None) -> bool:
+        """
+        Асинхронная отправка кадра, поток Qt не ждёт адаптер
+        :param confirm: SF/FF/FC - подтверждение отправки в шину ожидается в пределах N_As (таймер _n_as_timer)
+        :param on_confirmed: продолжение после подтверждения
+        :return: False, если адаптер не принял кадр
+        """
+        ret = self._can.transmit(frame)
+        self._tx_last_frame_at = time.perf_counter()
+        if ret is None or ret != 0:
+            self.abort()
+            self.signal_error.emit(f"ISO-TP: кадр не отправлен, код {ret}")
+            return False
+        if confirm and self._can.tx_confirmation_supported:
+            self._tx_confirmed_action = on_confirmed
+            self._n_as_timer.start(self._n_as_ms)
+        elif on_confirmed is not None:
+            on_confirmed()
+        return True
+
+    def _on_tx_confirmed(self, frame: CanFrame | None = None):
+        if not self._n_as_timer.isActive():
+            return
+        self._n_as_timer.stop()
+        action, self._tx_confirmed_action = self._tx_confirmed_action, None
+        if action is not None:
+            action()
+
+    def _on_n_as_timeout(self):
+        self.abort()
+        self.signal_error.emit(f"ISO-TP: нет подтверждения отправки кадра за {self._n_as_ms} мс (N_As)")
+
+    def _on_flow_control(self, data):
+        if self._tx_frames is None or not self._n_bs_timer.isActive():
+            return
+
+        self._n_bs_timer.stop()
+        self._flow_control.flow_status = data[0] & 0x0F
+        self._flow_control.block_size = data[1]
+        self._flow_control.sep_time = data[2]
+
+        if self._flow_control.flow_status == FlowStatus.WAIT:
+            self._tx_wait_count += 1
+            if self._tx_wait_count > self._max_wait_frames:
+                self.abort()
+                self.signal_error.emit("ISO-TP: превышено количество FlowControl WAIT")
+                return
+            self._n_bs_timer.start(self._n_bs_ms)
+            return
+
+        if self._flow_control.flow_status != FlowStatus.CTS:
+            self.abort()
+            self.signal_error.emit("ISO-TP: переполнение буфера приёмника (FlowControl OVFLW)")
+            return
+
+        frames_left = self._tx_frame_count - self._tx_frame_index
+        if self._flow_control.block_size == 0:
+            # BS = 0: весь остаток PDU без промежуточных FlowControl
+            self._tx_frames_left_in_window = frames_left
+        else:
+            self._tx_frames_left_in_window = min(self._flow_control.block_size, frames_left)
+
+        if self._scheduler is not None:
+            self._scheduler.request(self)
+            return
+
+        sep_time = self._flow_control.sep_time_seconds
+        if self._burst_mode and sep_time <= 0:
+            self._send_burst()
+        else:
+            # По одному CF на тик таймера; микросекундный STmin (0xF1-0xF9) округляется вверх до 1 мс
+            self._cf_timer.start(math.ceil(sep_time * 1000))
+
+    def _send_burst(self):
+        # STmin = 0: фреймы ставятся в очередь адаптера подряд (tsapp_transmit_can_async)
+        while self._tx_frames is not None and self._tx_frames_left_in_window > 0:
+            if not self._send_consecutive_frame():
+                return
+        self._after_window()
+
+    def _send_paced_frame(self):
+        if self._tx_frames is None or not self._send_consecutive_frame():
+            self._cf_timer.stop()
+            return
+        if self._tx_frames_left_in_window <= 0:
+            self._cf_timer.stop()
+            self._after_window()
+
+    def has_scheduled_frames(self) -> bool:
+        return self._tx_frames is not None and self._tx_frames_left_in_window > 0
+
+    def send_scheduled(self, max_frames: int) -> int:
+        """
+        Отправка CF по разрешению планировщика с соблюдением STmin
+        :param max_frames: выделенное количество фреймов
+        :return: количество отправленных фреймов
+        """
+        sep_time = self._flow_control.sep_time_seconds
+        sent = 0
+        while sent < max_frames and self.has_scheduled_frames():
+            if sep_time > 0 and time.perf_counter() < self._tx_last_frame_at + sep_time:
+                break
+            if not self._send_consecutive_frame():
+                return sent
+            sent += 1
+        if self._tx_frames is not None and self._tx_frames_left_in_window <= 0:
+            self._after_window()
+        return sent
+
+    def _send_consecutive_frame(self) -> bool:
+        if not self._transmit(self._tx_frames[self._tx_frame_index]):
+            return False
+
+        self._tx_frame_index += 1
+        self._tx_offset = min(self._tx_offset + 7, self._tx_length)
+        self._tx_frames_left_in_window -= 1
+        return True
+
+    def _after_window(self):
+        if self._tx_frames is None:
+            return
+        self.signal_progress.emit(self._tx_offset)
+        if self._tx_frame_index >= self._tx_frame_count:
+            self._tx_frames = None
+            self.signal_pdu_sent.emit()
+        else:
+            # Ждём очередной FlowControl после BS фреймов
+            self._n_bs_timer.start(self._n_bs_ms)
+
+    def _on_n_bs_timeout(self):
+        if self._tx_frames is None:
+            return
+        self.abort()
+        self.signal_error.emit("ISO-TP: таймаут ожидания FlowControl (N_Bs)")
+
+    # --------------------------------------------------------------------------------------------
+    # Приём
+    # --------------------------------------------------------------------------------------------
+
+    def on_new_frame(self, frame: CanFrame):
+        self.on_frame(frame.data)
+
+    def on_frame(self, data):
+        if not data:
+            return
+        # Ответ приёмника означает, что наш кадр ушёл в шину, даже если подтверждение ещё в очереди
+        if self._n_as_timer.isActive():
+            self._on_tx_confirmed()
+
+        frame_type = (data[0] >> 4) & 0x0F
+        if frame_type == FrameType.SINGLE:
+            length = data[0] & 0x0F
+            if 0 < length < len(data):
+                self.signal_pdu_received.emit(bytes(data[1:1 + length]))
+        elif frame_type == FrameType.FIRST:
+            self._on_first_frame(data)
+        elif frame_type == FrameType.CONSECUTIVE:
+            self._on_consecutive_frame(data)
+        elif frame_type == FrameType.FLOW_CONTROL:
+            if len(data) >= 3:
+                self._on_flow_control(data)
+
+    def _on_first_frame(self, data):
+        if len(data) < self.FRAME_LENGTH:
+            return
+        length = ((data[0] & 0x0F) << 8) | data[1]
+        if length <= 7:
+            return
+
+        self._rx_buffer = bytearray(length)
+        self._rx_buffer[:6] = bytes(data[2:8])
+        self._rx_offset = 6
+        self._rx_sequence = 0
+        self._rx_frames_in_window = 0
+
+        if not self._send_flow_control():
+            return
+        self._n_cr_timer.start(self._n_cr_ms)
+
+    def _on_consecutive_frame(self, data):
+        if self._rx_buffer is None:
+            return
+
+        sequence = data[0] & 0x0F
+        expected = (self._rx_sequence + 1) & 0x0F
+        if sequence != expected:
+            self._n_cr_timer.stop()
+            self._rx_buffer = None
+            self.signal_error.emit(f"ISO-TP: нарушена последовательность CF (ожидался {expected}, получен {sequence})")
+            return
+
+        self._rx_sequence = sequence
+        chunk_length = min(7, len(self._rx_buffer) - self._rx_offset, len(data) - 1)
+        self._rx_buffer[self._rx_offset:self._rx_offset + chunk_length] = bytes(data[1:1 + chunk_length])
+        self._rx_offset += chunk_length
+
+        if self._rx_offset >= len(self._rx_buffer):
+            self._n_cr_timer.stop()
+            pdu = bytes(self._rx_buffer)
+            self._rx_buffer = None
+            self.signal_pdu_received.emit(pdu)
+            return
+
+        self._rx_frames_in_window += 1
+        if self._rx_block_size and self._rx_frames_in_window >= self._rx_block_size:
+            self._rx_frames_in_window = 0
+            if not self._send_flow_control():
+                return
+        self._n_cr_timer.start(self._n_cr_ms)
+
+    def _on_n_cr_timeout(self):
+        if self._rx_buffer is None:
+            return
+        self._rx_buffer = None
+        self.signal_error.emit("ISO-TP: таймаут ожидания Consecutive Frame (N_Cr)")
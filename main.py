@@ -1,4 +1,5 @@
-﻿import logging
+﻿import argparse
+import logging
 import sys
 from pathlib import Path
 
@@ -7,7 +8,10 @@ from PySide6.QtGui import QGuiApplication
 from PySide6.QtQml import QQmlApplicationEngine
 from PySide6.QtQuickControls2 import QQuickStyle
 
+from app_can.CanDevice import CanDevice
+from app_can.TraceReplay import ReplayCanDevice, ReplayMode
 from ui.qml.app_controller import AppController
+from uds.data_identifiers import UdsData
 
 
 if __name__ == "__main__":
@@ -20,17 +24,35 @@ if __name__ == "__main__":
     QQuickStyle.setStyle("Fusion")
     QQuickStyle.setFallbackStyle("Basic")
 
-    app = QGuiApplication(sys.argv)
+    # Воспроизведение записи вместо адаптера: python main.py --replay traces/trace.cantrace [--replay-mode fast]
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--replay", default=None)
+    parser.add_argument("--replay-mode", choices=[mode.name.lower() for mode in ReplayMode], default="realtime")
+    parser.add_argument("--replay-speed", type=float, default=1.0)
+    args, qt_argv = parser.parse_known_args(sys.argv[1:])
+
+    app = QGuiApplication(sys.argv[:1] + qt_argv)
+
+    if args.replay:
+        CanDevice.set_instance(ReplayCanDevice(args.replay, ReplayMode[args.replay_mode.upper()], args.replay_speed))
 
     engine = QQmlApplicationEngine()
     controller = AppController()
     engine.rootContext().setContextProperty("appController", controller)
+    # Запись CAN в файл дописывается и закрывается до выхода
+    app.aboutToQuit.connect(controller.stopTraceRecording)
 
     if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
         base_path = Path(sys._MEIPASS)
     else:
         base_path = Path(__file__).resolve().parent
 
+    # Дополнительные описания DID рядом с приложением (необязательный файл)
+    definitions_dir = Path(sys.executable).parent if getattr(sys, "frozen", False) else base_path
+    definitions_path = definitions_dir / "data_identifiers.json"
+    if definitions_path.exists():
+        UdsData.load_definitions(str(definitions_path))
+
     qml_path = base_path / "ui" / "qml" / "Main.qml"
     engine.load(QUrl.fromLocalFile(str(qml_path)))
 
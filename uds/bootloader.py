@@ -1,11 +1,17 @@
 import enum
+import json
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
 
 from PySide6.QtCore import Slot, Signal, QObject, QTimer
 
-from app_can.BaseTranslator import BaseTranslator
-from app_can.CanDevice import CanDevice
 from colors import RowColor
+from isotp.isotp_channel import IsoTpChannel
 from uds.data_identifiers import UdsData
+from uds.firmware import FirmwareImage
+from uds.resume_journal import ResumeJournal
 from uds.services.ecu_reset import ServiceEcuReset
 from uds.services.read_data_by_id import ServiceReadDataById
 from uds.services.request_download import ServiceRequestDownload
@@ -17,6 +23,8 @@ from uds.services.transfer_data import ServiceTransferData
 from uds.services.write_data_by_id import ServiceWriteDataById
 from uds.uds_identifiers import UdsIdentifiers
 
+LOGGER = logging.getLogger(__name__)
+
 
 class BootloaderState(enum.IntEnum):
     ERROR = -1,
@@ -32,11 +40,8 @@ class BootloaderState(enum.IntEnum):
     ERASE_FIRMWARE = 5,
 
     REQUEST_DOWNLOAD = 6,
-    REQUEST_DOWNLOAD_CONSECUTIVE = 7
 
-    TRANSFER_DATA_FF = 8,
-    TRANSFER_DATA_FC = 9,
-    TRANSFER_DATA_CF = 10,
+    TRANSFER_DATA = 8,
 
     REQUEST_TRANSFER_EXIT = 11,
 
@@ -51,58 +56,260 @@ class BootloaderState(enum.IntEnum):
     READ_CAN_SOURCE_ADDRESS = 18
 
 
+# Этапы сценария программирования, на время которых включается аппаратная фильтрация приёма
+PROGRAMMING_STATES = frozenset((
+    BootloaderState.SET_PROGRAMMING_SESSION,
+    BootloaderState.REQUEST_SEED,
+    BootloaderState.SEED_VERIFICATION,
+    BootloaderState.WRITE_FINGERPRINT,
+    BootloaderState.ERASE_FIRMWARE,
+    BootloaderState.REQUEST_DOWNLOAD,
+    BootloaderState.TRANSFER_DATA,
+    BootloaderState.REQUEST_TRANSFER_EXIT,
+))
+
 ACTIVE_PROGRAM_APP = 0x00
 ACTIVE_PROGRAM_BOOTLOADER = 0x01
 
+NEGATIVE_RESPONSE_SID = 0x7F
+NRC_RESPONSE_PENDING = 0x78
+
+# Сообщения об ошибке этапов программирования (отрицательный или неожиданный ответ)
+PROGRAMMING_FAILURE_TEXT = {
+    BootloaderState.SET_PROGRAMMING_SESSION: "Ошибка перехода в сессию 'programming'",
+    BootloaderState.REQUEST_SEED: "Ошибка получения seed-фразы",
+    BootloaderState.SEED_VERIFICATION: "Ошибка получения доступа",
+    BootloaderState.WRITE_FINGERPRINT: "Ошибка записи fingerprint",
+    BootloaderState.ERASE_FIRMWARE: "Ошибка в процессе очистки памяти",
+    BootloaderState.REQUEST_DOWNLOAD: "Ошибка запроса на передачу данных",
+    BootloaderState.TRANSFER_DATA: "Ошибка передачи блока данных",
+    BootloaderState.REQUEST_TRANSFER_EXIT: "Ошибка завершения передачи данных",
+}
+
+
+@dataclass
+class PhaseTiming:
+    """
+    Отметка времени этапа сценария (сессия, seed, очистка, блок N, ...)
+    """
+    phase: str
+    state: BootloaderState
+    started_at: float
+    finished_at: float | None = None
+
+    @property
+    def duration(self) -> float:
+        if self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    def to_dict(self) -> dict:
+        return {
+            "phase": self.phase,
+            "state": self.state.name,
+            "started_at": self.started_at,
+            "duration": self.duration,
+        }
+
 
 class Bootloader(QObject):
     signal_new_state = Signal(str, RowColor)
     signal_data_sent = Signal(int)
+    signal_transfer_rate = Signal(float)
     signal_finished = Signal(bool)
     signal_source_address_applied = Signal(int, bool)
     signal_source_address_read = Signal(int, bool)
-
-    def __init__(self):
+    signal_phase_finished = Signal(str, float)  # этап, длительность, с
+
+    DEFAULT_P2_TIMEOUT_MS = 150  # ожидание ответа на запрос
+    DEFAULT_P2_STAR_TIMEOUT_MS = 5000  # ожидание ответа после NRC 0x78 (responsePending)
+    P2_CLIENT_MARGIN_MS = 50  # запас к значениям P2/P2*, сообщённым ЭБУ в ответе на 0x10
+    MAX_RETRIES = 3
+    RETRY_BACKOFF_MS = 100  # пауза перед первым повтором, далее удваивается
+    MAX_PENDING_RESPONSES = 60  # максимум NRC 0x78 подряд на один запрос
+    # Долгие операции ЭБУ могут идти секунды без NRC 0x78: для них P2 задаётся отдельно
+    ERASE_P2_TIMEOUT_MS = 30000
+    TRANSFER_EXIT_P2_TIMEOUT_MS = 5000
+    # Журнал подтверждённых блоков записывается не после каждого блока, а раз в N блоков или T мс
+    # и при неудачном завершении программирования
+    JOURNAL_SAVE_BLOCKS = 16
+    JOURNAL_SAVE_INTERVAL_MS = 1000
+
+    def __init__(self, channel: IsoTpChannel | None = None):
         super().__init__()
 
+        self._channel = channel if channel is not None else IsoTpChannel.instance()
         self._state: BootloaderState = BootloaderState.READY
 
-        self._binary_content = None
+        self._binary_content: FirmwareImage | None = None
         self._transfer_byte_order = "big"
         self._pending_source_address: int | None = None
         self._pending_rx_identifier: int | None = None
-
-        self._service_session = ServiceSession()
-        self._service_security_access = ServiceSecurityAccess()
-        self._service_write_data_by_id = ServiceWriteDataById()
-        self._service_routine_control = ServiceRoutineControl()
-        self._service_request_download = ServiceRequestDownload()
-        self._service_transfer_data = ServiceTransferData()
-        self._service_request_transfer_exit = ServiceRequestTransferExit()
-        self._service_ecu_reset = ServiceEcuReset()
-        self._service_read_data_by_id = ServiceReadDataById()
+        self._block_length_limit: int | None = None
+        self._journal_path: str | None = None
+        self._resume_offset = 0  # смещение образа, с которого продолжается прерванная загрузка
+        self._journal_unsaved_blocks = 0
+        self._journal_saved_at = 0.0
+
+        self._phase_timings: list[PhaseTiming] = []
+        self._current_phase: PhaseTiming | None = None
+        self._block_index = 0
+
+        # Таймеры ответа P2/P2*: значения по умолчанию, уточнённые ЭБУ, и заданные для отдельных состояний
+        self._p2_timeout_ms = self.DEFAULT_P2_TIMEOUT_MS
+        self._p2_star_timeout_ms = self.DEFAULT_P2_STAR_TIMEOUT_MS
+        self._response_timeouts: dict[BootloaderState, tuple[int, int]] = {}
+        self.set_response_timeout(BootloaderState.ERASE_FIRMWARE, self.ERASE_P2_TIMEOUT_MS, self.ERASE_P2_TIMEOUT_MS)
+        self.set_response_timeout(BootloaderState.REQUEST_TRANSFER_EXIT, self.TRANSFER_EXIT_P2_TIMEOUT_MS)
+        self._awaiting_response = False
+        self._request_sender: Callable[[], object] | None = None
+        self._retry_count = 0
+        self._pending_count = 0
+
+        self._response_timer = QTimer(self)
+        self._response_timer.setSingleShot(True)
+        self._response_timer.timeout.connect(self._on_response_timeout)
+
+        self._retry_timer = QTimer(self)
+        self._retry_timer.setSingleShot(True)
+        self._retry_timer.timeout.connect(self._resend_request)
+
+        self._service_session = ServiceSession(self._channel)
+        self._service_security_access = ServiceSecurityAccess(self._channel)
+        self._service_write_data_by_id = ServiceWriteDataById(self._channel)
+        self._service_routine_control = ServiceRoutineControl(self._channel)
+        self._service_request_download = ServiceRequestDownload(self._channel)
+        self._service_transfer_data = ServiceTransferData(self._channel)
+        self._service_request_transfer_exit = ServiceRequestTransferExit(self._channel)
+        self._service_ecu_reset = ServiceEcuReset(self._channel)
+        self._service_read_data_by_id = ServiceReadDataById(self._channel)
         self._service_request_download.set_byte_order(self._transfer_byte_order)
         self._service_read_data_by_id.set_byte_order(self._transfer_byte_order)
         self._service_write_data_by_id.set_byte_order(self._transfer_byte_order)
 
+        # SID запроса, ответ на который ожидается в каждом состоянии
+        self._request_sid: dict[BootloaderState, int] = {
+            BootloaderState.SET_PROGRAMMING_SESSION: 0x10,
+            BootloaderState.REQUEST_SEED: 0x27,
+            BootloaderState.SEED_VERIFICATION: 0x27,
+            BootloaderState.WRITE_FINGERPRINT: 0x2E,
+            BootloaderState.ERASE_FIRMWARE: 0x31,
+            BootloaderState.REQUEST_DOWNLOAD: 0x34,
+            BootloaderState.TRANSFER_DATA: 0x36,
+            BootloaderState.REQUEST_TRANSFER_EXIT: 0x37,
+            BootloaderState.ECU_UDS_RESET: 0x11,
+            BootloaderState.ECU_SOFTWARE_RESET: 0x11,
+            BootloaderState.READ_ACTIVE_PROGRAM: 0x22,
+            BootloaderState.WRITE_CAN_SOURCE_ADDRESS: 0x2E,
+            BootloaderState.READ_CAN_SOURCE_ADDRESS: 0x22,
+        }
+        handlers = {
+            BootloaderState.SET_PROGRAMMING_SESSION: self._on_programming_session,
+            BootloaderState.REQUEST_SEED: self._on_seed,
+            BootloaderState.SEED_VERIFICATION: self._on_key_accepted,
+            BootloaderState.WRITE_FINGERPRINT: self._on_fingerprint_written,
+            BootloaderState.ERASE_FIRMWARE: self._on_firmware_erased,
+            BootloaderState.REQUEST_DOWNLOAD: self._on_request_download,
+            BootloaderState.TRANSFER_DATA: self._on_block_acknowledged,
+            BootloaderState.REQUEST_TRANSFER_EXIT: self._on_transfer_exit,
+            BootloaderState.ECU_UDS_RESET: self._on_ecu_uds_reset,
+            BootloaderState.ECU_SOFTWARE_RESET: self._on_ecu_software_reset,
+            BootloaderState.READ_ACTIVE_PROGRAM: self._on_active_program,
+            BootloaderState.WRITE_CAN_SOURCE_ADDRESS: self._on_source_address_written,
+            BootloaderState.READ_CAN_SOURCE_ADDRESS: self._on_source_address_read,
+        }
+        # Таблица переходов: (состояние, SID положительного ответа) -> обработчик
+        self._handlers = {(state, self._request_sid[state] + 0x40): handler for state, handler in handlers.items()}
+
         self._source_address_timeout_timer = QTimer(self)
         self._source_address_timeout_timer.setSingleShot(True)
         self._source_address_timeout_timer.setInterval(2500)
         self._source_address_timeout_timer.timeout.connect(self._on_source_address_timeout)
 
         self._service_transfer_data.signal_data_sent.connect(self._handle_data_sent)
+        self._service_transfer_data.signal_transfer_rate.connect(self.signal_transfer_rate)
 
-        CanDevice.instance().signal_new_message.connect(self.on_new_message)
+        # Канал принимает только кадры своих rx идентификаторов (диспетчеризация CanDevice по ID)
+        self._channel.signal_pdu_received.connect(self.on_pdu_received)
+        self._channel.signal_error.connect(self._on_transport_error)
+        self._channel.signal_pdu_sent.connect(self._on_request_sent)
 
     @Slot(int)
     def _handle_data_sent(self, total_bytes):
         self.signal_data_sent.emit(total_bytes)
 
-    def set_firmware(self, binary_content: bytes):
+    @property
+    def state(self) -> BootloaderState:
+        return self._state
+
+    def set_firmware(self, binary_content: FirmwareImage | bytes):
+        if not isinstance(binary_content, FirmwareImage):
+            binary_content = FirmwareImage(binary_content)
         self._binary_content = binary_content
         if self._service_request_download is not None:
             self._service_request_download.set_memory_length(len(self._binary_content))
 
+    def set_block_length_limit(self, limit: int | None):
+        """
+        Пользовательское ограничение длины блока TransferData (SID + счетчик + данные)
+        :param limit: максимум байт или None, чтобы использовать maxNumberOfBlockLength от ЭБУ
+        """
+        self._block_length_limit = None if limit is None else int(limit)
+
+    @property
+    def journal_path(self) -> str | None:
+        return self._journal_path
+
+    def set_journal_path(self, file_path: str | None):
+        """
+        Файл журнала подтверждённых блоков для продолжения прерванной загрузки
+        :param file_path: путь к журналу или None, чтобы не вести журнал
+        """
+        self._journal_path = file_path or None
+
+    def resume_journal(self) -> ResumeJournal | None:
+        """
+        Журнал прерванной загрузки текущего образа
+        :return: журнал или None, если продолжение невозможно
+        """
+        if self._journal_path is None or self._binary_content is None:
+            return None
+        journal = ResumeJournal.load(self._journal_path)
+        if journal is None or journal.completed or not journal.matches(self._binary_content):
+            return None
+        if journal.memory_address != self._service_request_download.memory_address:
+            return None
+        return journal
+
+    def _save_journal_throttled(self):
+        if self._journal_path is None:
+            return
+        self._journal_unsaved_blocks += 1
+        if (self._journal_unsaved_blocks >= self.JOURNAL_SAVE_BLOCKS
+                or (time.perf_counter() - self._journal_saved_at) * 1000 >= self.JOURNAL_SAVE_INTERVAL_MS):
+            self._save_journal()
+
+    def _save_journal(self):
+        self._journal_unsaved_blocks = 0
+        self._journal_saved_at = time.perf_counter()
+        if self._journal_path is None:
+            return
+        ResumeJournal(
+            image_sha256=self._binary_content.sha256(),
+            image_length=len(self._binary_content),
+            memory_address=self._service_request_download.memory_address,
+            acknowledged_offset=self._service_transfer_data.acknowledged_offset,
+            block_sequence=self._service_transfer_data.block_sequence,
+        ).save(self._journal_path)
+
+    def _remove_journal(self):
+        self._journal_unsaved_blocks = 0
+        if self._journal_path is not None:
+            ResumeJournal.remove(self._journal_path)
+
+    def set_burst_mode(self, enabled: bool):
+        self._service_transfer_data.set_burst_mode(enabled)
+
     def set_transfer_byte_order(self, byte_order: str):
         order = str(byte_order).strip().lower()
         self._transfer_byte_order = order if order in ("big", "little") else "big"
@@ -113,6 +320,79 @@ class Bootloader(QObject):
         if self._service_write_data_by_id is not None:
             self._service_write_data_by_id.set_byte_order(self._transfer_byte_order)
 
+    def set_response_timeout(self, state: BootloaderState, p2_ms: int | None, p2_star_ms: int | None = None):
+        """
+        Таймауты ответа для отдельного запроса (например, долгая очистка памяти)
+        :param state: состояние, в котором ожидается ответ
+        :param p2_ms: P2, мс; None - вернуть общие значения
+        :param p2_star_ms: P2* после NRC 0x78, мс; None - общее значение
+        """
+        if p2_ms is None:
+            self._response_timeouts.pop(state, None)
+            return
+        self._response_timeouts[state] = (max(int(p2_ms), 1),
+                                          self.DEFAULT_P2_STAR_TIMEOUT_MS if p2_star_ms is None else max(int(p2_star_ms), 1))
+
+    def _response_timeout(self, pending: bool) -> int:
+        p2, p2_star = self._response_timeouts.get(self._state, (self._p2_timeout_ms, self._p2_star_timeout_ms))
+        return p2_star if pending else p2
+
+    # --------------------------------------------------------------------------------------------
+    # Отметки времени этапов
+    # --------------------------------------------------------------------------------------------
+
+    def phase_timings(self) -> list[PhaseTiming]:
+        """
+        Этапы последнего сценария с отметками времени (perf_counter)
+        """
+        return list(self._phase_timings)
+
+    def export_phase_timings(self, file_path: str) -> bool:
+        """
+        Сохранение длительностей этапов последнего сценария в JSON
+        :param file_path: путь к файлу
+        :return: True, если файл записан
+        """
+        try:
+            with open(file_path, "w", encoding="utf-8") as file:
+                json.dump([timing.to_dict() for timing in self._phase_timings], file, ensure_ascii=False, indent=2)
+            return True
+        except OSError as e:
+            LOGGER.error(f"Ошибка записи отметок времени этапов: {e}")
+            return False
+
+    def _enter(self, state: BootloaderState, phase: str | None = None):
+        """
+        Переход в состояние с закрытием текущего этапа и открытием нового
+        :param state: новое состояние
+        :param phase: название этапа; None - состояние без ожидания ответа (READY, ERROR)
+        """
+        now = time.perf_counter()
+        current = self._current_phase
+        if current is not None:
+            current.finished_at = now
+            self._current_phase = None
+            self.signal_phase_finished.emit(current.phase, current.duration)
+
+        self._state = state
+        if phase is not None:
+            self._current_phase = PhaseTiming(phase, state, now)
+            self._phase_timings.append(self._current_phase)
+
+    def _emit_phase_summary(self):
+        blocks = [timing.duration for timing in self._phase_timings if timing.state == BootloaderState.TRANSFER_DATA]
+        for timing in self._phase_timings:
+            if timing.state != BootloaderState.TRANSFER_DATA:
+                self.signal_new_state.emit(f"Этап '{timing.phase}': {timing.duration * 1000:.1f} мс", RowColor.blue)
+        if blocks:
+            self.signal_new_state.emit(
+                f"Блоки TransferData: {len(blocks)}, среднее {sum(blocks) / len(blocks) * 1000:.1f} мс, "
+                f"максимум {max(blocks) * 1000:.1f} мс", RowColor.blue)
+
+    # --------------------------------------------------------------------------------------------
+    # Команды
+    # --------------------------------------------------------------------------------------------
+
     def write_can_source_address(self, source_address: int) -> bool:
         if self._state != BootloaderState.READY:
             self.signal_new_state.emit("Загрузчик занят", RowColor.red)
@@ -135,7 +415,8 @@ class Bootloader(QObject):
 
         self._pending_source_address = source_address
         self._pending_rx_identifier = (current_rx_identifier & ~0xFF) | (source_address & 0xFF)
-        self._state = BootloaderState.WRITE_CAN_SOURCE_ADDRESS
+        self._channel.extra_rx_identifier = self._pending_rx_identifier
+        self._enter(BootloaderState.WRITE_CAN_SOURCE_ADDRESS, "write source address")
         self._source_address_timeout_timer.start()
         self.signal_new_state.emit(f"Отправлен запрос на изменение Source Address: 0x{source_address:02X}", RowColor.blue)
 
@@ -148,289 +429,456 @@ class Bootloader(QObject):
 
         current_tx_identifier = UdsIdentifiers.tx.identifier
         self._service_read_data_by_id.read_data_by_identifier(current_tx_identifier, UdsData.can_sa)
-        self._state = BootloaderState.READ_CAN_SOURCE_ADDRESS
+        self._enter(BootloaderState.READ_CAN_SOURCE_ADDRESS, "read source address")
         self._source_address_timeout_timer.start()
         self.signal_new_state.emit("Отправлен запрос на чтение Source Address", RowColor.blue)
         return True
 
     def _on_source_address_timeout(self):
-        if self._state not in (BootloaderState.WRITE_CAN_SOURCE_ADDRESS, BootloaderState.READ_CAN_SOURCE_ADDRESS):
-            return
-
         if self._state == BootloaderState.WRITE_CAN_SOURCE_ADDRESS:
-            source_address = self._pending_source_address if self._pending_source_address is not None else UdsIdentifiers.rx.src
             self.signal_new_state.emit("Таймаут применения Source Address", RowColor.red)
-            self.signal_source_address_applied.emit(source_address, False)
-        else:
-            current_source_address = UdsIdentifiers.rx.src
+            self._finish_source_address_write(False)
+        elif self._state == BootloaderState.READ_CAN_SOURCE_ADDRESS:
             self.signal_new_state.emit("Таймаут чтения Source Address", RowColor.red)
-            self.signal_source_address_read.emit(current_source_address, False)
-
-        self._pending_source_address = None
-        self._pending_rx_identifier = None
-        self._state = BootloaderState.READY
+            self._finish_source_address_read(None)
 
     def ecu_uds_reset(self):
-        self._service_ecu_reset.ecu_uds_reset()
-
-        self._state = BootloaderState.ECU_UDS_RESET
+        self._request(BootloaderState.ECU_UDS_RESET, "ecu reset", self._service_ecu_reset.ecu_uds_reset, retry=False)
         self.signal_new_state.emit("Запрос на сброс МК для перехода в загрузчик", RowColor.blue)
 
     def ecu_software_reset(self):
-        self._service_ecu_reset.ecu_software_reset()
-
-        self._state = BootloaderState.ECU_SOFTWARE_RESET
+        self._request(BootloaderState.ECU_SOFTWARE_RESET, "ecu reset", self._service_ecu_reset.ecu_software_reset,
+                      retry=False)
         self.signal_new_state.emit("Запрос на сброс МК для перехода в основную программу", RowColor.blue)
 
     def check_state(self):
-        self._service_read_data_by_id.read_data(UdsData.active_program)
-
-        self._state = BootloaderState.READ_ACTIVE_PROGRAM
+        self._request(BootloaderState.READ_ACTIVE_PROGRAM, "read active program",
+                      lambda: self._service_read_data_by_id.read_data(UdsData.active_program))
         self.signal_new_state.emit("Чтение статуса", RowColor.blue)
 
-    def start(self) -> bool:
-        if self._state == BootloaderState.READY:
+    def start(self, resume: bool = False) -> bool:
+        """
+        Запуск сценария программирования
+        :param resume: продолжить прерванную загрузку по журналу (без очистки памяти)
+        :return: False, если сценарий не запущен
+        """
+        if self._state != BootloaderState.READY:
+            self.signal_new_state.emit("Загрузчик не готов к работе", RowColor.red)
+            return False
+
+        if self._binary_content is None:
+            self.signal_new_state.emit("Не загружена основная программа", RowColor.red)
+            return False
+
+        self._service_transfer_data.set_firmware(self._binary_content)
 
-            if self._binary_content is None:
-                self.signal_new_state.emit("Не загружена основная программа", RowColor.red)
+        self._resume_offset = 0
+        if resume:
+            journal = self.resume_journal()
+            if journal is None:
+                self.signal_new_state.emit("Нет данных для продолжения загрузки этого образа", RowColor.red)
                 return False
+            self._resume_offset = journal.acknowledged_offset
+            self._service_transfer_data.resume_from(self._resume_offset)
+            self.signal_new_state.emit(
+                f"Продолжение загрузки с {self._resume_offset} из {journal.image_length} байт", RowColor.blue)
 
-            self._service_transfer_data.set_firmware(self._binary_content)
+        # На время программирования адаптер пропускает только диагностические кадры ЭБУ
+        self._channel.set_pass_filter_enabled(True)
 
-            self._state = BootloaderState.SET_PROGRAMMING_SESSION
-            self._service_session.set(Session.PROGRAMMING)
+        self._phase_timings = []
+        self._block_index = 0
+        self._journal_unsaved_blocks = 0
+        self._journal_saved_at = time.perf_counter()
+        self._p2_timeout_ms = self.DEFAULT_P2_TIMEOUT_MS
+        self._p2_star_timeout_ms = self.DEFAULT_P2_STAR_TIMEOUT_MS
+        self._request(BootloaderState.SET_PROGRAMMING_SESSION, "session",
+                      lambda: self._service_session.set(Session.PROGRAMMING))
 
-            self.signal_new_state.emit("Запрос на установку сессии 'programming'", RowColor.blue)
+        self.signal_new_state.emit("Запрос на установку сессии 'programming'", RowColor.blue)
 
-            return True
+        return True
+
+    # --------------------------------------------------------------------------------------------
+    # Приём ответов
+    # --------------------------------------------------------------------------------------------
+
+    def _request(self, state: BootloaderState, phase: str, sender: Callable[[], object],
+                 resender: Callable[[], object] | None = None, retry: bool = True):
+        """
+        Отправка запроса с ожиданием ответа по таймеру P2 и повторами при его отсутствии
+        :param state: состояние ожидания ответа
+        :param phase: название этапа для отметок времени
+        :param sender: отправка запроса
+        :param resender: повторная отправка того же запроса (по умолчанию sender)
+        :param retry: False - без повторов (ECUReset: повтор сбросил бы ЭБУ во время его загрузки)
+        """
+        self._enter(state, phase)
+        if not retry:
+            self._request_sender = None
         else:
-            self.signal_new_state.emit("Загрузчик не готов к работе", RowColor.red)
+            self._request_sender = resender if resender is not None else sender
+        self._retry_count = 0
+        self._send_request(sender)
+
+    def _send_request(self, sender: Callable[[], object]):
+        self._pending_count = 0
+        self._response_timer.stop()
+        # Таймер P2 запускается по окончании передачи PDU (signal_pdu_sent)
+        self._awaiting_response = True
+        sender()
+
+    @Slot()
+    def _on_request_sent(self):
+        if self._awaiting_response:
+            self._response_timer.start(self._response_timeout(False))
+
+    def _stop_response_timers(self):
+        self._awaiting_response = False
+        self._request_sender = None
+        self._response_timer.stop()
+        self._retry_timer.stop()
+
+    @Slot()
+    def _on_response_timeout(self):
+        if not self._awaiting_response:
+            return
+        timeout = self._response_timeout(self._pending_count > 0)
+        if self._state in (BootloaderState.ECU_UDS_RESET, BootloaderState.ECU_SOFTWARE_RESET):
+            # ЭБУ мог перезагрузиться, не успев ответить: запрос не повторяется
+            self._stop_response_timers()
+            self.signal_new_state.emit(f"Нет ответа на сброс за {timeout} мс, ЭБУ мог перезагрузиться",
+                                       RowColor.yellow)
+            self._enter(BootloaderState.READY)
+            return
+        self._retry(f"нет ответа за {timeout} мс")
+
+    def _retry(self, reason: str):
+        """
+        Повтор текущего запроса с экспоненциально растущей паузой либо завершение с ошибкой
+        :param reason: причина повтора для журнала
+        """
+        self._response_timer.stop()
+        self._awaiting_response = False
+        if self._request_sender is None or self._retry_count >= self.MAX_RETRIES:
+            self._on_failure(None, reason)
+            return
 
-            return False
+        delay = self.RETRY_BACKOFF_MS << self._retry_count
+        self._retry_count += 1
+        self._channel.abort()
+        self.signal_new_state.emit(
+            f"{reason.capitalize()}, повтор {self._retry_count}/{self.MAX_RETRIES} через {delay} мс", RowColor.yellow)
+        self._retry_timer.start(delay)
+
+    @Slot()
+    def _resend_request(self):
+        if self._request_sender is not None:
+            self._send_request(self._request_sender)
+
+    def _on_response_pending(self):
+        """
+        NRC 0x78: ЭБУ принял запрос, ожидание ответа продлевается до P2*
+        """
+        self._pending_count += 1
+        if self._pending_count > self.MAX_PENDING_RESPONSES:
+            self._on_failure(NRC_RESPONSE_PENDING, "превышено количество ответов 'response pending'")
+            return
+        if self._pending_count == 1:
+            self.signal_new_state.emit("ЭБУ обрабатывает запрос (NRC 0x78), ожидание ответа", RowColor.yellow)
+        self._response_timer.start(self._response_timeout(True))
+
+    def _adopt_server_timing(self):
+        """
+        Применение P2/P2*, сообщённых ЭБУ в ответе на DiagnosticSessionControl
+        """
+        p2 = self._service_session.p2_server_max_ms
+        p2_star = self._service_session.p2_star_server_max_ms
+        if p2 is not None:
+            self._p2_timeout_ms = max(self.DEFAULT_P2_TIMEOUT_MS, p2 + self.P2_CLIENT_MARGIN_MS)
+        if p2_star is not None:
+            self._p2_star_timeout_ms = max(self.DEFAULT_P2_STAR_TIMEOUT_MS, p2_star + self.P2_CLIENT_MARGIN_MS)
+
+    @Slot(str)
+    def _on_transport_error(self, text: str):
+        if self._state in (BootloaderState.READY, BootloaderState.ERROR):
+            return
+        if self._awaiting_response:
+            # Запрос не доставлен либо ответ потерян на транспортном уровне
+            self._retry(text)
+            return
+        if self._retry_timer.isActive():
+            return
+        self._channel.extra_rx_identifier = None
+        if self._state in PROGRAMMING_STATES:
+            self._finish_programming(False, text)
+            return
+        self.signal_new_state.emit(text, RowColor.red)
+        self._enter(BootloaderState.READY)
 
-    @Slot(str, str, str, str, list)
-    def on_new_message(self, _time, _id, _dir, _data_len_code, _data):
+    @Slot(bytes)
+    def on_pdu_received(self, pdu: bytes):
+        if not pdu:
+            return
 
-        identifier = BaseTranslator.to_int(_id)
+        handler = self._handlers.get((self._state, pdu[0]))
+        if handler is not None:
+            self._stop_response_timers()
+            handler(pdu)
+            return
 
-        if self._state == BootloaderState.WRITE_CAN_SOURCE_ADDRESS:
-            expected_identifier = UdsIdentifiers.rx.identifier
-            pending_identifier = self._pending_rx_identifier
-            if identifier != expected_identifier and identifier != pending_identifier:
+        if self._state not in self._request_sid:
+            # Ответ без активного запроса
+            return
+
+        if pdu[0] == NEGATIVE_RESPONSE_SID:
+            if len(pdu) < 3 or pdu[1] != self._request_sid[self._state]:
                 return
-        else:
-            if identifier != UdsIdentifiers.rx.identifier:
+            if pdu[2] == NRC_RESPONSE_PENDING and self._awaiting_response:
+                self._on_response_pending()
                 return
-
-        if (self._state == BootloaderState.SET_PROGRAMMING_SESSION and
-                not self._service_session.verify_answer(_data)):
-            self.signal_new_state.emit("Ошибка перехода в сессию 'programming'", RowColor.red)
-            self._state = BootloaderState.READY
+            self._on_failure(pdu[2])
             return
 
-        if (self._state == BootloaderState.READ_ACTIVE_PROGRAM and
-                not self._service_read_data_by_id.verify_answer_read_data(_data)):
-            self.signal_new_state.emit("Не удалось определить активную программу", RowColor.red)
-            self._state = BootloaderState.READY
+        # Положительный ответ на другой запрос (например, запоздавший ответ на уже повторённый запрос)
+        LOGGER.debug(f"Ответ 0x{pdu[0]:02X} не ожидается в состоянии {self._state.name}, пропущен")
+
+    def _on_failure(self, nrc: int | None, reason: str | None = None):
+        """
+        Отрицательный (0x7F), неожиданный или отсутствующий ответ в текущем состоянии
+        :param nrc: код отрицательного ответа или None
+        :param reason: пояснение (таймаут, ошибка транспорта) или None
+        """
+        self._stop_response_timers()
+        suffix = f" (NRC 0x{nrc:02X})" if nrc is not None else ""
+        if reason is not None:
+            suffix += f" ({reason})"
+
+        if self._state in PROGRAMMING_STATES:
+            self._finish_programming(False, PROGRAMMING_FAILURE_TEXT[self._state] + suffix)
+        elif self._state == BootloaderState.WRITE_CAN_SOURCE_ADDRESS:
+            self.signal_new_state.emit("Изменение Source Address отклонено" + suffix, RowColor.red)
+            self._finish_source_address_write(False)
+        elif self._state == BootloaderState.READ_CAN_SOURCE_ADDRESS:
+            self.signal_new_state.emit("Чтение Source Address отклонено" + suffix, RowColor.red)
+            self._finish_source_address_read(None)
+        elif self._state == BootloaderState.READ_ACTIVE_PROGRAM:
+            self.signal_new_state.emit("Не удалось определить активную программу" + suffix, RowColor.red)
+            self._enter(BootloaderState.READY)
+        else:
+            self.signal_new_state.emit("Ошибка сброса" + suffix, RowColor.red)
+            self._enter(BootloaderState.READY)
+
+    def _finish_programming(self, success: bool, text: str):
+        self.signal_new_state.emit(text, RowColor.green if success else RowColor.red)
+        self._enter(BootloaderState.READY)
+        self._channel.set_pass_filter_enabled(False)
+        if success:
+            self._remove_journal()
+            self._emit_phase_summary()
+        else:
+            if self._journal_unsaved_blocks:
+                self._save_journal()
+            journal = self.resume_journal()
+            if journal is not None:
+                self.signal_new_state.emit(
+                    f"Загрузку можно продолжить с {journal.acknowledged_offset} байт", RowColor.yellow)
+        self.signal_finished.emit(success)
+
+    def _on_programming_session(self, pdu: bytes):
+        if not self._service_session.verify_answer(pdu):
+            self._on_failure(None)
             return
 
-        if self._state == BootloaderState.SET_PROGRAMMING_SESSION:
-            if self._service_session.verify_answer(_data):
+        self.signal_new_state.emit("Сессия 'programming' установлена", RowColor.green)
+        self._adopt_server_timing()
 
-                self.signal_new_state.emit("Сессия 'programming' установлена", RowColor.green)
+        self._request(BootloaderState.REQUEST_SEED, "seed", self._service_security_access.request_seed)
 
-                self._state = BootloaderState.REQUEST_SEED
-                self._service_security_access.request_seed()
+        self.signal_new_state.emit("Запрос seed-фразы", RowColor.blue)
 
-                self.signal_new_state.emit("Запрос seed-фразы", RowColor.blue)
+    def _on_seed(self, pdu: bytes):
+        if not self._service_security_access.verify_answer_request_seed(pdu):
+            self._on_failure(None)
+            return
 
-            else:
-                self.signal_new_state.emit("Не удалось определить активную программу", RowColor.red)
-                self._state = BootloaderState.READY
-                return
-                self.signal_new_state.emit("Ошибка перехода в сессию 'programming'", RowColor.red)
+        self.signal_new_state.emit("Успешно получена seed-фраза", RowColor.green)
 
-        elif self._state == BootloaderState.REQUEST_SEED:
-            if self._service_security_access.verify_answer_request_seed(_data):
+        self._request(BootloaderState.SEED_VERIFICATION, "key", self._service_security_access.request_check_key)
 
-                self.signal_new_state.emit("Успешно получена seed-фраза", RowColor.green)
+        self.signal_new_state.emit("Запрос на проверку ключа доступа", RowColor.blue)
 
-                self._state = BootloaderState.SEED_VERIFICATION
-                self._service_security_access.request_check_key()
+    def _on_key_accepted(self, pdu: bytes):
+        if not self._service_security_access.verify_answer_request_check_key(pdu):
+            self._on_failure(None)
+            return
 
-                self.signal_new_state.emit("Запрос на проверку ключа доступа", RowColor.blue)
+        self.signal_new_state.emit("Доступ успешно получен", RowColor.green)
 
-            else:
-                self.signal_new_state.emit("Ошибочный ответ", RowColor.red)
+        if self._resume_offset:
+            # Fingerprint записан и память очищена в прерванной попытке
+            self._request_download()
+            return
 
-        elif self._state == BootloaderState.SEED_VERIFICATION:
-            if self._service_security_access.verify_answer_request_check_key(_data):
-                self.signal_new_state.emit("Доступ успешно получен", RowColor.green)
+        self._request(BootloaderState.WRITE_FINGERPRINT, "fingerprint",
+                      lambda: self._service_write_data_by_id.write_fingerprint(0xAA))
 
-                self._state = BootloaderState.WRITE_FINGERPRINT
-                self._service_write_data_by_id.write_fingerprint(0xAA)
+        self.signal_new_state.emit("Запись fingerprint", RowColor.blue)
 
-                self.signal_new_state.emit("Запись fingerprint", RowColor.blue)
+    def _on_fingerprint_written(self, pdu: bytes):
+        if not self._service_write_data_by_id.verify_answer_write_fingerprint(pdu):
+            self._on_failure(None)
+            return
 
-            else:
-                self.signal_new_state.emit("Ошибка получения доступа", RowColor.red)
+        self.signal_new_state.emit("Успешная запись fingerprint", RowColor.green)
 
-        elif self._state == BootloaderState.WRITE_FINGERPRINT:
-            if self._service_write_data_by_id.verify_answer_write_fingerprint(_data):
-                self.signal_new_state.emit("Успешная запись fingerprint", RowColor.green)
+        # Очистка не повторяется: повторный запрос перезапустил бы её в ЭБУ
+        self._request(BootloaderState.ERASE_FIRMWARE, "erase", self._service_routine_control.request_erase_firmware,
+                      retry=False)
 
-                self._state = BootloaderState.ERASE_FIRMWARE
-                self._service_routine_control.request_erase_firmware()
+        self.signal_new_state.emit("Запрос на очистку области памяти основной программы", RowColor.blue)
 
-                self.signal_new_state.emit("Запрос на очистку области памяти основной программы", RowColor.blue)
+    def _on_firmware_erased(self, pdu: bytes):
+        if not self._service_routine_control.verify_answer_erase_firmware(pdu):
+            self._on_failure(None)
+            return
 
-            else:
-                self.signal_new_state.emit("Ошибка записи fingerprint", RowColor.red)
+        self.signal_new_state.emit("Память успешно очищена", RowColor.green)
+        # Журнал предыдущей попытки больше не соответствует содержимому памяти
+        self._remove_journal()
 
-        elif self._state == BootloaderState.ERASE_FIRMWARE:
-            if self._service_routine_control.verify_answer_erase_firmware(_data):
-                self.signal_new_state.emit("Память успешно очищена", RowColor.green)
+        self._request_download()
 
-                self._state = BootloaderState.REQUEST_DOWNLOAD
-                self._service_request_download.request_download_first()
+    def _request_download(self):
+        offset = self._resume_offset
+        self._request(BootloaderState.REQUEST_DOWNLOAD, "request download",
+                      lambda: self._service_request_download.request_download(offset))
 
-                self.signal_new_state.emit("Запрос на программирование области памяти", RowColor.blue)
+        self.signal_new_state.emit("Запрос на программирование области памяти", RowColor.blue)
 
-            else:
-                self.signal_new_state.emit("Ошибка в процессе очистки памяти", RowColor.red)
+    def _on_request_download(self, pdu: bytes):
+        if not self._service_request_download.verify_request_download(pdu):
+            self._on_failure(None)
+            return
 
-        elif self._state == BootloaderState.REQUEST_DOWNLOAD:
-            # приходит FlowControl
-            if self._service_request_download.verify_flow_control(_data):
+        self.signal_new_state.emit("Успешный запрос на передачу данных", RowColor.green)
 
-                self._state = BootloaderState.REQUEST_DOWNLOAD_CONSECUTIVE
-                self._service_request_download.request_download_consecutive()
+        max_block_length = self._service_request_download.max_block_length
+        block_length = self._service_transfer_data.set_block_length(max_block_length, self._block_length_limit)
+        if max_block_length is None:
+            self.signal_new_state.emit(
+                f"ЭБУ не сообщил maxNumberOfBlockLength, размер блока {block_length} байт", RowColor.yellow)
+        else:
+            self.signal_new_state.emit(
+                f"Размер блока: {block_length} байт (ЭБУ допускает {max_block_length})", RowColor.blue)
 
-        elif self._state == BootloaderState.REQUEST_DOWNLOAD_CONSECUTIVE:
-            if self._service_request_download.verify_request_download(_data):
-                self.signal_new_state.emit("Успешный запрос на передачу данных", RowColor.green)
+        self._send_block()
 
-                self._state = BootloaderState.TRANSFER_DATA_FF
-                block_size = self._service_transfer_data.send_first_frame()
-                self.signal_new_state.emit(f"Передача блока ({block_size} байт)", RowColor.blue)
+    def _send_block(self):
+        self._block_index += 1
+        self._request(BootloaderState.TRANSFER_DATA, f"block {self._block_index}", self._transmit_block,
+                      self._service_transfer_data.resend_block)
 
-        elif self._state == BootloaderState.TRANSFER_DATA_FF:
-            if self._service_transfer_data.verify_flow_control(_data):
-                self._state = BootloaderState.TRANSFER_DATA_CF
-                self._service_transfer_data.send_consecutive_frames()
-            else:
-                self.signal_new_state.emit("Ошибка обработки flow control", RowColor.red)
-                self._state = BootloaderState.ERROR
+    def _transmit_block(self):
+        block_size = self._service_transfer_data.send_block()
+        self.signal_new_state.emit(f"Передача блока ({block_size} байт)", RowColor.blue)
 
-        elif self._state == BootloaderState.TRANSFER_DATA_CF:
-            if self._service_transfer_data.data_transferred():
-                self.signal_new_state.emit("Все данные переданы", RowColor.green)
+    def _on_block_acknowledged(self, pdu: bytes):
+        if not self._service_transfer_data.verify_answer_after_sent_block(pdu):
+            self._on_failure(None)
+            return
 
-                self._state = BootloaderState.REQUEST_TRANSFER_EXIT
-                self._service_request_transfer_exit.request_transfer_exit()
-                self.signal_new_state.emit("Завершение передачи", RowColor.blue)
+        self._save_journal_throttled()
 
-            else:
-                # После передачи полного блока (2048 байт)
-                # формируем другой блок, начиная с first frame
-                if self._service_transfer_data.block_transferred():
-                    if self._service_transfer_data.verify_answer_after_sent_block(_data):
-                        self._state = BootloaderState.TRANSFER_DATA_FF
-                        block_size = self._service_transfer_data.send_first_frame()
-                        self.signal_new_state.emit(f"Передача блока ({block_size} байт)", RowColor.blue)
-                else:
-                    # После передачи максимального количества фреймов в одном блоке,
-                    # принимаем очередной flow_control и из него берем очередное количество
-                    # фреймов (block_size) для последущей передачи
-                    if self._service_transfer_data.verify_flow_control(_data):
-                        self._service_transfer_data.send_consecutive_frames()
-                    else:
-                        self.signal_new_state.emit("Ошибка обработки flow control", RowColor.red)
-                        self._state = BootloaderState.ERROR
+        if not self._service_transfer_data.data_transferred():
+            # После подтверждения блока сразу отправляем следующий (фреймы подготовлены заранее)
+            self._send_block()
+            return
 
-        elif self._state == BootloaderState.REQUEST_TRANSFER_EXIT:
-            if self._service_request_transfer_exit.verify_answer_request_transfer_exit(_data):
-                self.signal_new_state.emit("Успешное завершение передачи данных", RowColor.green)
+        self._request(BootloaderState.REQUEST_TRANSFER_EXIT, "transfer exit",
+                      self._service_request_transfer_exit.request_transfer_exit)
 
-                self.signal_finished.emit(True)
-                self._state = BootloaderState.READY
+        self.signal_new_state.emit("Все данные переданы", RowColor.green)
+        rate = self._service_transfer_data.achieved_rate()
+        self.signal_new_state.emit(f"Средняя скорость передачи: {rate:.0f} байт/с", RowColor.green)
+        self.signal_new_state.emit("Завершение передачи", RowColor.blue)
 
-            else:
-                self.signal_new_state.emit("Ошибка завершения передачи данных", RowColor.red)
-                self._state = BootloaderState.ERROR
+    def _on_transfer_exit(self, pdu: bytes):
+        if not self._service_request_transfer_exit.verify_answer_request_transfer_exit(pdu):
+            self._on_failure(None)
+            return
 
-        elif self._state == BootloaderState.WRITE_CAN_SOURCE_ADDRESS:
-            if self._source_address_timeout_timer.isActive():
-                self._source_address_timeout_timer.stop()
+        self._finish_programming(True, "Успешное завершение передачи данных")
 
-            source_address = self._pending_source_address if self._pending_source_address is not None else UdsIdentifiers.rx.src
+    def _on_source_address_written(self, pdu: bytes):
+        if not self._service_write_data_by_id.verify_answer_write_data(pdu):
+            self._on_failure(None)
+            return
 
-            if self._service_write_data_by_id.verify_answer_write_data(_data):
-                UdsIdentifiers.set_src(source_address)
-                self.signal_new_state.emit(f"Source Address изменен: 0x{source_address:02X}", RowColor.green)
-                self.signal_source_address_applied.emit(source_address, True)
-            else:
-                self.signal_new_state.emit("Изменение Source Address отклонено", RowColor.red)
-                self.signal_source_address_applied.emit(source_address, False)
+        source_address = self._pending_source_address if self._pending_source_address is not None else UdsIdentifiers.rx.src
+        UdsIdentifiers.set_src(source_address)
+        self.signal_new_state.emit(f"Source Address изменен: 0x{source_address:02X}", RowColor.green)
+        self._finish_source_address_write(True)
 
-            self._pending_source_address = None
-            self._pending_rx_identifier = None
-            self._state = BootloaderState.READY
+    def _finish_source_address_write(self, success: bool):
+        if self._source_address_timeout_timer.isActive():
+            self._source_address_timeout_timer.stop()
 
-        elif self._state == BootloaderState.READ_CAN_SOURCE_ADDRESS:
-            if self._source_address_timeout_timer.isActive():
-                self._source_address_timeout_timer.stop()
+        source_address = self._pending_source_address if self._pending_source_address is not None else UdsIdentifiers.rx.src
+        self._pending_source_address = None
+        self._pending_rx_identifier = None
+        self._channel.extra_rx_identifier = None
+        self._enter(BootloaderState.READY)
+        self.signal_source_address_applied.emit(source_address, success)
 
-            current_source_address = UdsIdentifiers.rx.src
+    def _on_source_address_read(self, pdu: bytes):
+        if not self._service_read_data_by_id.verify_answer_read_data(pdu):
+            self._on_failure(None)
+            return
 
-            if self._service_read_data_by_id.verify_answer_read_data(_data):
-                source_address = self._service_read_data_by_id.parse_data_field(_data) & 0xFF
-                self.signal_new_state.emit(f"Source Address считан: 0x{source_address:02X}", RowColor.green)
-                self.signal_source_address_read.emit(source_address, True)
-            else:
-                self.signal_new_state.emit("Чтение Source Address отклонено", RowColor.red)
-                self.signal_source_address_read.emit(current_source_address, False)
+        source_address = self._service_read_data_by_id.parse_data_field(pdu) & 0xFF
+        self.signal_new_state.emit(f"Source Address считан: 0x{source_address:02X}", RowColor.green)
+        self._finish_source_address_read(source_address)
 
-            self._pending_source_address = None
-            self._pending_rx_identifier = None
-            self._state = BootloaderState.READY
+    def _finish_source_address_read(self, source_address: int | None):
+        if self._source_address_timeout_timer.isActive():
+            self._source_address_timeout_timer.stop()
 
-        elif self._state == BootloaderState.ECU_UDS_RESET:
-            if self._service_ecu_reset.verify_ecu_uds_reset(_data):
+        self._pending_source_address = None
+        self._pending_rx_identifier = None
+        self._enter(BootloaderState.READY)
+        if source_address is None:
+            self.signal_source_address_read.emit(UdsIdentifiers.rx.src, False)
+        else:
+            self.signal_source_address_read.emit(source_address, True)
 
-                self.signal_new_state.emit("Успешный сброс", RowColor.green)
-                self._state = BootloaderState.READY
-            else:
-                self.signal_new_state.emit("Ошибка сброса", RowColor.red)
-                self._state = BootloaderState.READY
+    def _on_ecu_uds_reset(self, pdu: bytes):
+        if not self._service_ecu_reset.verify_ecu_uds_reset(pdu):
+            self._on_failure(None)
+            return
 
-        elif self._state == BootloaderState.ECU_SOFTWARE_RESET:
-            if self._service_ecu_reset.verify_ecu_software_reset(_data):
+        self.signal_new_state.emit("Успешный сброс", RowColor.green)
+        self._enter(BootloaderState.READY)
 
-                self.signal_new_state.emit("Успешный сброс", RowColor.green)
-                self._state = BootloaderState.READY
-            else:
-                self.signal_new_state.emit("Ошибка сброса", RowColor.red)
-                self._state = BootloaderState.READY
+    def _on_ecu_software_reset(self, pdu: bytes):
+        if not self._service_ecu_reset.verify_ecu_software_reset(pdu):
+            self._on_failure(None)
+            return
 
-        elif self._state == BootloaderState.READ_ACTIVE_PROGRAM:
-            if self._service_read_data_by_id.verify_answer_read_data(_data):
-                active_program = self._service_read_data_by_id.parse_data_field(_data) & 0xFF
-                if active_program == ACTIVE_PROGRAM_BOOTLOADER:
-                    self.signal_new_state.emit("Загрузчик активен", RowColor.green)
-                elif active_program == ACTIVE_PROGRAM_APP:
-                    self.signal_new_state.emit("Основная программа активна", RowColor.green)
-                else:
-                    self.signal_new_state.emit(f"Неизвестный тип программы: 0x{active_program:02X}", RowColor.red)
-                self._state = BootloaderState.READY
-                return
+        self.signal_new_state.emit("Успешный сброс", RowColor.green)
+        self._enter(BootloaderState.READY)
 
-                self.signal_new_state.emit("Загрузчик активен", RowColor.green)
-                self._state = BootloaderState.READY
-            else:
-                self.signal_new_state.emit("Загрузчик не активен", RowColor.red)
-                self._state = BootloaderState.READY
+    def _on_active_program(self, pdu: bytes):
+        if not self._service_read_data_by_id.verify_answer_read_data(pdu):
+            self.signal_new_state.emit("Загрузчик не активен", RowColor.red)
+            self._enter(BootloaderState.READY)
+            return
 
-        if self._state == BootloaderState.ERROR:
-            pass
-            # CanDevice.instance().signal_new_message.disconnect(self.on_new_message)
+        active_program = self._service_read_data_by_id.parse_data_field(pdu) & 0xFF
+        if active_program == ACTIVE_PROGRAM_BOOTLOADER:
+            self.signal_new_state.emit("Загрузчик активен", RowColor.green)
+        elif active_program == ACTIVE_PROGRAM_APP:
+            self.signal_new_state.emit("Основная программа активна", RowColor.green)
+        else:
+            self.signal_new_state.emit(f"Неизвестный тип программы: 0x{active_program:02X}", RowColor.red)
+        self._enter(BootloaderState.READY)
@@ -0,0 +1,337 @@
+"""
+Асинхронный клиент UDS поверх IsoTpChannel.
+
+Ответы сопоставляются с запросами в обработчике signal_pdu_received канала и завершают futures asyncio,
+поэтому цикл asyncio должен работать в потоке Qt (QtAsyncio):
+
+    async def read_vin():
+        uds = UdsClient.for_node(0x25, 0xF1)
+        await uds.diagnostic_session_control(Session.EXTENDED)
+        return await uds.read_did(0xF190)
+
+    QtAsyncio.run(read_vin(), keep_running=False)
+
+Один клиент - один ЭБУ: запросы клиента выполняются по очереди, запросы разных клиентов
+(разных ЭБУ) могут ожидать ответа одновременно.
+"""
+import asyncio
+import logging
+
+from PySide6.QtCore import QObject, Slot
+
+from app_can.CanDevice import CanDevice
+from isotp.isotp_channel import IsoTpChannel
+from j1939.j1939_can_identifier import J1939CanIdentifier
+from uds.data_identifiers import UdsVar
+from uds.services.ecu_reset import EcuResetType
+from uds.services.security_access import ServiceSecurityAccess
+from uds.services.session import ServiceSession, Session
+from uds.uds_identifiers import UdsIdentifiers
+
+LOGGER = logging.getLogger(__name__)
+
+NEGATIVE_RESPONSE_SID = 0x7F
+NRC_RESPONSE_PENDING = 0x78
+SUPPRESS_POSITIVE_RESPONSE = 0x80
+
+
+class UdsError(Exception):
+    """
+    Ошибка выполнения запроса UDS
+    """
+
+
+class UdsNegativeResponse(UdsError):
+    """
+    Отрицательный ответ ЭБУ (0x7F)
+    """
+
+    def __init__(self, sid: int, nrc: int):
+        super().__init__(f"Отрицательный ответ на запрос 0x{sid:02X}: NRC 0x{nrc:02X}")
+        self.sid = sid
+        self.nrc = nrc
+
+
+class UdsTimeout(UdsError, TimeoutError):
+    """
+    Нет ответа за P2 (P2* после NRC 0x78)
+    """
+
+
+class UdsResponseFormatError(UdsError):
+    """
+    Положительный ответ не соответствует запросу (идентификатор, длина записей)
+    """
+
+
+class UdsTransportError(UdsError):
+    """
+    Ошибка ISO-TP при передаче запроса или приёме ответа
+    """
+
+
+class UdsClient(QObject):
+    """
+    Асинхронный клиент UDS одного ЭБУ
+    """
+
+    DEFAULT_P2_TIMEOUT_MS = 150
+    DEFAULT_P2_STAR_TIMEOUT_MS = 5000
+    P2_CLIENT_MARGIN_MS = 50
+    MAX_PENDING_RESPONSES = 60
+
+    def __init__(self, channel: IsoTpChannel | None = None, owns_channel: bool = False):
+        """
+        :param channel: канал ISO-TP (по умолчанию общий канал IsoTpChannel.instance())
+        :param owns_channel: True - канал создан для клиента и закрывается в close()
+        """
+        super().__init__()
+
+        self._channel = channel if channel is not None else IsoTpChannel.instance()
+        self._owns_channel = owns_channel and channel is not None
+        self._byte_order = "big"
+        self._p2_timeout_ms = self.DEFAULT_P2_TIMEOUT_MS
+        self._p2_star_timeout_ms = self.DEFAULT_P2_STAR_TIMEOUT_MS
+
+        self._lock: asyncio.Lock | None = None
+        self._pending: asyncio.Future | None = None
+        self._pending_sid = 0
+        self._pending_count = 0
+        self._timeout_handle: asyncio.TimerHandle | None = None
+
+        self._channel.signal_pdu_received.connect(self._on_pdu_received)
+        self._channel.signal_pdu_sent.connect(self._on_pdu_sent)
+        self._channel.signal_error.connect(self._on_transport_error)
+
+    @classmethod
+    def for_node(cls, device_address: int, tester_address: int, can: CanDevice | None = None) -> "UdsClient":
+        """
+        Клиент с собственным каналом ISO-TP для узла с заданным Source Address;
+        приоритет и PGN берутся из UdsIdentifiers
+        :param device_address: SA устройства
+        :param tester_address: SA тестера
+        """
+        tx = J1939CanIdentifier(UdsIdentifiers.tx.identifier)
+        rx = J1939CanIdentifier(UdsIdentifiers.rx.identifier)
+        tx.src = tester_address & 0xFF
+        tx.dst = device_address & 0xFF
+        rx.src = device_address & 0xFF
+        rx.dst = tester_address & 0xFF
+        return cls(IsoTpChannel(tx, rx, can), owns_channel=True)
+
+    @property
+    def channel(self) -> IsoTpChannel:
+        return self._channel
+
+    def set_byte_order(self, byte_order: str):
+        """
+        Порядок байт идентификаторов DID и routine в запросах
+        """
+        order = str(byte_order).strip().lower()
+        self._byte_order = order if order in ("big", "little") else "big"
+
+    def set_response_timeout(self, p2_ms: int, p2_star_ms: int):
+        self._p2_timeout_ms = int(p2_ms)
+        self._p2_star_timeout_ms = int(p2_star_ms)
+
+    def close(self):
+        self._channel.signal_pdu_received.disconnect(self._on_pdu_received)
+        self._channel.signal_pdu_sent.disconnect(self._on_pdu_sent)
+        self._channel.signal_error.disconnect(self._on_transport_error)
+        self._fail(UdsTransportError("Клиент закрыт"))
+        if self._owns_channel:
+            # Иначе канал остаётся подписанным на rx идентификатор и отвечает FlowControl на чужие FF
+            self._channel.close()
+            self._owns_channel = False
+
+    async def request(self, pdu: bytes | bytearray, expect_response: bool = True) -> bytes:
+        """
+        Отправка запроса и ожидание положительного ответа
+        :param pdu: запрос (SID и параметры)
+        :param expect_response: False - не ждать ответа (suppressPosMsgIndication, broadcast-команды)
+        :return: положительный ответ целиком (SID + 0x40 и данные) либо b"" без ожидания
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            if not expect_response:
+                if not self._channel.send(bytes(pdu)):
+                    raise UdsTransportError(f"Запрос 0x{pdu[0]:02X} не отправлен")
+                return b""
+
+            future = loop.create_future()
+            self._pending = future
+            self._pending_sid = pdu[0]
+            self._pending_count = 0
+            try:
+                if not self._channel.send(bytes(pdu)):
+                    # signal_error канала мог уже завершить future ошибкой: забираем её, чтобы asyncio
+                    # не сообщал о неполученном исключении
+                    if future.done() and not future.cancelled():
+                        future.exception()
+                    else:
+                        future.cancel()
+                    raise UdsTransportError(f"Запрос 0x{pdu[0]:02X} не отправлен")
+                return await future
+            finally:
+                self._cancel_timeout()
+                self._pending = None
+
+    async def diagnostic_session_control(self, session: Session) -> bytes:
+        """
+        Переход в сессию; P2/P2* из ответа ЭБУ применяются к следующим запросам
+        """
+        response = await self.request(bytes([0x10, session]))
+        service = ServiceSession(self._channel)
+        if service.verify_answer(response):
+            if service.p2_server_max_ms is not None:
+                self._p2_timeout_ms = max(self.DEFAULT_P2_TIMEOUT_MS,
+                                          service.p2_server_max_ms + self.P2_CLIENT_MARGIN_MS)
+            if service.p2_star_server_max_ms is not None:
+                self._p2_star_timeout_ms = max(self.DEFAULT_P2_STAR_TIMEOUT_MS,
+                                               service.p2_star_server_max_ms + self.P2_CLIENT_MARGIN_MS)
+        return response
+
+    async def ecu_reset(self, reset_type: EcuResetType = EcuResetType.SOFTWARE_RESET,
+                        suppress_response: bool = False) -> bytes:
+        sub_function = int(reset_type) | (SUPPRESS_POSITIVE_RESPONSE if suppress_response else 0)
+        return await self.request(bytes([0x11, sub_function]), expect_response=not suppress_response)
+
+    async def tester_present(self, suppress_response: bool = True) -> bytes:
+        sub_function = SUPPRESS_POSITIVE_RESPONSE if suppress_response else 0
+        return await self.request(bytes([0x3E, sub_function]), expect_response=not suppress_response)
+
+    async def security_access(self, level: int = 0x01) -> bool:
+        """
+        Запрос seed и отправка ключа (алгоритм ServiceSecurityAccess)
+        :param level: нечётный уровень запроса seed, ключ отправляется на level + 1
+        :return: True, если доступ получен (нулевой seed - доступ уже открыт)
+        """
+        response = await self.request(bytes([0x27, level]))
+        if len(response) < 4:
+            raise UdsResponseFormatError("Короткий ответ на запрос seed")
+        seed = (response[3] << 8) | response[2]
+        if seed == 0:
+            return True
+        key = ServiceSecurityAccess.calc_key(seed)
+        await self.request(bytes([0x27, level + 1, (key >> 8) & 0xFF, key & 0xFF]))
+        return True
+
+    async def read_did(self, did: int | UdsVar) -> bytes:
+        """
+        ReadDataByIdentifier (0x22) одного DID
+        :return: dataRecord без SID и идентификатора
+        """
+        pid = did.pid if isinstance(did, UdsVar) else int(did)
+        response = await self.request(bytes([0x22, *self._id_to_bytes(pid)]))
+        if len(response) < 3 or self._id_from_bytes(response[1:3]) != pid:
+            raise UdsResponseFormatError(f"Ответ не относится к DID 0x{pid:04X}")
+        return bytes(response[3:])
+
+    async def read_dids(self, dids: list[UdsVar]) -> dict[int, bytes]:
+        """
+        ReadDataByIdentifier (0x22) нескольких DID одним запросом.
+        Записи ответа разбираются по размерам из UdsVar; DID, не поддержанные ЭБУ, в ответе отсутствуют
+        :param dids: переменные в порядке запроса
+        :return: {DID: dataRecord}
+        """
+        if len(dids) == 1:
+            return {dids[0].pid: await self.read_did(dids[0])}
+
+        by_pid = {var.pid: var for var in dids}
+        request = bytes([0x22]) + b"".join(self._id_to_bytes(var.pid) for var in dids)
+        response = await self.request(request)
+
+        records: dict[int, bytes] = {}
+        position = 1
+        while position < len(response):
+            pid = self._id_from_bytes(response[position:position + 2])
+            var = by_pid.get(pid)
+            end = position + 2 + (var.size if var is not None else 0)
+            if var is None or pid in records or end > len(response):
+                raise UdsResponseFormatError(f"Ответ на запрос нескольких DID не разобран (смещение {position})")
+            records[pid] = bytes(response[position + 2:end])
+            position = end
+        return records
+
+    async def write_did(self, did: int | UdsVar, data: bytes | bytearray) -> bytes:
+        pid = did.pid if isinstance(did, UdsVar) else int(did)
+        response = await self.request(bytes([0x2E, *self._id_to_bytes(pid)]) + bytes(data))
+        if len(response) < 3 or self._id_from_bytes(response[1:3]) != pid:
+            raise UdsResponseFormatError(f"Ответ не относится к DID 0x{pid:04X}")
+        return response
+
+    async def routine_control(self, routine_id: int, sub_function: int = 0x01,
+                              option: bytes | bytearray = b"") -> bytes:
+        """
+        RoutineControl (0x31)
+        :param routine_id: идентификатор процедуры
+        :param sub_function: 0x01 - запуск, 0x02 - остановка, 0x03 - запрос результата
+        :param option: routineControlOptionRecord
+        :return: routineStatusRecord
+        """
+        request = bytes([0x31, sub_function, *self._id_to_bytes(routine_id)]) + bytes(option)
+        response = await self.request(request)
+        if len(response) < 4 or response[1] != sub_function or self._id_from_bytes(response[2:4]) != routine_id:
+            raise UdsResponseFormatError(f"Ответ не относится к процедуре 0x{routine_id:04X}")
+        return bytes(response[4:])
+
+    def _id_to_bytes(self, identifier: int) -> bytes:
+        return (int(identifier) & 0xFFFF).to_bytes(2, self._byte_order)
+
+    def _id_from_bytes(self, data) -> int:
+        return int.from_bytes(bytes(data), self._byte_order)
+
+    def _start_timeout(self, timeout_ms: int):
+        self._cancel_timeout()
+        loop = self._pending.get_loop()
+        self._timeout_handle = loop.call_later(timeout_ms / 1000, self._on_timeout, timeout_ms)
+
+    def _cancel_timeout(self):
+        if self._timeout_handle is not None:
+            self._timeout_handle.cancel()
+            self._timeout_handle = None
+
+    def _fail(self, error: UdsError):
+        if self._pending is not None and not self._pending.done():
+            self._pending.set_exception(error)
+        self._cancel_timeout()
+
+    def _on_timeout(self, timeout_ms: int):
+        self._timeout_handle = None
+        self._channel.abort()
+        self._fail(UdsTimeout(f"Нет ответа на запрос 0x{self._pending_sid:02X} за {timeout_ms} мс"))
+
+    @Slot()
+    def _on_pdu_sent(self):
+        if self._pending is not None and not self._pending.done():
+            self._start_timeout(self._p2_timeout_ms)
+
+    @Slot(bytes)
+    def _on_pdu_received(self, pdu: bytes):
+        if self._pending is None or self._pending.done() or not pdu:
+            return
+
+        if pdu[0] == NEGATIVE_RESPONSE_SID:
+            if len(pdu) < 3 or pdu[1] != self._pending_sid:
+                return
+            if pdu[2] == NRC_RESPONSE_PENDING:
+                self._pending_count += 1
+                if self._pending_count > self.MAX_PENDING_RESPONSES:
+                    self._fail(UdsNegativeResponse(self._pending_sid, NRC_RESPONSE_PENDING))
+                else:
+                    self._start_timeout(self._p2_star_timeout_ms)
+                return
+            self._fail(UdsNegativeResponse(self._pending_sid, pdu[2]))
+            return
+
+        if pdu[0] != self._pending_sid + 0x40:
+            LOGGER.debug(f"Ответ 0x{pdu[0]:02X} не относится к запросу 0x{self._pending_sid:02X}")
+            return
+        self._cancel_timeout()
+        self._pending.set_result(bytes(pdu))
+
+    @Slot(str)
+    def _on_transport_error(self, text: str):
+        self._fail(UdsTransportError(text))
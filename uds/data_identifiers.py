@@ -1,9 +1,30 @@
+import json
+import logging
+from types import MappingProxyType
+
+LOGGER = logging.getLogger(__name__)
+
+
 class UdsVar:
+    """
+    Описание DID: идентификатор, размер записи и описание. Экземпляры неизменяемы
+    """
+
+    __slots__ = ("_pid", "_size", "_description")
 
     def __init__(self, pid, size, description):
-        self._pid: int = pid
-        self._size: int = size
-        self._description: str = description
+        object.__setattr__(self, "_pid", int(pid))
+        object.__setattr__(self, "_size", int(size))
+        object.__setattr__(self, "_description", str(description))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"UdsVar неизменяем: {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"UdsVar неизменяем: {name}")
+
+    def __repr__(self) -> str:
+        return f"UdsVar(0x{self._pid:04X}, {self._size}, {self._description!r})"
 
     @property
     def pid(self) -> int:
@@ -17,9 +38,29 @@ class UdsVar:
     def description(self) -> str:
         return self._description
 
+    @property
+    def is_numeric(self) -> bool:
+        # Калибровки и служебные значения - целые до 4 байт, идентификационные DID - строки
+        return self._size <= 4
+
+    def decode(self, raw: bytes | bytearray):
+        """
+        Значение DID из dataRecord ответа 0x62
+        :param raw: байты записи
+        :return: int для числовых DID (little-endian, как parse_data_field) или str
+        """
+        if self.is_numeric:
+            return int.from_bytes(bytes(raw[:self._size]), "little")
+        return bytes(raw).rstrip(b"\x00\xff ").decode("ascii", errors="replace")
+
 
 class UdsData:
-    vars = {
+    """
+    Каталог DID. vars доступен только для чтения; индексы по порядку и по DID пересчитываются
+    при регистрации дополнительных DID (register, load_definitions)
+    """
+
+    vars = MappingProxyType({
         "can_baud_rate"     : UdsVar(0x0010, 1, "Скорость CAN шины"),
         "can_sa"            : UdsVar(0x0011, 1, "Адрес источника данных"),
         "empty_fuel_tank"   : UdsVar(0x0012, 2, "Пустой бак"),
@@ -52,7 +93,7 @@ class UdsData:
         "vmecuscvndid"      : UdsVar(0xF1A1, 32, "Номер версии конфигурации ПО ЭБУ изготовителя ТС"),
         "idoptvms"          : UdsVar(0xF1A2, 256, "Опции идентификации определенного устройства/ТС производителем ТС"),
         "idoptsss"          : UdsVar(0xF1F0, 256, "Опции идентификации определенного устройства/ТС поставщиком системы")
-    }
+    })
 
     can_baud_rate       = vars.get("can_baud_rate")
     can_sa              = vars.get("can_sa")
@@ -87,18 +128,77 @@ class UdsData:
     idoptvms            = vars.get("idoptvms")
     idoptsss            = vars.get("idoptsss")
 
+    _by_index: tuple[UdsVar, ...] = tuple(vars.values())
+    _by_pid: dict[int, UdsVar] = {var.pid: var for var in _by_index}
+    _names: dict[int, str] = {var.pid: name for name, var in vars.items()}
+
     @classmethod
     def get_pid(cls, index: int) -> int | None:
-        if index > len(cls.vars) or index < 0:
-            return None
-        return list(cls.vars.values())[index].pid
+        var = cls.get_var(index)
+        return var.pid if var is not None else None
 
     @classmethod
     def get_var(cls, index) -> UdsVar | None:
-        if index > len(cls.vars) or index < 0:
+        if index >= len(cls._by_index) or index < 0:
             return None
-        return list(cls.vars.values())[index]
+        return cls._by_index[index]
+
+    @classmethod
+    def by_pid(cls, pid: int) -> UdsVar | None:
+        return cls._by_pid.get(pid)
+
+    @classmethod
+    def name_of(cls, pid: int) -> str | None:
+        return cls._names.get(pid)
+
+    @classmethod
+    def in_range(cls, first_pid: int, last_pid: int) -> list[UdsVar]:
+        return [var for var in cls._by_index if first_pid <= var.pid <= last_pid]
 
     @classmethod
     def descriptions(cls) -> list:
-        return [var.description for var in cls.vars.values()]
+        return [var.description for var in cls._by_index]
+
+    @classmethod
+    def register(cls, name: str, var: UdsVar):
+        """
+        Добавление DID в каталог
+        :param name: имя переменной (ключ vars)
+        :param var: описание DID
+        """
+        if name in cls.vars:
+            raise ValueError(f"Имя DID уже занято: {name}")
+        if var.pid in cls._by_pid:
+            raise ValueError(f"DID 0x{var.pid:04X} уже описан как {cls._names[var.pid]}")
+
+        cls.vars = MappingProxyType({**cls.vars, name: var})
+        cls._by_index = cls._by_index + (var,)
+        cls._by_pid = {**cls._by_pid, var.pid: var}
+        cls._names = {**cls._names, var.pid: name}
+
+    @classmethod
+    def load_definitions(cls, file_path: str) -> int:
+        """
+        Загрузка дополнительных DID из JSON:
+        {"имя": {"did": "0xF1A5", "size": 16, "description": "..."}, ...}
+        :param file_path: путь к файлу
+        :return: количество добавленных DID
+        """
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                definitions = json.load(file)
+        except (OSError, ValueError) as e:
+            LOGGER.error(f"Описания DID не прочитаны: {e}")
+            return 0
+
+        loaded = 0
+        for name, definition in definitions.items():
+            try:
+                did = definition["did"]
+                pid = int(did, 0) if isinstance(did, str) else int(did)
+                cls.register(name, UdsVar(pid, definition["size"], definition.get("description", name)))
+                loaded += 1
+            except (KeyError, TypeError, ValueError) as e:
+                LOGGER.warning(f"Описание DID '{name}' пропущено: {e}")
+        LOGGER.info(f"Загружено описаний DID: {loaded}")
+        return loaded
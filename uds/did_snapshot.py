@@ -0,0 +1,136 @@
+import logging
+import time
+from dataclasses import dataclass, field
+
+from uds.client import UdsClient, UdsNegativeResponse, UdsResponseFormatError
+from uds.data_identifiers import UdsData, UdsVar
+
+LOGGER = logging.getLogger(__name__)
+
+# Диапазон идентификационных DID
+IDENTIFICATION_FIRST_DID = 0xF180
+IDENTIFICATION_LAST_DID = 0xF1FF
+
+# NRC, с которыми ЭБУ отклоняет запрос нескольких DID целиком: дальше DID читаются по одному
+NRC_MULTI_DID_REJECTED = frozenset((
+    0x12,  # subFunctionNotSupported
+    0x13,  # incorrectMessageLengthOrInvalidFormat
+    0x14,  # responseTooLong
+    0x31,  # requestOutOfRange
+))
+
+
+@dataclass
+class DidSnapshot:
+    """
+    Результат чтения набора DID
+    """
+    values: dict[str, int | str] = field(default_factory=dict)  # имя из UdsData.vars -> значение
+    raw: dict[str, bytes] = field(default_factory=dict)
+    unsupported: dict[str, int] = field(default_factory=dict)  # имя -> NRC
+    requests: int = 0
+    duration: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "values": dict(self.values),
+            "unsupported": {name: f"0x{nrc:02X}" for name, nrc in self.unsupported.items()},
+            "requests": self.requests,
+            "duration": self.duration,
+        }
+
+
+class DidSnapshotReader:
+    """
+    Чтение набора DID за минимальное число запросов 0x22: несколько DID в одном запросе,
+    пока ответ помещается в PDU ISO-TP; ответы длиннее одного кадра собирает IsoTpChannel.
+    Если ЭБУ не принимает запрос нескольких DID, остальные читаются по одному
+    """
+
+    MAX_RESPONSE_LENGTH = 4095  # максимальная длина PDU ISO-TP (FF_DL 12 бит)
+    DEFAULT_DIDS_PER_REQUEST = 8
+
+    def __init__(self, client: UdsClient, dids_per_request: int = DEFAULT_DIDS_PER_REQUEST):
+        self._client = client
+        self._dids_per_request = max(int(dids_per_request), 1)
+
+    @property
+    def dids_per_request(self) -> int:
+        return self._dids_per_request
+
+    async def read_identification(self) -> DidSnapshot:
+        # Каталог читается при вызове: учитываются DID, загруженные из файла описаний
+        return await self.read(UdsData.in_range(IDENTIFICATION_FIRST_DID, IDENTIFICATION_LAST_DID))
+
+    async def read(self, variables: list[UdsVar]) -> DidSnapshot:
+        """
+        Чтение DID
+        :param variables: переменные каталога UdsData
+        :return: значения по именам; DID, отклонённые ЭБУ, - в unsupported
+        """
+        snapshot = DidSnapshot()
+        started_at = time.perf_counter()
+
+        for group in self._groups(variables):
+            if len(group) > 1 and self._dids_per_request > 1:
+                try:
+                    snapshot.requests += 1
+                    records = await self._client.read_dids(group)
+                except UdsNegativeResponse as e:
+                    if e.nrc not in NRC_MULTI_DID_REJECTED:
+                        raise
+                    LOGGER.info(f"ЭБУ не принимает запрос нескольких DID (NRC 0x{e.nrc:02X}), чтение по одному")
+                    self._dids_per_request = 1
+                except UdsResponseFormatError as e:
+                    # Длина записей отличается от каталога (строки переменной длины): разбор возможен только по одной
+                    LOGGER.info(f"{e}, чтение по одному")
+                    self._dids_per_request = 1
+                else:
+                    for var in group:
+                        if var.pid in records:
+                            self._store(snapshot, var, records[var.pid])
+                        else:
+                            # Неподдержанные DID ЭБУ пропускает в ответе на запрос нескольких DID
+                            snapshot.unsupported[self._name(var)] = 0x31
+                    continue
+
+            for var in group:
+                snapshot.requests += 1
+                try:
+                    self._store(snapshot, var, await self._client.read_did(var))
+                except UdsNegativeResponse as e:
+                    snapshot.unsupported[self._name(var)] = e.nrc
+
+        snapshot.duration = time.perf_counter() - started_at
+        return snapshot
+
+    def _groups(self, variables: list[UdsVar]) -> list[list[UdsVar]]:
+        groups: list[list[UdsVar]] = []
+        group: list[UdsVar] = []
+        response_length = 1
+        for var in variables:
+            record_length = 2 + var.size
+            if group and (len(group) >= self._dids_per_request
+                          or response_length + record_length > self.MAX_RESPONSE_LENGTH):
+                groups.append(group)
+                group, response_length = [], 1
+            group.append(var)
+            response_length += record_length
+        if group:
+            groups.append(group)
+        return groups
+
+    def _name(self, var: UdsVar) -> str:
+        return UdsData.name_of(var.pid) or f"0x{var.pid:04X}"
+
+    def _store(self, snapshot: DidSnapshot, var: UdsVar, raw: bytes):
+        name = self._name(var)
+        snapshot.raw[name] = raw
+        snapshot.values[name] = var.decode(raw)
+
+
+async def read_identification(client: UdsClient) -> DidSnapshot:
+    """
+    Чтение всех идентификационных DID ЭБУ
+    """
+    return await DidSnapshotReader(client).read_identification()
@@ -1,4 +1,7 @@
+import hashlib
 import logging
+import mmap
+import os
 from enum import Enum
 
 LOGGER = logging.getLogger(__name__)
@@ -10,20 +13,93 @@ class FirmwareState(Enum):
     loading_error = 1
 
 
+class FirmwareImage:
+    """
+    Образ прошивки, доступный через memoryview без копирования.
+    Содержимое хранится в bytearray (файл читается через readinto) или в приватном
+    отображении файла mmap (ACCESS_COPY), срезы блоков и фреймов выдаются как memoryview.
+    """
+
+    def __init__(self, data: bytes | bytearray | memoryview | mmap.mmap):
+        self._mmap = data if isinstance(data, mmap.mmap) else None
+        self._view = memoryview(data).cast("B")
+        self._sha256: str | None = None
+
+    @classmethod
+    def from_file(cls, file_path: str, use_mmap: bool = False) -> "FirmwareImage":
+        """
+        Загрузка образа из BIN файла
+        :param file_path: путь к файлу
+        :param use_mmap: отобразить файл в память вместо чтения в буфер
+        :return: образ прошивки
+        """
+        with open(file_path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if use_mmap and size > 0:
+                # ACCESS_COPY: страницы читаются с диска по мере обращения, файл не изменяется
+                return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY))
+
+            buffer = bytearray(size)
+            read = file.readinto(buffer)
+            if read != size:
+                del buffer[read:]
+            return cls(buffer)
+
+    @property
+    def view(self) -> memoryview:
+        return self._view
+
+    @property
+    def is_mapped(self) -> bool:
+        return self._mmap is not None
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def block(self, offset: int, length: int) -> memoryview:
+        """
+        Срез образа без копирования
+        :param offset: смещение начала блока
+        :param length: максимальная длина блока (обрезается по концу образа)
+        :return: memoryview на данные блока
+        """
+        return self._view[offset:offset + length]
+
+    def sha256(self) -> str:
+        """
+        SHA-256 содержимого образа (вычисляется один раз)
+        :return: хэш в шестнадцатеричном виде
+        """
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self._view).hexdigest()
+        return self._sha256
+
+    def close(self):
+        if self._mmap is None:
+            return
+        try:
+            self._view.release()
+            self._mmap.close()
+            self._mmap = None
+        except BufferError as e:
+            # Срезы образа ещё используются, отображение закроется сборщиком мусора
+            LOGGER.warning(f"Образ прошивки используется, mmap не закрыт: {e}")
+
+
 class Firmware:
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, use_mmap: bool = False):
         self._errcode: FirmwareState = FirmwareState.no_errors
-        self._binary_content = self._open_file(file_path)
+        self._use_mmap = use_mmap
+        self._image = self._open_file(file_path)
 
-    def _open_file(self, file_path: str) -> bytes | None:
+    def _open_file(self, file_path: str) -> FirmwareImage | None:
         file = None
         if file_path:
             try:
-                # Открываем файл в бинарном режиме и читаем его содержимое
-                with open(file_path, "rb") as file:
-                    file = file.read()
-                    self._errcode = FirmwareState.successfully_uploaded
+                # Открываем файл в бинарном режиме и читаем его содержимое без промежуточных копий
+                file = FirmwareImage.from_file(file_path, self._use_mmap)
+                self._errcode = FirmwareState.successfully_uploaded
             except Exception as e:
                 self._errcode = FirmwareState.loading_error
                 LOGGER.error(f"Ошибка при открытии файла: {e}")
@@ -38,10 +114,16 @@ class Firmware:
         return self._errcode
 
     @property
-    def binary_content(self) -> bytes:
-        return self._binary_content
+    def image(self) -> FirmwareImage | None:
+        return self._image
+
+    @property
+    def binary_content(self) -> memoryview | None:
+        if self._image is None:
+            return None
+        return self._image.view
 
     def binary_content_size(self) -> int:
-        if self._binary_content is None:
+        if self._image is None:
             return 0
-        return len(self._binary_content)
+        return len(self._image)
@@ -0,0 +1,258 @@
+"""
+Программирование без графического интерфейса (станции конца линии, скрипты):
+
+    python -m uds.flash firmware.bin --device 0 --channel 0 --baud 500 --sa 0x25
+
+Прогресс выводится в stdout строками JSON (одно событие на строку), журнал модулей - в stderr.
+Код возврата: EXIT_OK, если все узлы запрограммированы, иначе один из EXIT_*.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, Slot
+
+from app_can.CanDevice import CanDevice, CanReceiveMode
+from app_can.TraceRecorder import TraceRecorder
+from app_can.TraceReplay import ReplayCanDevice, ReplayMode
+from colors import RowColor
+from uds.firmware import Firmware, FirmwareImage, FirmwareState
+from uds.flash_session import FlashBatch
+from uds.uds_identifiers import UdsIdentifiers
+
+LOGGER = logging.getLogger(__name__)
+
+EXIT_OK = 0
+EXIT_PROGRAMMING_FAILED = 1  # хотя бы один узел не запрограммирован
+EXIT_USAGE = 2  # ошибка аргументов (код argparse)
+EXIT_FIRMWARE_ERROR = 3
+EXIT_ADAPTER_ERROR = 4
+EXIT_TIMEOUT = 5
+
+
+def _address(text: str) -> int:
+    value = int(text, 0)
+    if not 0 <= value <= 0xFF:
+        raise argparse.ArgumentTypeError(f"адрес вне диапазона 0..0xFF: {text}")
+    return value
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m uds.flash",
+                                     description="Программирование ЭБУ по CAN/UDS без графического интерфейса")
+    parser.add_argument("image", help="BIN-файл прошивки")
+    parser.add_argument("--device", type=int, default=0, help="индекс адаптера TSCAN (по умолчанию 0)")
+    parser.add_argument("--channel", type=int, default=0, help="индекс канала CAN адаптера (с 0)")
+    parser.add_argument("--baud", type=int, default=500, choices=(125, 250, 500, 1000), help="скорость CAN, кбит/с")
+    parser.add_argument("--terminator", action="store_true", help="включить терминатор адаптера")
+    parser.add_argument("--fifo", action="store_true", help="приём через FIFO драйвера вместо callback")
+    parser.add_argument("--sa", type=_address, action="append", dest="device_addresses",
+                        help="Source Address ЭБУ; можно указать несколько раз "
+                             "(по умолчанию - из настроенных идентификаторов UDS)")
+    parser.add_argument("--tester-sa", type=_address, default=None, help="Source Address тестера")
+    parser.add_argument("--byte-order", choices=("big", "little"), default="big",
+                        help="порядок байт адреса и длины RequestDownload")
+    parser.add_argument("--block-limit", type=int, default=None, help="ограничение длины блока TransferData")
+    parser.add_argument("--resume", action="store_true",
+                        help="продолжить прерванную загрузку по журналу (узлы без журнала программируются полностью)")
+    parser.add_argument("--no-journal", action="store_true", help="не вести журнал продолжения загрузки")
+    parser.add_argument("--reset-before", action=argparse.BooleanOptionalAction, default=True,
+                        help="сброс ЭБУ в загрузчик перед программированием")
+    parser.add_argument("--reset-delay-ms", type=int, default=650, help="пауза после сброса в загрузчик")
+    parser.add_argument("--reset-after", action=argparse.BooleanOptionalAction, default=True,
+                        help="сброс успешно запрограммированных ЭБУ в основное ПО")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="записать кадры канала в файл (.cantrace, продолжения - PATH_001, ...)")
+    parser.add_argument("--replay", metavar="PATH", default=None,
+                        help="вместо адаптера воспроизвести запись (--record): ответы ЭБУ берутся из файла")
+    parser.add_argument("--replay-mode", choices=[mode.name.lower() for mode in ReplayMode], default="lockstep",
+                        help="lockstep - ответ после каждого запроса, realtime - по времени записи, fast - без пауз")
+    parser.add_argument("--timeout", type=float, default=600.0, help="общий таймаут, с")
+    parser.add_argument("--verbose", action="store_true", help="журнал модулей уровня INFO в stderr")
+    return parser.parse_args(argv)
+
+
+class FlashRunner(QObject):
+    """
+    Программирование узлов одного канала с выводом событий в stdout строками JSON
+    """
+
+    def __init__(self, args: argparse.Namespace, can: CanDevice, image: FirmwareImage):
+        super().__init__()
+
+        self._args = args
+        self._image = image
+        self._started_at = time.perf_counter()
+        self._exit_code: int | None = None
+
+        tester_address = args.tester_sa if args.tester_sa is not None else int(UdsIdentifiers.tx.src) & 0xFF
+        device_addresses = args.device_addresses or [int(UdsIdentifiers.rx.src) & 0xFF]
+
+        self._batch = FlashBatch(can)
+        for device_address in device_addresses:
+            self._batch.add_node(device_address, tester_address)
+        self._batch.set_firmware(image)
+        self._batch.set_transfer_byte_order(args.byte_order)
+        self._batch.set_block_length_limit(args.block_limit)
+        if not args.no_journal:
+            self._batch.set_journal_prefix(args.image)
+        self._batch.signal_new_state.connect(self._on_state)
+        self._batch.signal_data_sent.connect(self._on_data_sent)
+        self._batch.signal_session_finished.connect(self._on_session_finished)
+        self._batch.signal_finished.connect(self._on_batch_finished)
+
+        self._timeout_timer = QTimer(self)
+        self._timeout_timer.setSingleShot(True)
+        self._timeout_timer.timeout.connect(self._on_timeout)
+
+    @staticmethod
+    def emit_event(event: str, **fields):
+        """
+        Вывод события строкой JSON в stdout
+        :param event: тип события (start, state, progress, node, record, done, error)
+        """
+        print(json.dumps({"event": event, **fields}, ensure_ascii=False), flush=True)
+
+    @property
+    def exit_code(self) -> int | None:
+        return self._exit_code
+
+    @Slot()
+    def start(self):
+        sessions = self._batch.sessions()
+        self.emit_event("start",
+                        image=self._args.image,
+                        length=len(self._image),
+                        sha256=self._image.sha256(),
+                        nodes=[session.device_address for session in sessions])
+        self._timeout_timer.start(int(self._args.timeout * 1000))
+
+        if self._args.reset_before:
+            for session in sessions:
+                session.reset_to_bootloader()
+            QTimer.singleShot(self._args.reset_delay_ms, self._start_batch)
+        else:
+            self._start_batch()
+
+    def _start_batch(self):
+        if self._exit_code is not None:
+            return
+        if self._batch.start(self._args.resume) == 0:
+            self.emit_event("error", text="Программирование не запущено")
+
+    @Slot(int, str, RowColor)
+    def _on_state(self, device_address: int, text: str, color: RowColor):
+        if color == RowColor.red:
+            level = "error"
+        elif color == RowColor.green:
+            level = "ok"
+        else:
+            level = "info"
+        self.emit_event("state", sa=device_address, level=level, text=text)
+
+    @Slot(int, int)
+    def _on_data_sent(self, device_address: int, total_bytes: int):
+        length = max(len(self._image), 1)
+        self.emit_event("progress", sa=device_address, bytes=total_bytes, total=len(self._image),
+                        percent=round(total_bytes * 100 / length, 1))
+
+    @Slot(int, bool)
+    def _on_session_finished(self, device_address: int, success: bool):
+        self.emit_event("node", sa=device_address, success=success)
+
+    @Slot(int, int)
+    def _on_batch_finished(self, succeeded: int, total: int):
+        exit_code = EXIT_OK if succeeded == total else EXIT_PROGRAMMING_FAILED
+        # Сессии закрываются после выхода из обработчиков сигналов пакета
+        QTimer.singleShot(0, lambda: self._finish(exit_code))
+
+    @Slot()
+    def _on_timeout(self):
+        self.emit_event("error", text=f"Таймаут программирования ({self._args.timeout:g} с)")
+        for session in self._batch.sessions():
+            session.channel.abort()
+        self._finish(EXIT_TIMEOUT)
+
+    def _finish(self, exit_code: int):
+        if self._exit_code is not None:
+            return
+        self._exit_code = exit_code
+        self._timeout_timer.stop()
+
+        results = self._batch.results()
+        sessions = self._batch.sessions()
+        if self._args.reset_after:
+            for session in sessions:
+                if results.get(session.device_address):
+                    session.reset_to_application()
+        self._batch.close()
+
+        self.emit_event("done",
+                        exit_code=exit_code,
+                        succeeded=sum(1 for success in results.values() if success),
+                        total=len(sessions),
+                        duration=round(time.perf_counter() - self._started_at, 3))
+        QCoreApplication.exit(exit_code)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        stream=sys.stderr,
+    )
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+
+    firmware = Firmware(args.image, use_mmap=True)
+    if firmware.state != FirmwareState.successfully_uploaded or firmware.image is None:
+        FlashRunner.emit_event("error", text=f"Не удалось открыть BIN-файл: {args.image}")
+        return EXIT_FIRMWARE_ERROR
+    if len(firmware.image) == 0:
+        FlashRunner.emit_event("error", text=f"BIN-файл пуст: {args.image}")
+        return EXIT_FIRMWARE_ERROR
+
+    if args.replay:
+        can = ReplayCanDevice(args.replay, ReplayMode[args.replay_mode.upper()], channel=args.channel)
+    else:
+        can = CanDevice.for_channel(args.device, args.channel)
+    can.set_tx_echo(False)
+    recorder: TraceRecorder | None = None
+    try:
+        handle = can.connect_to(args.device)
+        if handle is None or handle.value == 0:
+            FlashRunner.emit_event("error", text=f"Не удалось подключиться к адаптеру {args.device}")
+            return EXIT_ADAPTER_ERROR
+
+        receive_mode = CanReceiveMode.FIFO if args.fifo else CanReceiveMode.CALLBACK
+        can.start_trace(args.channel, args.baud, args.terminator, receive_mode)
+        if not can.is_trace:
+            FlashRunner.emit_event("error", text=f"Не удалось запустить канал {args.channel}")
+            return EXIT_ADAPTER_ERROR
+
+        if args.record:
+            recorder = TraceRecorder(args.record, args.channel)
+            recorder.start()
+            can.set_recorder(recorder)
+
+        runner = FlashRunner(args, can, firmware.image)
+        QTimer.singleShot(0, runner.start)
+        app.exec()
+        return runner.exit_code if runner.exit_code is not None else EXIT_PROGRAMMING_FAILED
+    finally:
+        if recorder is not None:
+            can.set_recorder(None)
+            recorder.stop()
+            FlashRunner.emit_event("record", files=recorder.files, frames=recorder.frame_count,
+                                   dropped=recorder.dropped_count)
+        if can.is_trace:
+            can.stop_trace()
+        can.disconnect_device()
+        CanDevice.release(can)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
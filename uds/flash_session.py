@@ -0,0 +1,233 @@
+import logging
+
+from PySide6.QtCore import QObject, Signal, Slot
+
+from app_can.CanDevice import CanDevice
+from colors import RowColor
+from isotp.frame_scheduler import FrameScheduler
+from isotp.isotp_channel import IsoTpChannel
+from j1939.j1939_can_identifier import J1939CanIdentifier
+from uds.bootloader import Bootloader, BootloaderState
+from uds.firmware import FirmwareImage
+from uds.services.ecu_reset import ServiceEcuReset
+from uds.uds_identifiers import UdsIdentifiers
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FlashSession(QObject):
+    """
+    Программирование одного ЭБУ: собственная пара tx/rx идентификаторов,
+    канал ISO-TP и экземпляры сервисов (через Bootloader)
+    """
+
+    signal_new_state = Signal(int, str, RowColor)  # SA устройства, текст, цвет
+    signal_data_sent = Signal(int, int)  # SA устройства, байт
+    signal_finished = Signal(int, bool)  # SA устройства, успех
+
+    def __init__(self,
+                 tx: J1939CanIdentifier,
+                 rx: J1939CanIdentifier,
+                 can: CanDevice | None = None,
+                 scheduler: FrameScheduler | None = None):
+        super().__init__()
+
+        # Копии идентификаторов: изменения UdsIdentifiers не затрагивают сессию
+        self._tx = J1939CanIdentifier(tx.identifier)
+        self._rx = J1939CanIdentifier(rx.identifier)
+        self._channel = IsoTpChannel(self._tx, self._rx, can)
+        self._channel.set_scheduler(scheduler)
+        self._bootloader = Bootloader(self._channel)
+
+        self._bootloader.signal_new_state.connect(self._on_new_state)
+        self._bootloader.signal_data_sent.connect(self._on_data_sent)
+        self._bootloader.signal_finished.connect(self._on_finished)
+
+    @classmethod
+    def for_node(cls,
+                 device_address: int,
+                 tester_address: int,
+                 can: CanDevice | None = None,
+                 scheduler: FrameScheduler | None = None) -> "FlashSession":
+        """
+        Сессия для узла с заданным Source Address; приоритет и PGN берутся из UdsIdentifiers
+        :param device_address: SA устройства
+        :param tester_address: SA тестера
+        """
+        tx = J1939CanIdentifier(UdsIdentifiers.tx.identifier)
+        rx = J1939CanIdentifier(UdsIdentifiers.rx.identifier)
+        tx.src = tester_address & 0xFF
+        tx.dst = device_address & 0xFF
+        rx.src = device_address & 0xFF
+        rx.dst = tester_address & 0xFF
+        return cls(tx, rx, can, scheduler)
+
+    @property
+    def device_address(self) -> int:
+        return self._rx.src
+
+    @property
+    def tx(self) -> J1939CanIdentifier:
+        return self._tx
+
+    @property
+    def rx(self) -> J1939CanIdentifier:
+        return self._rx
+
+    @property
+    def channel(self) -> IsoTpChannel:
+        return self._channel
+
+    @property
+    def bootloader(self) -> Bootloader:
+        return self._bootloader
+
+    def is_active(self) -> bool:
+        return self._bootloader.state not in (BootloaderState.READY, BootloaderState.ERROR)
+
+    def start(self, resume: bool = False) -> bool:
+        return self._bootloader.start(resume)
+
+    def reset_to_bootloader(self):
+        """
+        Запрос перехода ЭБУ в загрузчик без ожидания ответа
+        """
+        ServiceEcuReset(self._channel).ecu_uds_reset()
+
+    def reset_to_application(self):
+        """
+        Запрос перехода ЭБУ в основное ПО без ожидания ответа
+        """
+        ServiceEcuReset(self._channel).ecu_software_reset()
+
+    def close(self):
+        self._channel.close()
+
+    @Slot(str, RowColor)
+    def _on_new_state(self, text: str, color: RowColor):
+        self.signal_new_state.emit(self.device_address, text, color)
+
+    @Slot(int)
+    def _on_data_sent(self, total_bytes: int):
+        self.signal_data_sent.emit(self.device_address, total_bytes)
+
+    @Slot(bool)
+    def _on_finished(self, success: bool):
+        self.signal_finished.emit(self.device_address, success)
+
+
+class FlashBatch(QObject):
+    """
+    Параллельное программирование нескольких ЭБУ на одном канале CAN.
+    Сессии делят CanDevice и FrameScheduler, который чередует их CF в пределах бюджета шины
+    """
+
+    signal_new_state = Signal(int, str, RowColor)
+    signal_data_sent = Signal(int, int)
+    signal_session_finished = Signal(int, bool)
+    signal_finished = Signal(int, int)  # успешно, всего
+
+    def __init__(self, can: CanDevice | None = None, bus_load: float = FrameScheduler.DEFAULT_BUS_LOAD):
+        super().__init__()
+
+        self._can = can if can is not None else CanDevice.instance()
+        self._scheduler = FrameScheduler(self._can, bus_load)
+        self._sessions: dict[int, FlashSession] = {}
+        self._results: dict[int, bool] = {}
+        self._running = False
+
+    @property
+    def scheduler(self) -> FrameScheduler:
+        return self._scheduler
+
+    def sessions(self) -> list[FlashSession]:
+        return list(self._sessions.values())
+
+    def results(self) -> dict[int, bool]:
+        return dict(self._results)
+
+    def is_running(self) -> bool:
+        return self._running
+
+    def add_node(self, device_address: int, tester_address: int) -> FlashSession:
+        """
+        Добавление узла в пакет (повторное добавление возвращает существующую сессию)
+        :param device_address: SA устройства
+        :param tester_address: SA тестера
+        """
+        device_address &= 0xFF
+        session = self._sessions.get(device_address)
+        if session is not None:
+            return session
+
+        session = FlashSession.for_node(device_address, tester_address, self._can, self._scheduler)
+        session.signal_new_state.connect(self.signal_new_state)
+        session.signal_data_sent.connect(self.signal_data_sent)
+        session.signal_finished.connect(self._on_session_finished)
+        self._sessions[device_address] = session
+        return session
+
+    def set_firmware(self, image: FirmwareImage):
+        # Образ общий для всех сессий: блоки выдаются как memoryview без копирования
+        for session in self._sessions.values():
+            session.bootloader.set_firmware(image)
+
+    def set_journal_prefix(self, prefix: str | None):
+        """
+        Журналы продолжения загрузки: <prefix>.<SA>.resume.json для каждого узла
+        """
+        for device_address, session in self._sessions.items():
+            path = None if prefix is None else f"{prefix}.{device_address:02X}.resume.json"
+            session.bootloader.set_journal_path(path)
+
+    def set_block_length_limit(self, limit: int | None):
+        for session in self._sessions.values():
+            session.bootloader.set_block_length_limit(limit)
+
+    def set_transfer_byte_order(self, byte_order: str):
+        for session in self._sessions.values():
+            session.bootloader.set_transfer_byte_order(byte_order)
+
+    def start(self, resume: bool = False) -> int:
+        """
+        Запуск всех сессий пакета
+        :param resume: продолжить загрузку узлов, для которых есть журнал этого образа;
+                       остальные узлы программируются полностью
+        :return: количество запущенных сессий
+        """
+        if self._running or not self._sessions:
+            return 0
+
+        self._results = {}
+        self._running = True
+        started = 0
+        for device_address, session in self._sessions.items():
+            if session.start(resume and session.bootloader.resume_journal() is not None):
+                started += 1
+            else:
+                self._results[device_address] = False
+
+        if started == 0:
+            self._finish()
+        return started
+
+    def close(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions = {}
+        self._running = False
+
+    @Slot(int, bool)
+    def _on_session_finished(self, device_address: int, success: bool):
+        if not self._running:
+            return
+        self._results[device_address] = success
+        self.signal_session_finished.emit(device_address, success)
+        if len(self._results) >= len(self._sessions):
+            self._finish()
+
+    def _finish(self):
+        self._running = False
+        succeeded = sum(1 for success in self._results.values() if success)
+        LOGGER.info(f"Пакетное программирование завершено: {succeeded} из {len(self._sessions)}")
+        self.signal_finished.emit(succeeded, len(self._sessions))
@@ -0,0 +1,250 @@
+import logging
+from dataclasses import dataclass, field
+
+from PySide6.QtCore import QObject, QThread, QTimer, Signal, Slot
+
+from app_can.CanDevice import CanDevice, CanReceiveMode
+from colors import RowColor
+from uds.firmware import FirmwareImage
+from uds.flash_session import FlashBatch
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class StationChannel:
+    """
+    Канал станции: адаптер, канал CAN и узлы, программируемые на нём
+    """
+    device_index: int
+    channel: int
+    targets: list[tuple[int, int]] = field(default_factory=list)  # [(SA устройства, SA тестера), ...]
+
+    @property
+    def key(self) -> str:
+        return f"{self.device_index}:{self.channel}"
+
+
+@dataclass
+class StationOptions:
+    baud_rate: int = 500  # кбит/с
+    terminator: bool = False
+    receive_mode: CanReceiveMode = CanReceiveMode.FIFO
+    byte_order: str = "big"
+    block_length_limit: int | None = None
+    journal_prefix: str | None = None  # <prefix>.<адаптер>-<канал>.<SA>.resume.json
+    reset_after_success: bool = True
+
+
+class StationChannelWorker(QObject):
+    """
+    Конвейер программирования одного канала. Объект переносится в собственный QThread,
+    CanDevice, каналы ISO-TP и загрузчики создаются в run() и работают в цикле событий этого потока
+    """
+
+    signal_new_state = Signal(str, int, str, RowColor)  # канал станции, SA, текст, цвет
+    signal_data_sent = Signal(str, int, int)  # канал станции, SA, байт
+    signal_finished = Signal(str, int, int)  # канал станции, успешно, всего
+
+    def __init__(self, config: StationChannel, image: FirmwareImage, options: StationOptions):
+        super().__init__()
+
+        self._config = config
+        self._image = image
+        self._options = options
+        self._can: CanDevice | None = None
+        self._batch: FlashBatch | None = None
+        self._finished = False
+
+    @property
+    def key(self) -> str:
+        return self._config.key
+
+    @Slot()
+    def run(self):
+        config = self._config
+        options = self._options
+
+        self._can = CanDevice.for_channel(config.device_index, config.channel)
+        self._can.set_tx_echo(False)
+        if not self._can.is_connect and self._can.connect_to(config.device_index).value == 0:
+            self._log(0, "Не удалось подключиться к адаптеру", RowColor.red)
+            self._shutdown(0)
+            return
+
+        self._can.start_trace(config.channel, options.baud_rate, options.terminator, options.receive_mode)
+        if not self._can.is_trace:
+            self._log(0, "Не удалось запустить канал CAN", RowColor.red)
+            self._shutdown(0)
+            return
+
+        batch = FlashBatch(self._can)
+        for device_address, tester_address in config.targets:
+            batch.add_node(device_address, tester_address)
+        batch.set_firmware(self._image)
+        batch.set_transfer_byte_order(options.byte_order)
+        batch.set_block_length_limit(options.block_length_limit)
+        if options.journal_prefix:
+            batch.set_journal_prefix(f"{options.journal_prefix}.{config.device_index}-{config.channel}")
+        batch.signal_new_state.connect(self._log)
+        batch.signal_data_sent.connect(self._on_data_sent)
+        batch.signal_finished.connect(self._on_batch_finished)
+        self._batch = batch
+
+        if batch.start() == 0:
+            self._log(0, "Программирование на канале не запущено", RowColor.red)
+
+    @Slot()
+    def abort(self):
+        succeeded = 0
+        if self._batch is not None:
+            # Узлы, завершившие программирование до прерывания, учитываются как успешные
+            succeeded = sum(1 for success in self._batch.results().values() if success)
+            for session in self._batch.sessions():
+                session.channel.abort()
+        QTimer.singleShot(0, lambda: self._shutdown(succeeded))
+
+    @Slot(int, str, RowColor)
+    def _log(self, device_address: int, text: str, color: RowColor):
+        self.signal_new_state.emit(self._config.key, device_address, text, color)
+
+    @Slot(int, int)
+    def _on_data_sent(self, device_address: int, total_bytes: int):
+        self.signal_data_sent.emit(self._config.key, device_address, total_bytes)
+
+    @Slot(int, int)
+    def _on_batch_finished(self, succeeded: int, _total: int):
+        # Сессии закрываются после выхода из обработчиков сигналов пакета
+        QTimer.singleShot(0, lambda: self._shutdown(succeeded))
+
+    def _shutdown(self, succeeded: int):
+        if self._finished:
+            return
+        self._finished = True
+
+        batch = self._batch
+        self._batch = None
+        if batch is not None:
+            if self._options.reset_after_success:
+                results = batch.results()
+                for session in batch.sessions():
+                    if results.get(session.device_address):
+                        session.reset_to_application()
+            batch.close()
+
+        can = self._can
+        self._can = None
+        if can is not None:
+            if can.is_trace:
+                can.stop_trace()
+            can.disconnect_device()
+            CanDevice.release(can)
+
+        self.signal_finished.emit(self._config.key, succeeded, len(self._config.targets))
+
+
+class FlashStation(QObject):
+    """
+    Станция программирования: по одному конвейеру (StationChannelWorker) на канал каждого адаптера,
+    каждый конвейер в своём рабочем потоке
+    """
+
+    signal_new_state = Signal(str, int, str, RowColor)
+    signal_data_sent = Signal(str, int, int)
+    signal_channel_finished = Signal(str, int, int)
+    signal_finished = Signal(int, int)  # успешно, всего узлов
+
+    def __init__(self, options: StationOptions | None = None):
+        super().__init__()
+
+        self._options = options if options is not None else StationOptions()
+        self._channels: list[StationChannel] = []
+        self._image: FirmwareImage | None = None
+        self._workers: dict[str, tuple[QThread, StationChannelWorker]] = {}
+        self._results: dict[str, tuple[int, int]] = {}
+
+    @staticmethod
+    def discover_channels() -> list[tuple[int, int]]:
+        """
+        Перебор подключенных адаптеров TSCAN и их каналов CAN
+        :return: [(индекс адаптера, канал), ...]
+        """
+        scanner = CanDevice()
+        count = scanner.get_devices().value
+        channels: list[tuple[int, int]] = []
+        for device_index in range(count):
+            device = CanDevice()
+            if device.connect_to(device_index).value == 0:
+                continue
+            channels.extend((device_index, channel) for channel in range(device.channel_count()))
+            device.disconnect_device()
+        return channels
+
+    @property
+    def options(self) -> StationOptions:
+        return self._options
+
+    def channels(self) -> list[StationChannel]:
+        return list(self._channels)
+
+    def add_channel(self, device_index: int, channel: int, targets: list[tuple[int, int]]) -> StationChannel:
+        config = StationChannel(device_index, channel, list(targets))
+        self._channels.append(config)
+        return config
+
+    def clear_channels(self):
+        if not self.is_running():
+            self._channels = []
+
+    def set_firmware(self, image: FirmwareImage):
+        self._image = image
+
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> int:
+        """
+        Запуск конвейеров всех каналов
+        :return: количество запущенных каналов
+        """
+        if self.is_running() or self._image is None:
+            return 0
+
+        # Хэш образа для журналов считается один раз, а не в каждом потоке
+        self._image.sha256()
+        self._results = {}
+        for config in self._channels:
+            if not config.targets:
+                continue
+            thread = QThread(self)
+            worker = StationChannelWorker(config, self._image, self._options)
+            worker.moveToThread(thread)
+            thread.started.connect(worker.run)
+            worker.signal_new_state.connect(self.signal_new_state)
+            worker.signal_data_sent.connect(self.signal_data_sent)
+            # quit() подключается первым: к обработке итога канала его поток уже завершает цикл событий
+            worker.signal_finished.connect(thread.quit)
+            worker.signal_finished.connect(self._on_channel_finished)
+            thread.finished.connect(worker.deleteLater)
+            self._workers[config.key] = (thread, worker)
+            thread.start()
+        return len(self._workers)
+
+    def stop(self):
+        for _, worker in self._workers.values():
+            QTimer.singleShot(0, worker, worker.abort)
+
+    @Slot(str, int, int)
+    def _on_channel_finished(self, key: str, succeeded: int, total: int):
+        self._results[key] = (succeeded, total)
+        self.signal_channel_finished.emit(key, succeeded, total)
+        if len(self._results) < len(self._workers):
+            return
+
+        for thread, _ in self._workers.values():
+            thread.wait()
+        self._workers = {}
+        succeeded_total = sum(result[0] for result in self._results.values())
+        nodes_total = sum(result[1] for result in self._results.values())
+        LOGGER.info(f"Станция: успешно {succeeded_total} из {nodes_total}")
+        self.signal_finished.emit(succeeded_total, nodes_total)
@@ -0,0 +1,75 @@
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, fields
+
+from uds.firmware import FirmwareImage
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class ResumeJournal:
+    """
+    Журнал прерванного программирования: последний подтверждённый ЭБУ блок TransferData
+    и хэш образа, к которому он относится
+    """
+    image_sha256: str
+    image_length: int
+    memory_address: int
+    acknowledged_offset: int  # байт образа, подтверждённых ответом 0x76
+    block_sequence: int  # blockSequenceCounter последнего подтверждённого блока
+
+    def matches(self, image: FirmwareImage) -> bool:
+        """
+        Проверка, что журнал относится к загруженному образу
+        :param image: образ прошивки
+        :return: True, если хэш и длина совпадают
+        """
+        return self.image_length == len(image) and self.image_sha256 == image.sha256()
+
+    @property
+    def completed(self) -> bool:
+        return self.acknowledged_offset >= self.image_length
+
+    @classmethod
+    def load(cls, file_path: str) -> "ResumeJournal | None":
+        """
+        Чтение журнала
+        :param file_path: путь к файлу журнала
+        :return: журнал или None, если файла нет или он повреждён
+        """
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                raw = json.load(file)
+            return cls(**{field.name: raw[field.name] for field in fields(cls)})
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            LOGGER.warning(f"Журнал программирования не прочитан: {e}")
+            return None
+
+    def save(self, file_path: str) -> bool:
+        """
+        Атомарная запись журнала (временный файл + os.replace)
+        :param file_path: путь к файлу журнала
+        :return: True, если журнал записан
+        """
+        temp_path = file_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(asdict(self), file)
+            os.replace(temp_path, file_path)
+            return True
+        except OSError as e:
+            LOGGER.error(f"Ошибка записи журнала программирования: {e}")
+            return False
+
+    @staticmethod
+    def remove(file_path: str):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            LOGGER.warning(f"Журнал программирования не удалён: {e}")
@@ -1,7 +1,6 @@
 import enum
 
-from app_can.CanDevice import CanDevice
-from uds.uds_identifiers import UdsIdentifiers
+from isotp.isotp_channel import IsoTpChannel
 
 
 class EcuResetType(enum.IntEnum):
@@ -14,41 +13,32 @@ class EcuResetType(enum.IntEnum):
 
 class ServiceEcuReset:
 
-    def __init__(self):
+    def __init__(self, channel: IsoTpChannel | None = None):
+        self._channel = channel if channel is not None else IsoTpChannel.instance()
         self._sid = 0x11
 
     def ecu_uds_reset(self):
-        CanDevice.instance().send_async(
-            UdsIdentifiers.tx.identifier,
-            8,
-            [0x02,
-             self._sid,
-             EcuResetType.UDS_SOFTWARE_RESET,
-             0xff, 0xff, 0xff, 0xff, 0xff])
+        self._channel.send(bytes([self._sid, EcuResetType.UDS_SOFTWARE_RESET]))
 
     def ecu_software_reset(self):
-        CanDevice.instance().send_async(
-            UdsIdentifiers.tx.identifier,
-            8,
-            [0x02,
-             self._sid,
-             EcuResetType.SOFTWARE_RESET,
-             0xff, 0xff, 0xff, 0xff, 0xff])
+        self._channel.send(bytes([self._sid, EcuResetType.SOFTWARE_RESET]))
 
     def verify_ecu_uds_reset(self, data) -> bool:
-        data_length = data[0]
-        sid = data[1]
+        if len(data) < 2:
+            return False
+        sid = data[0]
         positive_sid = self._sid + 0x40
-        pid = data[2]
+        pid = data[1]
         if sid == positive_sid and pid == EcuResetType.UDS_SOFTWARE_RESET:
             return True
         return False
 
     def verify_ecu_software_reset(self, data) -> bool:
-        data_length = data[0]
-        sid = data[1]
+        if len(data) < 2:
+            return False
+        sid = data[0]
         positive_sid = self._sid + 0x40
-        pid = data[2]
+        pid = data[1]
         if sid == positive_sid and pid == EcuResetType.SOFTWARE_RESET:
             return True
         return False
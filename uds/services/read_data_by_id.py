@@ -1,12 +1,12 @@
 from typing import Optional
 
-from app_can.CanDevice import CanDevice
+from isotp.isotp_channel import IsoTpChannel
 from uds.data_identifiers import UdsVar
-from uds.uds_identifiers import UdsIdentifiers
 
 
 class ServiceReadDataById:
-    def __init__(self):
+    def __init__(self, channel: IsoTpChannel | None = None):
+        self._channel = channel if channel is not None else IsoTpChannel.instance()
         self._sid = 0x22
         self._pid_request: int = 0
         self._byte_order = "big"
@@ -32,31 +32,24 @@ class ServiceReadDataById:
 
     def _parse_pid_field(self, data) -> int:
         if self._byte_order == "little":
-            return (data[3] << 8) | data[2]
-        return (data[2] << 8) | data[3]
+            return (data[2] << 8) | data[1]
+        return (data[1] << 8) | data[2]
 
     def verify_answer_read_data(self, data) -> bool:
-        sid = data[1]
+        if len(data) < 3:
+            return False
+        sid = data[0]
         pid = self._parse_pid_field(data)
         return sid == self.success_sid and pid == self._pid_request
 
     def read_data(self, var: UdsVar):
         self._pid_request = var.pid
         pid_b0, pid_b1 = self._pid_to_bytes(var.pid)
-        CanDevice.instance().send_async(
-            UdsIdentifiers.tx.identifier,
-            8,
-            [0x03, self._sid, pid_b0, pid_b1, 0xFF, 0xFF, 0xFF, 0xFF],
-        )
+        self._channel.send(bytes([self._sid, pid_b0, pid_b1]))
 
     def read_data_by_identifier(self, tx_identifier: Optional[int], var: UdsVar):
-        self._pid_request = var.pid
-        pid_b0, pid_b1 = self._pid_to_bytes(var.pid)
-        CanDevice.instance().send_async(
-            tx_identifier,
-            8,
-            [0x03, self._sid, pid_b0, pid_b1, 0xFF, 0xFF, 0xFF, 0xFF],
-        )
+        # Идентификатор передачи задаётся каналом ISO-TP, параметр сохранён для совместимости
+        self.read_data(var)
 
     def parse_pid_field(self, data):
         return self._parse_pid_field(data)
@@ -66,14 +59,6 @@ class ServiceReadDataById:
 
     @staticmethod
     def parse_data_field(data) -> int:
-        data_length = data[0]
-        if data_length <= 3:
+        if len(data) <= 3:
             return 0
-        data_length -= 3
-        result = 0
-        shift = 0
-        for i in range(data_length):
-            index = 4 + i
-            result = result | (data[index] << shift)
-            shift += 8
-        return result
+        return int.from_bytes(bytes(data[3:]), "little")
@@ -1,18 +1,19 @@
-from app_can.CanDevice import CanDevice
-from uds.uds_identifiers import UdsIdentifiers
+from isotp.isotp_channel import IsoTpChannel
 
 
 class ServiceRequestDownload:
-    def __init__(self):
+    def __init__(self, channel: IsoTpChannel | None = None):
+        self._channel = channel if channel is not None else IsoTpChannel.instance()
         self._sid = 0x34
-        self._data_length = 0x0B
         self._data_format_id = 0x00
         self._addr_and_len_id = 0x44
 
         self._memory_addr = 0x08000000 + 1024 * 30
         self._memory_length = 0
         self._max_memory_length = 1024 * 80
-        self._counter = 0
+
+        # maxNumberOfBlockLength из положительного ответа 0x74 (длина PDU TransferData целиком)
+        self._max_block_length: int | None = None
 
         # Transfer format for multibyte address/length fields.
         self._byte_order = "big"
@@ -27,66 +28,46 @@ class ServiceRequestDownload:
         order = str(byte_order).strip().lower()
         self._byte_order = order if order in ("big", "little") else "big"
 
-    def _u32_to_bytes(self, value: int) -> list[int]:
-        value = int(value) & 0xFFFFFFFF
-        if self._byte_order == "little":
-            return [
-                value & 0xFF,
-                (value >> 8) & 0xFF,
-                (value >> 16) & 0xFF,
-                (value >> 24) & 0xFF,
-            ]
-        return [
-            (value >> 24) & 0xFF,
-            (value >> 16) & 0xFF,
-            (value >> 8) & 0xFF,
-            value & 0xFF,
-        ]
+    def _u32_to_bytes(self, value: int) -> bytes:
+        return (int(value) & 0xFFFFFFFF).to_bytes(4, self._byte_order)
 
-    def verify_flow_control(self, data) -> bool:
-        frame_type = data[0] >> 4 & 0x0F
-        if frame_type == 3:
-            return True
-        return False
+    @property
+    def memory_address(self) -> int:
+        return self._memory_addr
 
-    def request_download_first(self):
-        addr = self._u32_to_bytes(self._memory_addr)
-        CanDevice.instance().send_async(
-            UdsIdentifiers.tx.identifier,
-            8,
-            [
-                0x10,  # first frame
-                self._data_length,  # data length
-                self._sid,
-                self._data_format_id,
-                self._addr_and_len_id,
-                addr[0],
-                addr[1],
-                addr[2],
-            ],
+    def request_download(self, offset: int = 0):
+        """
+        Запрос на загрузку области памяти
+        :param offset: смещение от начала области (продолжение прерванной загрузки)
+        """
+        offset = min(max(int(offset), 0), self._memory_length)
+        # 11 байт запроса: передаётся каналом ISO-TP как First Frame + Consecutive Frame
+        self._channel.send(
+            bytes([self._sid, self._data_format_id, self._addr_and_len_id])
+            + self._u32_to_bytes(self._memory_addr + offset)
+            + self._u32_to_bytes(self._memory_length - offset)
         )
 
-    def request_download_consecutive(self):
-        addr = self._u32_to_bytes(self._memory_addr)
-        length = self._u32_to_bytes(self._memory_length)
-        CanDevice.instance().send_async(
-            UdsIdentifiers.tx.identifier,
-            8,
-            [
-                0x21,
-                addr[3],
-                length[0],
-                length[1],
-                length[2],
-                length[3],
-                0xFF,
-                0xFF,
-            ],
-        )
+    @property
+    def max_block_length(self) -> int | None:
+        return self._max_block_length
 
     def verify_request_download(self, data) -> bool:
-        sid = data[1]
+        sid = data[0]
         positive_sid = self._sid + 0x40
-        if sid == positive_sid:
-            return True
-        return False
+        if sid != positive_sid:
+            return False
+
+        self._max_block_length = self._parse_max_block_length(data)
+        return True
+
+    def _parse_max_block_length(self, data) -> int | None:
+        # [0x74, lengthFormatIdentifier, maxNumberOfBlockLength (старшая тетрада LFI байт)];
+        # по ISO 14229 поле всегда big-endian, независимо от порядка байт адреса и длины запроса
+        if len(data) < 2:
+            return None
+        field_length = (data[1] >> 4) & 0x0F
+        if field_length == 0 or len(data) < 2 + field_length:
+            return None
+        value = int.from_bytes(bytes(data[2:2 + field_length]), "big")
+        return value if value > 0 else None
@@ -1,22 +1,16 @@
-from app_can.CanDevice import CanDevice
-from uds.uds_identifiers import UdsIdentifiers
+from isotp.isotp_channel import IsoTpChannel
 
 
 class ServiceRequestTransferExit:
-    def __init__(self):
+    def __init__(self, channel: IsoTpChannel | None = None):
+        self._channel = channel if channel is not None else IsoTpChannel.instance()
         self._sid = 0x37
 
     def request_transfer_exit(self):
-        CanDevice.instance().send_async(
-            UdsIdentifiers.tx.identifier,
-            8,
-            [0x01,
-             self._sid,
-             0xff, 0xff, 0xff, 0xff, 0xff, 0xff])
+        self._channel.send(bytes([self._sid]))
 
     def verify_answer_request_transfer_exit(self, data) -> bool:
-        data_length = data[0]
-        sid = data[1]
+        sid = data[0]
         positive_sid = self._sid + 0x40
         if sid == positive_sid:
             return True
@@ -1,7 +1,6 @@
 from enum import IntEnum
 
-from app_can.CanDevice import CanDevice
-from uds.uds_identifiers import UdsIdentifiers
+from isotp.isotp_channel import IsoTpChannel
 
 
 class Session(IntEnum):
@@ -11,28 +10,49 @@ class Session(IntEnum):
 
 
 class ServiceSession:
-    def __init__(self):
+    def __init__(self, channel: IsoTpChannel | None = None):
+        self._channel = channel if channel is not None else IsoTpChannel.instance()
         self._verify_state: bool = False
+        self._p2_server_max_ms: int | None = None
+        self._p2_star_server_max_ms: int | None = None
 
     @property
     def verify_state(self) -> bool:
         return self._verify_state
 
+    @property
+    def p2_server_max_ms(self) -> int | None:
+        """
+        P2server_max из ответа на DiagnosticSessionControl, мс (None - ЭБУ не сообщил)
+        """
+        return self._p2_server_max_ms
+
+    @property
+    def p2_star_server_max_ms(self) -> int | None:
+        """
+        P2*server_max из ответа на DiagnosticSessionControl, мс (None - ЭБУ не сообщил)
+        """
+        return self._p2_star_server_max_ms
+
     def verify_answer(self, response_data) -> bool:
-        data_length = response_data[0]
-        state = response_data[1]
+        state = response_data[0]
         if state == 0x50:
             self._verify_state = True
         else:
             self._verify_state = False
 
+        # sessionParameterRecord: P2server_max (1 мс) и P2*server_max (10 мс), по 2 байта big-endian
+        if self._verify_state and len(response_data) >= 6:
+            self._p2_server_max_ms = int.from_bytes(response_data[2:4], "big")
+            self._p2_star_server_max_ms = int.from_bytes(response_data[4:6], "big") * 10
+        else:
+            self._p2_server_max_ms = None
+            self._p2_star_server_max_ms = None
+
         return self._verify_state
 
     def set(self, session: Session):
-        CanDevice.instance().send_async(
-            UdsIdentifiers.tx.identifier,
-            8,
-            [0x02,      # Single Frame, data length
-             0x10,      # Service CurrentSession
-             session,   # Programming session
-             0xff, 0xff, 0xff, 0xff, 0xff])
\ No newline at end of file
+        self._channel.send(bytes([
+            0x10,       # Service DiagnosticSessionControl
+            session,    # Programming session
+        ]))
@@ -1,170 +1,225 @@
-import math
+import time
 
-from PySide6.QtCore import QTimer, QObject, Signal
+from PySide6.QtCore import QObject, Signal
 
-from app_can.CanDevice import CanDevice
-from dataclasses import dataclass
-
-from uds.uds_identifiers import UdsIdentifiers
-
-
-@dataclass
-class FlowControl:
-    frame_type: int
-    flow_status: int
-    block_size: int  # количество consecutive фреймов, которые может получить приёмник
-    sep_time: int
+from isotp.isotp_channel import IsoTpChannel
+from uds.firmware import FirmwareImage
 
 
 class ServiceTransferData(QObject):
+    DEFAULT_BLOCK_LENGTH = 1026
+    MIN_BLOCK_LENGTH = 3
+
     signal_data_sent = Signal(int)  # bytes
+    signal_transfer_rate = Signal(float)  # bytes/s
 
-    def __init__(self):
+    def __init__(self, channel: IsoTpChannel | None = None):
         super().__init__()
 
-        self._sid = 0x36  # RequestDownload SID запроса
+        self._channel = channel if channel is not None else IsoTpChannel.instance()
+        self._channel.signal_progress.connect(self._on_channel_progress)
+        self._channel.signal_pdu_sent.connect(self._on_channel_pdu_sent)
 
-        self._timer = QTimer()
-        self._timer.timeout.connect(self._send_consecutive_frame)
+        self._sid = 0x36  # RequestDownload SID запроса
 
+        self._binary_content: FirmwareImage | None = None
         self._binary_content_size = 0
-        self._binary_content = None
-        self._bytes_sent = 0
         self._total_bytes_sent = 0
-        self._index_binary_content = 0
+        self._index_binary_content = 0  # смещение начала текущего блока в образе
+        self._block_data_length = 0
+        self._block_in_flight = False
+        # Следующий блок, заранее сегментированный в канале, пока ЭБУ пишет текущий во flash
+        self._prepared_block: tuple[int, int, int] | None = None  # (смещение, длина, block_sequence)
 
         self._block_sequence = 0  # счетчик последовательности блоков в сервисе TransferData (0x36)
-        self._frame_number = 0  # номер фрейма в Consecutive Frame
 
-        self._flow_control: FlowControl = FlowControl(0, 0, 0, 0)
-        # Берем максимальное количество байт для передачи данных в одной последовательности
-        # так как на приёмной стороне буфер 2050 байт
-        # (1024 байт полезных данных + 2 байта служебные (sid и block_sequence))
-        self._ff_max_data_length = 1026
-        self._ff_data_length = 0
+        # Максимальная длина PDU блока (SID + block_sequence + данные).
+        # По умолчанию 1026 байт (1024 байт полезных данных + 2 байта служебные),
+        # после RequestDownload заменяется значением maxNumberOfBlockLength от ЭБУ
+        self._ff_max_data_length = self.DEFAULT_BLOCK_LENGTH
 
-    def set_firmware(self, binary_content: bytes):
-        self._binary_content = binary_content
-        self._binary_content_size = len(self._binary_content)
-        # Учитываем, что для каждого блока (_ff_max_data_length) еще по 2 байта служебной информации в виде sid и block_sequence
-        num_of_blocks = math.ceil(self._binary_content_size / self._ff_max_data_length)
-        self._binary_content_size += num_of_blocks * 2
+        self._transfer_started_at: float | None = None
+        self._transfer_start_offset = 0  # смещение, с которого продолжена прерванная передача
 
-    def _form_first_message(self, data_length) -> list | None:
+    def set_firmware(self, binary_content: FirmwareImage | bytes):
+        if not isinstance(binary_content, FirmwareImage):
+            binary_content = FirmwareImage(binary_content)
+        self._binary_content = binary_content
+        self._binary_content_size = len(binary_content)
+        self.reset_transfer()
+
+    @property
+    def block_length(self) -> int:
+        return self._ff_max_data_length
+
+    def set_block_length(self, length: int | None, limit: int | None = None) -> int:
+        """
+        Установка длины PDU блока TransferData
+        :param length: maxNumberOfBlockLength из ответа на RequestDownload (None - значение по умолчанию)
+        :param limit: пользовательское ограничение (None - без ограничения)
+        :return: применённая длина блока с учётом предела ISO-TP (4095 байт)
+        """
+        value = self.DEFAULT_BLOCK_LENGTH if length is None else int(length)
+        if limit is not None:
+            value = min(value, int(limit))
+        self._ff_max_data_length = max(self.MIN_BLOCK_LENGTH, min(value, IsoTpChannel.MAX_PDU_LENGTH))
+        return self._ff_max_data_length
+
+    @property
+    def burst_mode(self) -> bool:
+        return self._channel.burst_mode
+
+    def set_burst_mode(self, enabled: bool):
+        self._channel.set_burst_mode(enabled)
+
+    def achieved_rate(self) -> float:
+        """
+        Фактическая скорость передачи с момента отправки первого блока
+        :return: байт/с, 0 если передача не начиналась
+        """
+        if self._transfer_started_at is None:
+            return 0.0
+        elapsed = time.perf_counter() - self._transfer_started_at
+        if elapsed <= 0:
+            return 0.0
+        return (self._total_bytes_sent - self._transfer_start_offset) / elapsed
+
+    @property
+    def acknowledged_offset(self) -> int:
+        """
+        Количество байт образа, подтверждённых ЭБУ
+        """
+        return self._index_binary_content
+
+    @property
+    def block_sequence(self) -> int:
+        return self._block_sequence
+
+    def resume_from(self, offset: int):
+        """
+        Продолжение передачи с заданного смещения после повторного RequestDownload
+        (счётчик block_sequence начинается заново)
+        :param offset: смещение первого неподтверждённого байта образа
+        """
+        self.reset_transfer()
+        self._index_binary_content = min(max(int(offset), 0), self._binary_content_size)
+        self._total_bytes_sent = self._index_binary_content
+        self._transfer_start_offset = self._index_binary_content
+
+    def data_transferred(self) -> bool:
+        return self._index_binary_content >= self._binary_content_size
+
+    def send_block(self) -> int:
+        """
+        Передача очередного блока TransferData (SID + block_sequence + данные) через канал ISO-TP.
+        Если блок был подготовлен заранее (prepare_next_block), фреймы уходят без повторной сборки
+        :return: количество байт данных в блоке
+        """
         if self._binary_content is None:
-            return None
-
-        self._block_sequence += 1
-
-        message = [
-            0x10 | ((data_length >> 8) & 0xf),
-            data_length & 0xff,
-            self._sid,
-            self._block_sequence]
-
-        data = [0xff, 0xff, 0xff, 0xff]
-        if data_length > 4:
-            data_length = 4
-        for i in range(data_length):
-            data[i] = self._binary_content[self._index_binary_content + i]
-        message += data
-
-        self._frame_number = 0
-
-        if data_length < 4:
-            self._index_binary_content += data_length
-            # self._sid + self._block_sequence + data_length
-            self._total_bytes_sent += data_length + 2
-            self._bytes_sent = data_length + 2
-        else:
-            self._index_binary_content += 4
-            # self._sid + self._block_sequence + data = 6 bytes
-            self._total_bytes_sent += 6
-            self._bytes_sent = 6
-
-        # print(list(map(hex, data)), self._total_bytes_sent)
-
-        return message
+            return 0
 
-    def block_transferred(self) -> bool:
-        return self._bytes_sent == self._ff_data_length
+        if self._transfer_started_at is None:
+            self._transfer_started_at = time.perf_counter()
 
-    def data_transferred(self):
-        return self._total_bytes_sent == self._binary_content_size
+        start = self._index_binary_content
+        block_sequence = (self._block_sequence + 1) & 0xFF
+        prepared = self._prepared_block
+        self._prepared_block = None
 
-    def send_first_frame(self) -> int:
-        if self._total_bytes_sent + self._ff_max_data_length < self._binary_content_size:
-            self._ff_data_length = self._ff_max_data_length
+        if prepared is None or prepared[0] != start or prepared[2] != block_sequence \
+                or not self._channel.has_prepared():
+            length = self._block_length_at(start)
+            if not self._prepare_block(start, length, block_sequence):
+                return 0
         else:
-            self._ff_data_length = self._binary_content_size - self._total_bytes_sent
-
-        first_frame = self._form_first_message(self._ff_data_length)
-        CanDevice.instance().send_async(UdsIdentifiers.tx.identifier, 8, first_frame)
-
-        self.signal_data_sent.emit(self._total_bytes_sent)
-
+            length = prepared[1]
+
+        self._block_data_length = length
+        self._block_sequence = block_sequence
+        self._block_in_flight = True
+        if not self._channel.send_prepared():
+            self._block_in_flight = False
+        return self._block_data_length
+
+    def resend_block(self) -> int:
+        """
+        Повторная передача последнего неподтверждённого блока с тем же block_sequence
+        (ЭБУ подтверждает повтор без повторной записи во flash)
+        :return: количество байт данных в блоке
+        """
+        if self._binary_content is None or self._block_sequence == 0:
+            return 0
+
+        self._prepared_block = None
+        length = self._block_data_length or self._block_length_at(self._index_binary_content)
+        if not self._prepare_block(self._index_binary_content, length, self._block_sequence):
+            return 0
+
+        self._block_data_length = length
+        self._block_in_flight = True
+        if not self._channel.send_prepared():
+            self._block_in_flight = False
+        return self._block_data_length
+
+    def prepare_next_block(self) -> bool:
+        """
+        Сборка фреймов блока, следующего за переданным, до получения положительного ответа 0x76
+        :return: True, если следующий блок подготовлен
+        """
+        if self._binary_content is None:
+            return False
+        start = self._index_binary_content + self._block_data_length
+        if start >= self._binary_content_size:
+            return False
+
+        length = self._block_length_at(start)
+        block_sequence = (self._block_sequence + 1) & 0xFF
+        if not self._prepare_block(start, length, block_sequence):
+            return False
+        self._prepared_block = (start, length, block_sequence)
+        return True
+
+    def _block_length_at(self, start: int) -> int:
         # 2 байта - служебная информация (sid, block_sequence)
-        return self._ff_data_length - 2
-
-    def send_consecutive_frames(self):
-        if self._flow_control is None:
-            return
-        if self._flow_control.block_size == 0:
-            return
-        if self._flow_control.sep_time > 0:
-            self._timer.start(self._flow_control.sep_time)
-        else:
-            self._timer.start(10)
-
-    def _send_consecutive_frame(self):
-        self._frame_number += 1
-        if self._frame_number > 0xf:
-            self._frame_number = 0
-        data_length = 7
-        if self._bytes_sent + data_length > self._ff_data_length:
-            data_length = self._ff_data_length - self._bytes_sent
-
-        frame = [0x20 | self._frame_number, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff]
-        for i in range(data_length):
-            frame[i + 1] = self._binary_content[self._index_binary_content + i]
-
-        self._index_binary_content += data_length
-        self._total_bytes_sent += data_length
-        self._bytes_sent += data_length
+        return min(self._ff_max_data_length - 2, self._binary_content_size - start)
 
-        # print(list(map(hex, frame)), self._total_bytes_sent)
-
-        CanDevice.instance().send_async(UdsIdentifiers.tx.identifier, 8, frame)
+    def _prepare_block(self, start: int, length: int, block_sequence: int) -> bool:
+        # Заголовок и срез образа копируются каналом сразу в буферы фреймов, без склейки PDU
+        return self._channel.prepare(bytes((self._sid, block_sequence)), self._binary_content.block(start, length))
 
+    def _on_channel_progress(self, pdu_bytes_sent: int):
+        if not self._block_in_flight:
+            return
+        self._total_bytes_sent = self._index_binary_content + max(pdu_bytes_sent - 2, 0)
         self.signal_data_sent.emit(self._total_bytes_sent)
 
-        if self._bytes_sent >= self._ff_data_length:
-            self._timer.stop()
+    def _on_channel_pdu_sent(self):
+        if not self._block_in_flight:
+            return
+        self._block_in_flight = False
+        self.signal_transfer_rate.emit(self.achieved_rate())
+        self.prepare_next_block()
 
     def verify_answer_after_sent_block(self, data) -> bool:
-        frame_type = data[0] >> 4 & 0x0f
-        status = data[1]
+        if len(data) < 2:
+            return False
+        status = data[0]
         success_status = self._sid | 0x40
-        block_sequence_counter = data[2]
+        block_sequence_counter = data[1]
 
         if status == success_status and block_sequence_counter == self._block_sequence:
-            return True
-        return False
-
-    def verify_flow_control(self, data) -> bool:
-        frame_type = data[0] >> 4 & 0x0f
-        flow_status = data[0] & 0x0f
-        block_size = data[1]
-        sep_time = data[2]
-
-        if frame_type == 3:  # flow control
-            self._flow_control.block_size = block_size
-            self._flow_control.flow_status = flow_status
-            self._flow_control.sep_time = sep_time
-            self._flow_control.frame_type = frame_type
+            # Блок подтверждён, следующий начинается после него
+            self._index_binary_content += self._block_data_length
+            self._block_data_length = 0
             return True
         return False
 
     def reset_transfer(self):
         self._total_bytes_sent = 0
-        self._frame_number = 0
+        self._index_binary_content = 0
+        self._block_data_length = 0
+        self._block_sequence = 0
+        self._block_in_flight = False
+        self._prepared_block = None
+        self._transfer_started_at = None
+        self._transfer_start_offset = 0
@@ -1,10 +1,10 @@
-from app_can.CanDevice import CanDevice
+from isotp.isotp_channel import IsoTpChannel
 from uds.data_identifiers import UdsData, UdsVar
-from uds.uds_identifiers import UdsIdentifiers
 
 
 class ServiceWriteDataById:
-    def __init__(self):
+    def __init__(self, channel: IsoTpChannel | None = None):
+        self._channel = channel if channel is not None else IsoTpChannel.instance()
         self._sid = 0x2E
         self._saved_pid = 0
         self._byte_order = "big"
@@ -22,47 +22,34 @@ class ServiceWriteDataById:
 
     def _parse_pid_field(self, data) -> int:
         if self._byte_order == "little":
-            return (data[3] << 8) | data[2]
-        return (data[2] << 8) | data[3]
+            return (data[2] << 8) | data[1]
+        return (data[1] << 8) | data[2]
 
     def write_data(self, var: UdsVar, value, tx_identifier: int | None = None) -> bool:
-        if var.size > 4:
-            return False
-
+        # Идентификатор передачи задаётся каналом ISO-TP, tx_identifier сохранён для совместимости
         self._saved_pid = var.pid
         pid_b0, pid_b1 = self._pid_to_bytes(var.pid)
 
-        frame = [3 + var.size, self._sid, pid_b0, pid_b1]
-
-        for _ in range(var.size):
-            frame.append(value & 0xFF)
-            value = value >> 8
-
-        if var.size < 4:
-            rem = 4 - var.size
-            for _ in range(rem):
-                frame.append(0xFF)
-
-        identifier = UdsIdentifiers.tx.identifier if tx_identifier is None else int(tx_identifier)
-        CanDevice.instance().send_async(identifier, 8, frame)
-        return True
+        value = int(value) & ((1 << (8 * var.size)) - 1)
+        pdu = bytes([self._sid, pid_b0, pid_b1]) + value.to_bytes(var.size, "little")
+        return self._channel.send(pdu)
 
     def verify_answer_write_data(self, response_data) -> bool:
-        sid = response_data[1]
+        if len(response_data) < 3:
+            return False
+        sid = response_data[0]
         positive_sid = self._sid + 0x40
         pid = self._parse_pid_field(response_data)
         return sid == positive_sid and pid == self._saved_pid
 
     def write_fingerprint(self, value: int):
         pid_b0, pid_b1 = self._pid_to_bytes(UdsData.fingerprint.pid)
-        CanDevice.instance().send_async(
-            UdsIdentifiers.tx.identifier,
-            8,
-            [0x04, self._sid, pid_b0, pid_b1, value, 0xFF, 0xFF, 0xFF],
-        )
+        self._channel.send(bytes([self._sid, pid_b0, pid_b1, value & 0xFF]))
 
     def verify_answer_write_fingerprint(self, response_data) -> bool:
-        sid = response_data[1]
+        if len(response_data) < 3:
+            return False
+        sid = response_data[0]
         pid = self._parse_pid_field(response_data)
         return sid == (self._sid + 0x40) and pid == UdsData.fingerprint.pid
 
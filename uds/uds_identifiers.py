@@ -1,3 +1,5 @@
+from collections.abc import Callable
+
 from j1939.j1939_can_identifier import J1939CanIdentifier
 
 
@@ -5,17 +7,41 @@ class UdsIdentifiers:
     rx = J1939CanIdentifier(0x18daf16a)
     tx = J1939CanIdentifier(0x18da6af1)
 
+    # Подписчики на изменение идентификаторов (аппаратные фильтры, таблица диспетчеризации)
+    _listeners: list[Callable[[], None]] = []
+
+    @classmethod
+    def add_listener(cls, listener: Callable[[], None]):
+        if listener not in cls._listeners:
+            cls._listeners.append(listener)
+
+    @classmethod
+    def remove_listener(cls, listener: Callable[[], None]):
+        if listener in cls._listeners:
+            cls._listeners.remove(listener)
+
+    @classmethod
+    def notify(cls):
+        """
+        Оповещение подписчиков; вызывать после прямого изменения полей tx/rx
+        """
+        for listener in list(cls._listeners):
+            listener()
+
     @classmethod
     def set_tx(cls, iden: int):
         cls.tx.identifier = iden
         cls.rx.src = cls.tx.dst
+        cls.notify()
 
     @classmethod
     def set_rx(cls, iden: int):
         cls.rx.identifier = iden
         cls.tx.dst = cls.rx.src
+        cls.notify()
 
     @classmethod
     def set_src(cls, src: int):
         cls.tx.dst = src
         cls.rx.src = src
+        cls.notify()
@@ -339,6 +339,28 @@ ApplicationWindow {
                                 }
                             }
 
+                            SpoilerSection {
+                                title: "Станция программирования"
+                                hintText: "Все каналы всех адаптеров"
+                                cardColor: window.cardColor
+                                cardBorder: window.cardBorder
+                                textMain: window.textMain
+                                textSoft: window.textSoft
+                                Layout.fillWidth: true
+
+                                StationCard {
+                                    appController: window.backendController
+                                    cardColor: window.cardColor
+                                    cardBorder: window.cardBorder
+                                    textMain: window.textMain
+                                    textSoft: window.textSoft
+                                    inputBg: window.inputBg
+                                    inputBorder: window.inputBorder
+                                    inputFocus: window.inputFocus
+                                    Layout.fillWidth: true
+                                }
+                            }
+
                             SpoilerSection {
                                 title: "UDS CAN идентификаторы"
                                 hintText: "Дополнительный функционал"
@@ -445,6 +467,28 @@ ApplicationWindow {
                             }
                         }
 
+                        SpoilerSection {
+                            title: "Станция программирования"
+                            hintText: "Все каналы всех адаптеров"
+                            cardColor: window.cardColor
+                            cardBorder: window.cardBorder
+                            textMain: window.textMain
+                            textSoft: window.textSoft
+                            Layout.fillWidth: true
+
+                            StationCard {
+                                appController: window.backendController
+                                cardColor: window.cardColor
+                                cardBorder: window.cardBorder
+                                textMain: window.textMain
+                                textSoft: window.textSoft
+                                inputBg: window.inputBg
+                                inputBorder: window.inputBorder
+                                inputFocus: window.inputFocus
+                                Layout.fillWidth: true
+                            }
+                        }
+
                         SpoilerSection {
                             title: "UDS CAN идентификаторы"
                             hintText: "Дополнительный функционал"
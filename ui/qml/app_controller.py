@@ -8,19 +8,33 @@ import time
 from PySide6.QtCore import QObject, Property, QThread, QTimer, QUrl, Signal, Slot
 from PySide6.QtGui import QColor
 
-from app_can.CanDevice import CanDevice
+from app_can.CanDevice import CanDevice, CanReceiveMode
+from app_can.CanFrame import CanFrame
+from app_can.TraceRecorder import TraceRecorder, export_asc, trace_files
 from colors import RowColor
+from isotp.isotp_channel import IsoTpChannel
 from j1939.j1939_can_identifier import J1939CanIdentifier
 from uds.bootloader import Bootloader
+from uds.data_identifiers import UdsData
 from uds.firmware import Firmware, FirmwareState
+from uds.flash_session import FlashBatch
+from uds.flash_station import FlashStation, StationOptions
 from uds.services.ecu_reset import ServiceEcuReset
+from uds.services.transfer_data import ServiceTransferData
 from uds.uds_identifiers import UdsIdentifiers
+from ui.qml.can_trace_store import DIRECTION_NONE, DIRECTION_RX, DIRECTION_TX
+from ui.qml.can_traffic_model import CanTrafficModel
 
 LOGGER = logging.getLogger(__name__)
 
+# Сервисы, у которых за SID следует DID: 0x22/0x62 ReadDataByIdentifier, 0x2E/0x6E WriteDataByIdentifier
+DID_SERVICE_IDS = frozenset((0x22, 0x62, 0x2E, 0x6E))
+
+CAN_DIRECTIONS = {"TX": DIRECTION_TX, "RX": DIRECTION_RX}
+
 
 class FirmwareLoadWorker(QObject):
-    finished = Signal(str, bool, bytes, str)
+    finished = Signal(str, bool, object, str)
 
     def __init__(self, file_path: str):
         super().__init__()
@@ -29,14 +43,35 @@ class FirmwareLoadWorker(QObject):
     @Slot()
     def run(self):
         firmware = Firmware(self._file_path)
-        if firmware.state == FirmwareState.successfully_uploaded and firmware.binary_content is not None:
-            self.finished.emit(self._file_path, True, firmware.binary_content, "")
+        if firmware.state == FirmwareState.successfully_uploaded and firmware.image is not None:
+            self.finished.emit(self._file_path, True, firmware.image, "")
+            return
+        self.finished.emit(self._file_path, False, None, "Не удалось открыть BIN файл.")
+
+
+class TraceExportWorker(QObject):
+    finished = Signal(str, int, str)
+
+    def __init__(self, trace_path: str, asc_path: str):
+        super().__init__()
+        self._trace_path = trace_path
+        self._asc_path = asc_path
+
+    @Slot()
+    def run(self):
+        try:
+            count = export_asc(trace_files(self._trace_path), self._asc_path)
+        except (OSError, ValueError) as e:
+            self.finished.emit(self._asc_path, -1, str(e))
             return
-        self.finished.emit(self._file_path, False, b"", "Не удалось открыть BIN файл.")
+        self.finished.emit(self._asc_path, count, "")
 
 
 class AppController(QObject):
     CAN_FILTER_FIELDS = ("time", "dir", "frameId", "pgn", "src", "dst", "j1939", "dlc", "uds", "data")
+    # Журнал CAN - кольцевой буфер кадров в колонках (~50-70 байт на кадр вместе с индексами фильтра)
+    CAN_TRACE_CAPACITY = 1000000
+    CAN_TRACE_CAPACITY_OPTIONS = (100000, 1000000, 5000000)
 
     devicesChanged = Signal()
     selectedDeviceIndexChanged = Signal()
@@ -46,19 +81,24 @@ class AppController(QObject):
     firmwarePathChanged = Signal()
     progressChanged = Signal()
     logsChanged = Signal()
-    canTrafficLogsChanged = Signal()
     canFilterOptionsChanged = Signal()
+    canTraceCapacityChanged = Signal()
+    traceRecordingChanged = Signal()
     infoMessage = Signal(str, str)
     programmingActiveChanged = Signal()
+    resumeAvailableChanged = Signal()
     autoResetBeforeProgrammingChanged = Signal()
     debugEnabledChanged = Signal()
     firmwareLoadingChanged = Signal()
     transferByteOrderIndexChanged = Signal()
+    transferBlockLimitTextChanged = Signal()
     sourceAddressTextChanged = Signal()
     sourceAddressBusyChanged = Signal()
     sourceAddressOperationChanged = Signal()
     udsIdentifiersChanged = Signal()
     observedUdsCandidateChanged = Signal()
+    batchTargetsChanged = Signal()
+    stationChannelsChanged = Signal()
 
     def __init__(self):
         super().__init__()
@@ -84,9 +124,12 @@ class AppController(QObject):
         self._progress_max = 1
 
         self._logs: list[dict[str, str]] = []
-        self._can_traffic_logs: list[dict[str, str]] = []
-        self._filtered_can_traffic_logs: list[dict[str, str]] = []
+        # Журнал CAN и отфильтрованный вид ведутся индексом: строки проверяются фильтрами при добавлении.
+        # Модель передаёт в ListView только новые строки и форматирует только запрошенные
+        self._can_traffic = CanTrafficModel(self.CAN_FILTER_FIELDS, self._summarize_can_payload,
+                                            self.CAN_TRACE_CAPACITY, self)
         self._can_filter_values: dict[str, str] = {field: "" for field in self.CAN_FILTER_FIELDS}
+        self._can_filters_dirty = False
         self._can_filter_options: dict[str, list[str]] = {field: [] for field in self.CAN_FILTER_FIELDS}
         self._can_filter_option_seen: dict[str, set[str]] = {field: set() for field in self.CAN_FILTER_FIELDS}
         self._can_filter_option_limits: dict[str, int] = {
@@ -105,9 +148,12 @@ class AppController(QObject):
         self._auto_reset_before_programming = True
         self._auto_reset_delay_ms = 650
         self._pending_programming_after_reset = False
+        self._resume_programming = False
+        self._resume_available = False
         self._debug_enabled = False
         self._firmware_loading = False
         self._transfer_byte_order_index = 0
+        self._transfer_block_limit_text = ""
         self._source_address_text = f"0x{UdsIdentifiers.rx.src:02X}"
         self._source_address_busy = False
         self._source_address_operation = ""
@@ -129,6 +175,15 @@ class AppController(QObject):
         self._observed_candidate_index = -1
         self._observed_frame_seq = 0
         self._observed_uds_text = "Ожидание входящих J1939 RX кадров для автоопределения адреса..."
+        # Пакетное программирование нескольких узлов, найденных в RX потоке
+        self._batch_targets: list[int] = []
+        self._batch: FlashBatch | None = None
+        self._batch_progress: dict[int, int] = {}
+        # Станция: все каналы всех подключенных адаптеров, по конвейеру в отдельном потоке на канал
+        self._station_channels: list[tuple[int, int]] = []
+        self._station: FlashStation | None = None
+        self._station_progress: dict[tuple[str, int], int] = {}
+        self._station_node_count = 0
         self._perf_origin = time.perf_counter()
         self._wall_origin = time.time()
         self._rx_time_anchor_raw: float | None = None
@@ -138,6 +193,10 @@ class AppController(QObject):
 
         self._firmware_loader_thread: QThread | None = None
         self._firmware_loader_worker: FirmwareLoadWorker | None = None
+        self._trace_recorder: TraceRecorder | None = None
+        self._trace_recording_path = ""
+        self._trace_export_thread: QThread | None = None
+        self._trace_export_worker: TraceExportWorker | None = None
 
         self._bootloader.signal_new_state.connect(self._on_bootloader_state)
         self._bootloader.signal_data_sent.connect(self._on_data_sent)
@@ -145,7 +204,9 @@ class AppController(QObject):
         self._bootloader.signal_source_address_applied.connect(self._on_source_address_applied)
         self._bootloader.signal_source_address_read.connect(self._on_source_address_read)
 
-        self._can.signal_new_message.connect(self._on_can_message)
+        self._can.signal_new_frame.connect(self._on_can_frame)
+        self._can.signal_tx_echo.connect(self._on_can_tx_echo)
+        self._can.signal_rx_overflow.connect(self._on_can_rx_overflow)
         self._can.signal_tracing_started.connect(self._on_trace_state_event)
         self._can.signal_tracing_stopped.connect(self._on_trace_state_event)
 
@@ -216,13 +277,29 @@ class AppController(QObject):
     def logs(self):
         return self._logs
 
-    @Property("QVariantList", notify=canTrafficLogsChanged)
-    def canTrafficLogs(self):
-        return self._can_traffic_logs
+    @Property(QObject, constant=True)
+    def canTrafficModel(self):
+        return self._can_traffic
 
-    @Property("QVariantList", notify=canTrafficLogsChanged)
-    def filteredCanTrafficLogs(self):
-        return self._filtered_can_traffic_logs
+    @Property(int, notify=canTraceCapacityChanged)
+    def canTraceCapacity(self):
+        return self._can_traffic.store.capacity
+
+    @Property("QVariantList", constant=True)
+    def canTraceCapacityOptions(self):
+        return list(self.CAN_TRACE_CAPACITY_OPTIONS)
+
+    @Property(bool, notify=traceRecordingChanged)
+    def traceRecording(self):
+        return self._trace_recorder is not None
+
+    @Property(str, notify=traceRecordingChanged)
+    def traceRecordingButtonText(self):
+        return "Стоп записи" if self._trace_recorder is not None else "Запись"
+
+    @Property(bool, notify=traceRecordingChanged)
+    def traceExportAvailable(self):
+        return bool(self._trace_recording_path) and self._trace_export_thread is None
 
     @Property("QStringList", notify=canFilterOptionsChanged)
     def canFilterTimeOptions(self):
@@ -268,6 +345,10 @@ class AppController(QObject):
     def programmingActive(self):
         return self._programming_active
 
+    @Property(bool, notify=resumeAvailableChanged)
+    def resumeAvailable(self):
+        return self._resume_available
+
     @Property(bool, notify=autoResetBeforeProgrammingChanged)
     def autoResetBeforeProgramming(self):
         return self._auto_reset_before_programming
@@ -284,6 +365,10 @@ class AppController(QObject):
     def transferByteOrderIndex(self):
         return self._transfer_byte_order_index
 
+    @Property(str, notify=transferBlockLimitTextChanged)
+    def transferBlockLimitText(self):
+        return self._transfer_block_limit_text
+
     @Property(str, notify=sourceAddressTextChanged)
     def sourceAddressText(self):
         return self._source_address_text
@@ -392,6 +477,33 @@ class AppController(QObject):
         self._append_log(f"Выбран порядок байтов: {label}", QColor("#0ea5e9"))
         self.infoMessage.emit("Протокол", f"Выбран порядок байтов: {label}.")
 
+    @Slot(str)
+    def setTransferBlockLimit(self, text):
+        value = str(text).strip()
+        if value == self._transfer_block_limit_text:
+            return
+
+        if not value:
+            limit = None
+        else:
+            try:
+                limit = self._parse_uint_field(value, ServiceTransferData.MIN_BLOCK_LENGTH,
+                                               IsoTpChannel.MAX_PDU_LENGTH, "Размер блока")
+            except ValueError as exc:
+                self.transferBlockLimitTextChanged.emit()
+                self.infoMessage.emit("Протокол", str(exc))
+                return
+            value = str(limit)
+
+        self._transfer_block_limit_text = value
+        self.transferBlockLimitTextChanged.emit()
+        self._bootloader.set_block_length_limit(limit)
+
+        if limit is None:
+            self._append_log("Размер блока TransferData: по ответу ЭБУ", QColor("#0ea5e9"))
+        else:
+            self._append_log(f"Ограничение размера блока TransferData: {limit} байт", QColor("#0ea5e9"))
+
     @Slot(str)
     def setSourceAddressText(self, text):
         value = str(text).strip()
@@ -471,6 +583,7 @@ class AppController(QObject):
         UdsIdentifiers.tx.dst = device_sa
         UdsIdentifiers.rx.src = device_sa
         UdsIdentifiers.rx.dst = tester_sa
+        UdsIdentifiers.notify()
 
         self._source_address_text = f"0x{UdsIdentifiers.rx.src:02X}"
         self.sourceAddressTextChanged.emit()
@@ -488,6 +601,154 @@ class AppController(QObject):
     def resetObservedUdsCandidate(self):
         self._reset_observed_uds_candidate()
 
+    @Property(str, notify=batchTargetsChanged)
+    def batchTargetsText(self):
+        if not self._batch_targets:
+            return "Пакет пуст"
+        addresses = ", ".join(f"0x{sa:02X}" for sa in self._batch_targets)
+        return f"Пакет ({len(self._batch_targets)}): {addresses}"
+
+    @Property(int, notify=batchTargetsChanged)
+    def batchTargetCount(self):
+        return len(self._batch_targets)
+
+    @Slot()
+    def addObservedCandidateToBatch(self):
+        if not (0 <= self._observed_candidate_index < len(self._observed_candidate_values)):
+            self.infoMessage.emit("Пакет", "Нет выбранного узла из RX потока.")
+            return
+        device_sa = int(self._observed_candidate_values[self._observed_candidate_index]) & 0xFF
+        if device_sa in self._batch_targets:
+            return
+        self._batch_targets.append(device_sa)
+        self.batchTargetsChanged.emit()
+
+    @Slot()
+    def addAllObservedCandidatesToBatch(self):
+        added = [int(sa) & 0xFF for sa in self._observed_candidate_values if (int(sa) & 0xFF) not in self._batch_targets]
+        if not added:
+            return
+        self._batch_targets.extend(added)
+        self.batchTargetsChanged.emit()
+
+    @Slot()
+    def clearBatchTargets(self):
+        if self._batch is not None or not self._batch_targets:
+            return
+        self._batch_targets = []
+        self.batchTargetsChanged.emit()
+
+    @Slot()
+    def startBatchProgramming(self):
+        if self._programming_active:
+            return
+
+        if not self._can.is_connect:
+            self.infoMessage.emit("Пакет", "Сначала подключите CAN-адаптер.")
+            return
+
+        if self._firmware_loading or self._firmware is None:
+            self.infoMessage.emit("Пакет", "Сначала загрузите BIN-файл.")
+            return
+
+        if not self._batch_targets:
+            self.infoMessage.emit("Пакет", "Добавьте в пакет узлы из RX потока.")
+            return
+
+        batch = FlashBatch(self._can)
+        for device_sa, tester_sa in self._batch_node_addresses():
+            batch.add_node(device_sa, tester_sa)
+
+        batch.set_firmware(self._firmware)
+        batch.set_journal_prefix(self._firmware_path or None)
+        batch.set_transfer_byte_order("little" if self._transfer_byte_order_index == 1 else "big")
+        batch.set_block_length_limit(int(self._transfer_block_limit_text) if self._transfer_block_limit_text else None)
+        batch.signal_new_state.connect(self._on_batch_state)
+        batch.signal_data_sent.connect(self._on_batch_data_sent)
+        batch.signal_session_finished.connect(self._on_batch_session_finished)
+        batch.signal_finished.connect(self._on_batch_finished)
+
+        self._batch = batch
+        self._batch_progress = {}
+        self._progress_max = max(len(self._firmware), 1)
+        self._progress_value = 0
+        self.progressChanged.emit()
+        self._set_programming_active(True)
+        self._append_log(f"Пакетное программирование: {len(self._batch_targets)} узл.", RowColor.blue)
+
+        if batch.start() == 0:
+            self._append_log("Пакетное программирование не запущено", RowColor.red)
+
+    @Property("QStringList", notify=stationChannelsChanged)
+    def stationChannels(self):
+        return [f"Адаптер {device_index}, канал {channel + 1}" for device_index, channel in self._station_channels]
+
+    @Slot()
+    def scanStationChannels(self):
+        if self._station is not None:
+            return
+        self._station_channels = FlashStation.discover_channels()
+        self.stationChannelsChanged.emit()
+        if not self._station_channels:
+            self.infoMessage.emit("Станция", "Каналы CAN не найдены.")
+
+    @Slot(int, bool)
+    def startStationProgramming(self, baud_rate, terminator):
+        if self._programming_active:
+            return
+
+        if self._can.is_trace:
+            # Каналы станции открываются собственными устройствами, trace окна занимает один из них
+            self.infoMessage.emit("Станция", "Сначала остановите trace.")
+            return
+
+        if self._firmware_loading or self._firmware is None:
+            self.infoMessage.emit("Станция", "Сначала загрузите BIN-файл.")
+            return
+
+        if not self._station_channels:
+            self.infoMessage.emit("Станция", "Сначала найдите каналы адаптеров.")
+            return
+
+        # Узлы пакета, иначе узел из настроенных идентификаторов UDS; одинаковы на каждом канале
+        targets = self._batch_node_addresses() or [(int(UdsIdentifiers.rx.src) & 0xFF,
+                                                    int(UdsIdentifiers.tx.src) & 0xFF)]
+        options = StationOptions(
+            baud_rate=int(baud_rate),
+            terminator=bool(terminator),
+            byte_order="little" if self._transfer_byte_order_index == 1 else "big",
+            block_length_limit=int(self._transfer_block_limit_text) if self._transfer_block_limit_text else None,
+            journal_prefix=self._firmware_path or None,
+        )
+        station = FlashStation(options)
+        for device_index, channel in self._station_channels:
+            station.add_channel(device_index, channel, targets)
+        station.set_firmware(self._firmware)
+        station.signal_new_state.connect(self._on_station_state)
+        station.signal_data_sent.connect(self._on_station_data_sent)
+        station.signal_channel_finished.connect(self._on_station_channel_finished)
+        station.signal_finished.connect(self._on_station_finished)
+
+        self._station = station
+        self._station_progress = {}
+        self._station_node_count = len(targets) * len(self._station_channels)
+        self._progress_max = max(len(self._firmware), 1)
+        self._progress_value = 0
+        self.progressChanged.emit()
+        self._set_programming_active(True)
+        self._append_log(f"Станция: {len(self._station_channels)} кан., {self._station_node_count} узл.",
+                         RowColor.blue)
+
+        if station.start() == 0:
+            self._append_log("Станция не запущена", RowColor.red)
+            self._station = None
+            self._set_programming_active(False)
+
+    @Slot()
+    def stopStationProgramming(self):
+        if self._station is not None:
+            self._station.stop()
+
     @Slot(int)
     def setSelectedObservedUdsCandidateIndex(self, index):
         try:
@@ -538,6 +799,7 @@ class AppController(QObject):
         UdsIdentifiers.rx.pgn = rx_pgn_value
         UdsIdentifiers.rx.src = rx_src_value
         UdsIdentifiers.rx.dst = rx_dst_value
+        UdsIdentifiers.notify()
 
         self._source_address_text = f"0x{UdsIdentifiers.rx.src:02X}"
         self.sourceAddressTextChanged.emit()
@@ -660,8 +922,8 @@ class AppController(QObject):
         self.connectionStateChanged.emit()
         self.traceStateChanged.emit()
 
-    @Slot(int, int, bool)
-    def toggleTrace(self, channel_index, baud_rate, terminator):
+    @Slot(int, int, bool, bool)
+    def toggleTrace(self, channel_index, baud_rate, terminator, fifo_receive=False):
         if not self._can.is_connect:
             self.infoMessage.emit("Подключение", "Сначала подключите CAN-адаптер.")
             return
@@ -669,7 +931,8 @@ class AppController(QObject):
         if self._can.is_trace:
             self._can.stop_trace()
         else:
-            self._can.start_trace(channel_index, baud_rate, terminator)
+            receive_mode = CanReceiveMode.FIFO if fifo_receive else CanReceiveMode.CALLBACK
+            self._can.start_trace(channel_index, baud_rate, terminator, receive_mode)
 
         self.traceStateChanged.emit()
 
@@ -697,6 +960,16 @@ class AppController(QObject):
 
     @Slot()
     def startProgramming(self):
+        self._begin_programming(False)
+
+    @Slot()
+    def resumeProgramming(self):
+        if not self._resume_available:
+            self.infoMessage.emit("Программирование", "Нет прерванной загрузки для этого BIN-файла.")
+            return
+        self._begin_programming(True)
+
+    def _begin_programming(self, resume: bool):
         if self._programming_active:
             return
 
@@ -709,6 +982,7 @@ class AppController(QObject):
             return
 
         self._set_programming_active(True)
+        self._resume_programming = resume
 
         if self._auto_reset_before_programming:
             self._pending_programming_after_reset = True
@@ -759,9 +1033,69 @@ class AppController(QObject):
     def clearCanTrafficLogs(self):
         if self._can_filter_rebuild_timer.isActive():
             self._can_filter_rebuild_timer.stop()
-        self._can_traffic_logs = []
+        self._can_traffic.clear()
         self._rebuild_can_traffic_view()
 
+    @Slot(int)
+    def setCanTraceCapacity(self, capacity):
+        capacity = int(capacity)
+        if capacity <= 0 or capacity == self._can_traffic.store.capacity:
+            return
+        if self._can_filter_rebuild_timer.isActive():
+            self._can_filter_rebuild_timer.stop()
+        self._can_traffic.set_capacity(capacity)
+        self._rebuild_can_traffic_view()
+        self.canTraceCapacityChanged.emit()
+        self._append_log(f"Ёмкость журнала CAN: {capacity} кадров", RowColor.blue)
+
+    @Slot()
+    def toggleTraceRecording(self):
+        if self._trace_recorder is not None:
+            self._stop_trace_recording()
+            return
+
+        traces_dir = Path.cwd() / "traces"
+        try:
+            traces_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            self.infoMessage.emit("Запись CAN", f"Не удалось создать папку {traces_dir}: {e}")
+            return
+        path = traces_dir / f"trace_{datetime.now():%Y%m%d_%H%M%S}.cantrace"
+        recorder = TraceRecorder(str(path), max(self._can.channel, 0))
+        recorder.signal_error.connect(self._on_trace_recorder_error)
+        recorder.start()
+        self._can.set_recorder(recorder)
+        self._trace_recorder = recorder
+        self._trace_recording_path = str(path)
+        self.traceRecordingChanged.emit()
+        self._append_log(f"Запись CAN: {path}", RowColor.blue)
+
+    @Slot()
+    def stopTraceRecording(self):
+        self._stop_trace_recording()
+
+    @Slot()
+    def exportTraceRecording(self):
+        if not self._trace_recording_path or self._trace_export_thread is not None:
+            return
+        if self._trace_recorder is not None:
+            self._stop_trace_recording()
+
+        asc_path = str(Path(self._trace_recording_path).with_suffix(".asc"))
+        self._trace_export_thread = QThread(self)
+        self._trace_export_worker = TraceExportWorker(self._trace_recording_path, asc_path)
+        self._trace_export_worker.moveToThread(self._trace_export_thread)
+
+        self._trace_export_thread.started.connect(self._trace_export_worker.run)
+        self._trace_export_worker.finished.connect(self._on_trace_exported)
+        self._trace_export_worker.finished.connect(self._trace_export_thread.quit)
+        self._trace_export_worker.finished.connect(self._trace_export_worker.deleteLater)
+        self._trace_export_thread.finished.connect(self._trace_export_thread.deleteLater)
+        self._trace_export_thread.finished.connect(self._clear_trace_exporter)
+        self._trace_export_thread.start()
+        self.traceRecordingChanged.emit()
+        self._append_log("Экспорт записи CAN в ASC...", RowColor.blue)
+
     @Slot(str, str)
     def setCanTrafficFilter(self, field, value):
         key = str(field or "").strip()
@@ -773,6 +1107,7 @@ class AppController(QObject):
             return
 
         self._can_filter_values[key] = text
+        self._can_filters_dirty = True
         self._schedule_can_traffic_rebuild(restart=True)
 
     @Slot()
@@ -783,6 +1118,7 @@ class AppController(QObject):
                 self._can_filter_values[field] = ""
                 updated = True
         if updated:
+            self._can_filters_dirty = True
             self._schedule_can_traffic_rebuild(restart=True)
 
     def _on_bootloader_state(self, text, color):
@@ -800,6 +1136,7 @@ class AppController(QObject):
             self._programming_start_timer.stop()
         self._pending_programming_after_reset = False
         self._set_programming_active(False)
+        self._refresh_resume_available()
         if not success:
             return
 
@@ -828,11 +1165,99 @@ class AppController(QObject):
                 "Программирование завершено, но автосброс в основное ПО не отправлен.",
             )
 
+    @Slot(int, str, RowColor)
+    def _on_batch_state(self, device_sa, text, color):
+        self._append_log(f"[0x{device_sa:02X}] {text}", color)
+
+    @Slot(int, int)
+    def _on_batch_data_sent(self, device_sa, value):
+        # Общий прогресс пакета - среднее по узлам
+        self._batch_progress[device_sa] = value
+        count = max(len(self._batch_targets), 1)
+        self._on_data_sent(sum(self._batch_progress.values()) // count)
+
+    @Slot(int, bool)
+    def _on_batch_session_finished(self, device_sa, success):
+        if success:
+            self._append_log(f"[0x{device_sa:02X}] Программирование успешно завершено", RowColor.green)
+        else:
+            self._append_log(f"[0x{device_sa:02X}] Программирование завершено с ошибкой", RowColor.red)
+
+    @Slot(int, int)
+    def _on_batch_finished(self, succeeded, total):
+        color = RowColor.green if succeeded == total else RowColor.red
+        self._append_log(f"Пакетное программирование завершено: {succeeded} из {total}", color)
+        # Сессии закрываются после выхода из обработчиков сигналов пакета
+        QTimer.singleShot(0, self._close_batch)
+
+    def _close_batch(self):
+        batch = self._batch
+        if batch is None:
+            return
+        self._batch = None
+        results = batch.results()
+        if self._can.is_connect:
+            for session in batch.sessions():
+                if results.get(session.device_address):
+                    session.reset_to_application()
+        batch.close()
+        self._set_programming_active(False)
+
+    @Slot(str, int, str, RowColor)
+    def _on_station_state(self, key, device_sa, text, color):
+        prefix = f"[{key}]" if device_sa == 0 else f"[{key}][0x{device_sa:02X}]"
+        self._append_log(f"{prefix} {text}", color)
+
+    @Slot(str, int, int)
+    def _on_station_data_sent(self, key, device_sa, value):
+        self._station_progress[(key, device_sa)] = value
+        count = max(self._station_node_count, 1)
+        self._on_data_sent(sum(self._station_progress.values()) // count)
+
+    @Slot(str, int, int)
+    def _on_station_channel_finished(self, key, succeeded, total):
+        color = RowColor.green if succeeded == total else RowColor.red
+        self._append_log(f"[{key}] Канал завершён: {succeeded} из {total}", color)
+
+    @Slot(int, int)
+    def _on_station_finished(self, succeeded, total):
+        color = RowColor.green if succeeded == total else RowColor.red
+        self._append_log(f"Станция завершена: {succeeded} из {total}", color)
+        self._station = None
+        self._set_programming_active(False)
+
+    def _batch_node_addresses(self) -> list[tuple[int, int]]:
+        """
+        Узлы пакета с SA тестера, выбранным по наблюдаемому трафику
+        :return: [(SA устройства, SA тестера), ...]
+        """
+        default_tester_sa = int(UdsIdentifiers.tx.src) & 0xFF
+        addresses = []
+        for device_sa in self._batch_targets:
+            node = self._observed_node_stats.get(device_sa, {})
+            tester_sa, _ = self._choose_tester_sa_for_node(node, default_tester_sa)
+            addresses.append((device_sa, tester_sa))
+        return addresses
+
     def _on_trace_state_event(self):
         self._rx_time_anchor_raw = None
         self._rx_time_anchor_wall = None
         self.traceStateChanged.emit()
 
+    @Slot(object)
+    def _on_can_frame(self, frame: CanFrame):
+        self._append_can_frame_row(frame.timestamp, frame.identifier, "TX" if frame.is_tx else "RX",
+                                   frame.dlc, frame.data)
+
+    @Slot(list)
+    def _on_can_tx_echo(self, frames):
+        for frame in frames:
+            self._append_can_frame_row(frame.timestamp, frame.identifier, "TX", frame.dlc, frame.data)
+
+    @Slot(int)
+    def _on_can_rx_overflow(self, total_dropped):
+        self._append_log(f"Переполнение буфера приёма CAN, всего потеряно кадров: {total_dropped}", RowColor.yellow)
+
     @Slot(str, str, str, str, list)
     def _on_can_message(self, msg_time, msg_id, msg_dir, msg_dlc, msg_data):
         try:
@@ -840,7 +1265,6 @@ class AppController(QObject):
         except (TypeError, ValueError):
             identifier = 0
 
-        direction = self._normalize_can_direction(msg_dir)
         payload = []
         if isinstance(msg_data, list):
             for value in msg_data:
@@ -849,68 +1273,39 @@ class AppController(QObject):
                 except (TypeError, ValueError):
                     continue
 
-        data_hex = " ".join(f"{byte:02X}" for byte in payload)
-        formatted_time = self._format_can_time(msg_time, direction)
+        self._append_can_frame_row(msg_time, identifier, self._normalize_can_direction(msg_dir), msg_dlc, payload)
+
+    def _append_can_frame_row(self, msg_time, identifier: int, direction: str, msg_dlc, payload):
+        # Кадр сохраняется в колонки журнала без форматирования; строки отображения формирует модель по запросу
+        if direction == "RX":
+            try:
+                self._update_observed_uds_candidate(J1939CanIdentifier(int(identifier)))
+            except Exception:
+                pass
 
-        pgn_text = "-"
-        src_text = "-"
-        dst_text = "-"
-        j1939_text = "-"
-        parsed_id = None
         try:
-            parsed_id = J1939CanIdentifier(int(identifier))
-            parsed_pgn = int(parsed_id.pgn) & 0x3FFFF
-            parsed_src = int(parsed_id.src) & 0xFF
-            parsed_dst = int(parsed_id.dst) & 0xFF
-
-            pgn_text = f"0x{parsed_pgn & 0xFFFF:04X}"
-            src_text = f"0x{parsed_src:02X}"
-            dst_text = f"0x{parsed_dst:02X}"
-            app_summary = self._parse_j1939_application_summary(parsed_pgn, payload)
-            if app_summary:
-                j1939_text = app_summary
-        except Exception:
-            pass
-
-        uds_text = "-"
-        is_uds_frame = self._is_uds_identifier(identifier)
-        if (not is_uds_frame) and parsed_id is not None:
-            is_uds_frame = self._is_uds_diagnostic_pgn(int(parsed_id.pgn))
-        if is_uds_frame:
-            uds_text = self._parse_isotp_summary(payload)
-
-        if direction == "RX" and parsed_id is not None:
-            self._update_observed_uds_candidate(parsed_id)
-
-        if direction == "TX":
-            dir_color = "#1d4ed8"
-            dir_bg = "#dbeafe"
-            dir_border = "#93c5fd"
-        elif direction == "RX":
-            dir_color = "#15803d"
-            dir_bg = "#dcfce7"
-            dir_border = "#86efac"
-        else:
-            dir_color = "#334155"
-            dir_bg = "#e2e8f0"
-            dir_border = "#cbd5e1"
-
-        row = {
-            "time": formatted_time,
-            "dir": direction,
-            "frameId": f"0x{int(identifier) & 0x1FFFFFFF:08X}",
-            "pgn": pgn_text,
-            "src": src_text,
-            "dst": dst_text,
-            "j1939": j1939_text,
-            "dlc": str(msg_dlc),
-            "uds": uds_text,
-            "data": data_hex,
-            "dirColor": dir_color,
-            "dirBg": dir_bg,
-            "dirBorder": dir_border,
-        }
-        self._append_can_traffic_entry(row)
+            dlc = int(msg_dlc)
+        except (TypeError, ValueError):
+            dlc = len(payload)
+
+        seq = self._can_traffic.append(self._can_wall_time_us(msg_time, direction), int(identifier),
+                                       CAN_DIRECTIONS.get(direction, DIRECTION_NONE), dlc, bytes(payload))
+        self._update_can_filter_options(seq)
+        self._schedule_can_traffic_rebuild()
+
+    def _summarize_can_payload(self, pgn: int | None, payload: bytes) -> tuple[str, str]:
+        """
+        Разбор данных кадра для журнала CAN
+        :param pgn: PGN идентификатора J1939 или None
+        :return: (разбор J1939, разбор UDS/ISO-TP); пустая строка - нет разбора
+        """
+        if pgn is None:
+            return "", ""
+        j1939_text = self._parse_j1939_application_summary(pgn, list(payload))
+        uds_text = ""
+        if self._is_uds_pgn(pgn) or self._is_uds_diagnostic_pgn(pgn):
+            uds_text = self._parse_isotp_summary(list(payload))
+        return j1939_text, uds_text
 
     @staticmethod
     def _normalize_can_direction(direction) -> str:
@@ -921,19 +1316,19 @@ class AppController(QObject):
             return "RX"
         return raw or "-"
 
-    def _format_can_time(self, raw_time, direction: str) -> str:
-        raw_text = str(raw_time).strip()
+    def _can_wall_time_us(self, raw_time, direction: str) -> int:
+        """
+        Перевод метки времени кадра в часы компьютера
+        :return: мкс от эпохи Unix
+        """
         try:
-            value = float(raw_text)
+            value = float(raw_time) if isinstance(raw_time, (int, float)) else float(str(raw_time).strip())
         except (TypeError, ValueError):
-            return raw_text
+            return int(time.time() * 1000000)
 
         # Unix epoch in seconds.
         if value >= 946684800.0:
-            try:
-                return datetime.fromtimestamp(value).strftime("%H:%M:%S.%f")[:-3]
-            except Exception:
-                return raw_text
+            return int(value * 1000000)
 
         if direction == "RX":
             if (self._rx_time_anchor_raw is None) or (value < (self._rx_time_anchor_raw - 0.001)):
@@ -946,11 +1341,7 @@ class AppController(QObject):
         else:
             # TX timestamp comes from perf_counter().
             wall_ts = self._wall_origin + (value - self._perf_origin)
-
-        try:
-            return datetime.fromtimestamp(wall_ts).strftime("%H:%M:%S.%f")[:-3]
-        except Exception:
-            return raw_text
+        return int(wall_ts * 1000000)
 
     @staticmethod
     def _parse_isotp_summary(payload: list[int]) -> str:
@@ -964,13 +1355,14 @@ class AppController(QObject):
                 sid = payload[1] & 0xFF
                 if sid == 0x7F and len(payload) > 3:
                     return f"SF NRC=0x{payload[3] & 0xFF:02X} SID=0x{payload[2] & 0xFF:02X}"
-                return f"SF LEN={data_len} SID=0x{sid:02X}"
+                return f"SF LEN={data_len} SID=0x{sid:02X}{AppController._did_summary(sid, payload[2:4])}"
             return f"SF LEN={data_len}"
 
         if pci_type == 0x1:
             total_len = ((payload[0] & 0x0F) << 8) | (payload[1] & 0xFF if len(payload) > 1 else 0)
             if len(payload) > 2:
-                return f"FF LEN={total_len} SID=0x{payload[2] & 0xFF:02X}"
+                sid = payload[2] & 0xFF
+                return f"FF LEN={total_len} SID=0x{sid:02X}{AppController._did_summary(sid, payload[3:5])}"
             return f"FF LEN={total_len}"
 
         if pci_type == 0x2:
@@ -985,6 +1377,15 @@ class AppController(QObject):
 
         return f"ISO-TP PCI=0x{pci_type:X}"
 
+    @staticmethod
+    def _did_summary(sid: int, did_bytes: list[int]) -> str:
+        # ReadDataByIdentifier/WriteDataByIdentifier и их положительные ответы
+        if sid not in DID_SERVICE_IDS or len(did_bytes) < 2:
+            return ""
+        did = ((did_bytes[0] & 0xFF) << 8) | (did_bytes[1] & 0xFF)
+        name = UdsData.name_of(did)
+        return f" DID=0x{did:04X} {name}" if name else f" DID=0x{did:04X}"
+
     @staticmethod
     def _parse_j1939_application_summary(pgn: int, payload: list[int]) -> str:
         if not payload:
@@ -1006,33 +1407,6 @@ class AppController(QObject):
 
         return ""
 
-    def _append_can_traffic_entry(self, row: dict[str, str]):
-        self._can_traffic_logs.append(row)
-        self._update_can_filter_options_with_row(row)
-        hard_limit = 5000
-        keep_tail = 1500
-        if len(self._can_traffic_logs) > hard_limit:
-            self._can_traffic_logs = self._can_traffic_logs[-keep_tail:]
-            self._can_traffic_logs.insert(
-                0,
-                {
-                    "time": datetime.now().strftime("%H:%M:%S"),
-                    "dir": "SYS",
-                    "frameId": "-",
-                    "pgn": "-",
-                    "src": "-",
-                    "dst": "-",
-                    "j1939": "-",
-                    "dlc": "-",
-                    "uds": "Автоочистка журнала",
-                    "data": f"Оставлены последние {keep_tail} записей",
-                    "dirColor": "#334155",
-                    "dirBg": "#e2e8f0",
-                    "dirBorder": "#cbd5e1",
-                },
-            )
-        self._schedule_can_traffic_rebuild()
-
     def _schedule_can_traffic_rebuild(self, restart: bool = False):
         if self._can_filter_rebuild_timer.isActive():
             if restart:
@@ -1042,29 +1416,15 @@ class AppController(QObject):
         self._can_filter_rebuild_timer.start()
 
     def _rebuild_can_traffic_view(self):
-        normalized_filters: dict[str, str] = {}
-        for field in self.CAN_FILTER_FIELDS:
-            normalized_filters[field] = str(self._can_filter_values.get(field, "")).strip().lower()
+        # Новые строки уже отфильтрованы при добавлении; пересчёт вида нужен только после смены фильтров
+        if self._can_filters_dirty:
+            self._can_filters_dirty = False
+            normalized_filters: dict[str, str] = {}
+            for field in self.CAN_FILTER_FIELDS:
+                normalized_filters[field] = str(self._can_filter_values.get(field, "")).strip().lower()
+            self._can_traffic.set_filters(normalized_filters)
 
-        has_filters = any(bool(value) for value in normalized_filters.values())
-        if not has_filters:
-            self._filtered_can_traffic_logs = list(self._can_traffic_logs)
-        else:
-            filtered: list[dict[str, str]] = []
-            for row in self._can_traffic_logs:
-                match = True
-                for field, filter_value in normalized_filters.items():
-                    if not filter_value:
-                        continue
-                    value = str(row.get(field, "")).lower()
-                    if filter_value not in value:
-                        match = False
-                        break
-                if match:
-                    filtered.append(row)
-            self._filtered_can_traffic_logs = filtered
-
-        self.canTrafficLogsChanged.emit()
+        self._can_traffic.flush()
 
     def _normalize_filter_option_value(self, field: str, value: str) -> str:
         text = str(value or "").strip()
@@ -1086,10 +1446,17 @@ class AppController(QObject):
 
         return text
 
-    def _update_can_filter_options_with_row(self, row: dict[str, str]):
+    def _update_can_filter_options(self, seq: int):
+        # Текст поля формируется, только пока список вариантов не заполнен
+        store = self._can_traffic.store
         changed = False
         for field in self.CAN_FILTER_FIELDS:
-            value = self._normalize_filter_option_value(field, row.get(field, ""))
+            values = self._can_filter_options[field]
+            limit = int(self._can_filter_option_limits.get(field, 120))
+            if len(values) >= limit:
+                continue
+
+            value = self._normalize_filter_option_value(field, store.text(seq, field))
             if not value:
                 continue
 
@@ -1097,11 +1464,6 @@ class AppController(QObject):
             if value in seen:
                 continue
 
-            limit = int(self._can_filter_option_limits.get(field, 120))
-            values = self._can_filter_options[field]
-            if len(values) >= limit:
-                continue
-
             seen.add(value)
             values.append(value)
             changed = True
@@ -1110,13 +1472,8 @@ class AppController(QObject):
             self.canFilterOptionsChanged.emit()
 
     @staticmethod
-    def _is_uds_identifier(identifier: int) -> bool:
-        try:
-            parsed = J1939CanIdentifier(int(identifier))
-            pgn = int(parsed.pgn) & 0x3FFFF
-            return pgn in (int(UdsIdentifiers.tx.pgn) & 0x3FFFF, int(UdsIdentifiers.rx.pgn) & 0x3FFFF)
-        except Exception:
-            return False
+    def _is_uds_pgn(pgn: int) -> bool:
+        return (int(pgn) & 0x3FFFF) in (int(UdsIdentifiers.tx.pgn) & 0x3FFFF, int(UdsIdentifiers.rx.pgn) & 0x3FFFF)
 
     @staticmethod
     def _is_uds_diagnostic_pgn(pgn: int) -> bool:
@@ -1147,17 +1504,21 @@ class AppController(QObject):
         else:
             self.infoMessage.emit("Протокол", "Не удалось прочитать Source Address.")
 
-    @Slot(str, bool, bytes, str)
-    def _on_firmware_loaded(self, _file_path, success, binary_content, error_text):
+    @Slot(str, bool, object, str)
+    def _on_firmware_loaded(self, file_path, success, firmware_image, error_text):
         try:
             if not success:
                 self._append_log("Ошибка загрузки BIN файла", RowColor.red)
                 self.infoMessage.emit("Прошивка", error_text if error_text else "Не удалось открыть BIN файл.")
                 return
 
-            self._bootloader.set_firmware(binary_content)
+            self._bootloader.set_firmware(firmware_image)
+            self._firmware = firmware_image
+            # Журнал прерванной загрузки хранится рядом с BIN файлом
+            self._bootloader.set_journal_path(f"{file_path}.resume.json")
+            self._refresh_resume_available()
 
-            file_size = len(binary_content)
+            file_size = len(firmware_image)
             self._progress_max = max(file_size, 1)
             self._progress_value = 0
             self.progressChanged.emit()
@@ -1184,6 +1545,41 @@ class AppController(QObject):
         self._firmware_loader_thread = None
         self._firmware_loader_worker = None
 
+    def _stop_trace_recording(self):
+        recorder = self._trace_recorder
+        if recorder is None:
+            return
+        self._can.set_recorder(None)
+        self._trace_recorder = None
+        recorder.stop()
+        self.traceRecordingChanged.emit()
+        text = f"Запись CAN остановлена: {recorder.frame_count} кадров, файлов: {len(recorder.files)}"
+        if recorder.dropped_count:
+            self._append_log(f"{text}, пропущено кадров: {recorder.dropped_count}", RowColor.yellow)
+        else:
+            self._append_log(text, RowColor.green)
+
+    @Slot(str)
+    def _on_trace_recorder_error(self, error_text):
+        self._append_log(f"Запись CAN: {error_text}", RowColor.red)
+        self._stop_trace_recording()
+        self._trace_recording_path = ""
+        self.traceRecordingChanged.emit()
+
+    @Slot(str, int, str)
+    def _on_trace_exported(self, asc_path, count, error_text):
+        if count < 0:
+            self._append_log(f"Ошибка экспорта записи CAN: {error_text}", RowColor.red)
+            self.infoMessage.emit("Запись CAN", f"Не удалось экспортировать запись: {error_text}")
+            return
+        self._append_log(f"Запись CAN экспортирована: {asc_path} ({count} кадров)", RowColor.green)
+        self.infoMessage.emit("Запись CAN", f"Экспортировано кадров: {count}.\n{asc_path}")
+
+    def _clear_trace_exporter(self):
+        self._trace_export_thread = None
+        self._trace_export_worker = None
+        self.traceRecordingChanged.emit()
+
     def _refresh_device_info(self):
         hw_index = self._selected_hw_index()
         if hw_index < 0:
@@ -1303,8 +1699,22 @@ class AppController(QObject):
         self._start_programming_flow()
 
     def _start_programming_flow(self):
-        if not self._bootloader.start():
+        resume = self._resume_programming
+        self._resume_programming = False
+        journal = self._bootloader.resume_journal() if resume else None
+        if not self._bootloader.start(resume):
             self._set_programming_active(False)
+            return
+
+        self._progress_value = min(journal.acknowledged_offset, self._progress_max) if journal is not None else 0
+        self.progressChanged.emit()
+
+    def _refresh_resume_available(self):
+        available = self._bootloader.resume_journal() is not None
+        if self._resume_available == available:
+            return
+        self._resume_available = available
+        self.resumeAvailableChanged.emit()
 
     def _set_source_address_busy(self, busy):
         value = bool(busy)
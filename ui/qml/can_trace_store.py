@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+from array import array
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import datetime
+
+from j1939.j1939_can_identifier import J1939CanIdentifier
+
+DIRECTION_NONE = 0
+DIRECTION_TX = 1
+DIRECTION_RX = 2
+
+DIRECTION_TEXTS = {DIRECTION_NONE: "-", DIRECTION_TX: "TX", DIRECTION_RX: "RX"}
+
+# Цвета метки направления: текст, фон, рамка
+DIRECTION_COLORS = {
+    DIRECTION_NONE: ("#334155", "#e2e8f0", "#cbd5e1"),
+    DIRECTION_TX: ("#1d4ed8", "#dbeafe", "#93c5fd"),
+    DIRECTION_RX: ("#15803d", "#dcfce7", "#86efac"),
+}
+
+INLINE_DATA_LENGTH = 8  # байты данных, хранимые в колонке; длинные кадры CAN FD - отдельно
+
+
+class CanTraceStore:
+    """
+    Журнал CAN в параллельных колонках array: метка времени (мкс), идентификатор, направление, DLC, данные.
+    Колонки образуют кольцевой буфер фиксированной ёмкости: при заполнении новый кадр записывается
+    на место самого старого, добавление и вытеснение - O(1).
+    Строки отображения (ID, PGN, разбор J1939 и ISO-TP, время) формируются по запросу
+    только для видимых и проверяемых фильтром строк; последние сформированные строки кэшируются.
+    Строка адресуется порядковым номером seq, который не меняется при вытеснении старых строк
+    """
+
+    ROW_FIELDS = ("time", "dir", "frameId", "pgn", "src", "dst", "j1939", "dlc", "uds", "data",
+                  "dirColor", "dirBg", "dirBorder")
+
+    # Поля, текст которых определяется одним сырым значением: фильтр ведёт индекс по этому значению
+    KEYED_FIELDS = {
+        "dir": "direction",
+        "frameId": "identifier",
+        "pgn": "identifier",
+        "src": "identifier",
+        "dst": "identifier",
+        "dlc": "dlc",
+    }
+
+    DEFAULT_CAPACITY = 1000000
+    ROW_CACHE_SIZE = 1024
+
+    def __init__(self, summarize: Callable[[int | None, bytes], tuple[str, str]], capacity: int = DEFAULT_CAPACITY):
+        """
+        :param summarize: разбор данных кадра (PGN или None, данные) -> (текст J1939, текст UDS/ISO-TP);
+            пустая строка - нет разбора
+        :param capacity: ёмкость буфера, кадров
+        """
+        self._summarize = summarize
+        self._capacity = max(int(capacity), 1)
+        # Колонки растут до ёмкости, дальше ячейки перезаписываются по кругу
+        self._timestamp_us = array("q")
+        self._identifier = array("I")
+        self._direction = array("B")
+        self._dlc = array("B")
+        self._length = array("B")
+        self._data = bytearray()
+        self._long_payloads: dict[int, bytes] = {}  # seq -> данные длиннее INLINE_DATA_LENGTH
+        self._base_seq = 0  # seq кадра в ячейке 0
+        self._first_seq = 0
+        self._end_seq = 0
+        self._evicted = 0
+
+        # идентификатор -> (PGN или None, тексты frameId, pgn, src, dst)
+        self._identifier_info: dict[int, tuple[int | None, str, str, str, str]] = {}
+        self._rows: OrderedDict[int, dict[str, str]] = OrderedDict()
+        self._time_second = -1  # секунда последнего форматирования времени и её текст
+        self._time_second_text = ""
+
+    def __len__(self) -> int:
+        return self._end_seq - self._first_seq
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def evicted(self) -> int:
+        """
+        Число кадров, вытесненных из буфера после последней очистки
+        """
+        return self._evicted
+
+    @property
+    def first_seq(self) -> int:
+        return self._first_seq
+
+    @property
+    def end_seq(self) -> int:
+        return self._end_seq
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Объём колонок, байт
+        """
+        columns = (self._timestamp_us, self._identifier, self._direction, self._dlc, self._length)
+        return (sum(column.itemsize * len(column) for column in columns) + len(self._data)
+                + sum(len(payload) for payload in self._long_payloads.values()))
+
+    def append(self, timestamp_us: int, identifier: int, direction: int, dlc: int, payload: bytes) -> int:
+        """
+        Добавление кадра без форматирования; при заполненном буфере вытесняется самый старый кадр
+        :param timestamp_us: время по часам компьютера, мкс от эпохи Unix
+        :param direction: DIRECTION_*
+        :return: seq строки
+        """
+        if self._end_seq - self._first_seq == self._capacity:
+            evicted_seq = self._first_seq
+            if self._long_payloads:
+                self._long_payloads.pop(evicted_seq, None)
+            self._rows.pop(evicted_seq, None)
+            self._first_seq += 1
+            self._evicted += 1
+
+        seq = self._end_seq
+        slot = (seq - self._base_seq) % self._capacity
+        length = len(payload)
+        if length > INLINE_DATA_LENGTH:
+            self._long_payloads[seq] = bytes(payload)
+            inline = bytes(payload[:INLINE_DATA_LENGTH])
+        else:
+            inline = bytes(payload).ljust(INLINE_DATA_LENGTH, b"\0")
+
+        if slot == len(self._identifier):
+            self._timestamp_us.append(int(timestamp_us))
+            self._identifier.append(int(identifier) & 0x1FFFFFFF)
+            self._direction.append(direction)
+            self._dlc.append(int(dlc) & 0xFF)
+            self._length.append(min(length, 0xFF))
+            self._data += inline
+        else:
+            self._timestamp_us[slot] = int(timestamp_us)
+            self._identifier[slot] = int(identifier) & 0x1FFFFFFF
+            self._direction[slot] = direction
+            self._dlc[slot] = int(dlc) & 0xFF
+            self._length[slot] = min(length, 0xFF)
+            offset = slot * INLINE_DATA_LENGTH
+            self._data[offset:offset + INLINE_DATA_LENGTH] = inline
+        self._end_seq += 1
+        return seq
+
+    def clear(self):
+        """
+        Очистка журнала; порядковые номера продолжаются, счётчик вытесненных кадров сбрасывается
+        """
+        self._timestamp_us = array("q")
+        self._identifier = array("I")
+        self._direction = array("B")
+        self._dlc = array("B")
+        self._length = array("B")
+        self._data = bytearray()
+        self._long_payloads = {}
+        self._rows.clear()
+        self._base_seq = self._first_seq = self._end_seq
+        self._evicted = 0
+
+    def set_capacity(self, capacity: int):
+        """
+        Смена ёмкости с сохранением последних кадров (перекладка колонок, O(N))
+        """
+        capacity = max(int(capacity), 1)
+        if capacity == self._capacity:
+            return
+        first_seq = max(self._first_seq, self._end_seq - capacity)
+        frames = [(self.timestamp_us(seq), self.identifier(seq), self.direction(seq), self.dlc(seq), self.payload(seq))
+                  for seq in range(first_seq, self._end_seq)]
+        evicted = self._evicted + (first_seq - self._first_seq)
+        self._end_seq = first_seq
+        self.clear()
+        self._capacity = capacity
+        for frame in frames:
+            self.append(*frame)
+        self._evicted = evicted
+
+    def _slot(self, seq: int) -> int:
+        return (seq - self._base_seq) % self._capacity
+
+    def identifier(self, seq: int) -> int:
+        return self._identifier[self._slot(seq)]
+
+    def direction(self, seq: int) -> int:
+        return self._direction[self._slot(seq)]
+
+    def dlc(self, seq: int) -> int:
+        return self._dlc[self._slot(seq)]
+
+    def timestamp_us(self, seq: int) -> int:
+        return self._timestamp_us[self._slot(seq)]
+
+    def payload(self, seq: int) -> bytes:
+        slot = self._slot(seq)
+        length = self._length[slot]
+        if length > INLINE_DATA_LENGTH:
+            return self._long_payloads[seq]
+        offset = slot * INLINE_DATA_LENGTH
+        return bytes(self._data[offset:offset + length])
+
+    def key(self, seq: int, field: str) -> int:
+        """
+        Сырое значение, определяющее текст поля из KEYED_FIELDS
+        """
+        kind = self.KEYED_FIELDS[field]
+        if kind == "identifier":
+            return self.identifier(seq)
+        if kind == "direction":
+            return self.direction(seq)
+        return self.dlc(seq)
+
+    def key_text(self, field: str, key: int) -> str:
+        """
+        Текст поля из KEYED_FIELDS по сырому значению
+        """
+        if field == "dir":
+            return DIRECTION_TEXTS.get(key, "-")
+        if field == "dlc":
+            return str(key)
+        _, frame_id, pgn, src, dst = self._describe_identifier(key)
+        return {"frameId": frame_id, "pgn": pgn, "src": src, "dst": dst}[field]
+
+    def text(self, seq: int, field: str) -> str:
+        """
+        Текст одного поля строки (без формирования остальных полей)
+        """
+        row = self._rows.get(seq)
+        if row is not None:
+            return row[field]
+        if not self._first_seq <= seq < self._end_seq:
+            # Строка вытеснена, а представление ещё не получило её удаление
+            return ""
+        if field in self.KEYED_FIELDS:
+            return self.key_text(field, self.key(seq, field))
+        if field == "time":
+            return self._format_time(self.timestamp_us(seq))
+        if field == "data":
+            return self.payload(seq).hex(" ").upper()
+        if field in ("j1939", "uds"):
+            j1939_text, uds_text = self._summaries(seq)
+            return j1939_text if field == "j1939" else uds_text
+        text_color, background, border = DIRECTION_COLORS.get(self.direction(seq), DIRECTION_COLORS[DIRECTION_NONE])
+        return {"dirColor": text_color, "dirBg": background, "dirBorder": border}[field]
+
+    def row(self, seq: int) -> dict[str, str]:
+        """
+        Все поля отображения строки; результат кэшируется для последних ROW_CACHE_SIZE строк
+        """
+        row = self._rows.get(seq)
+        if row is not None:
+            self._rows.move_to_end(seq)
+            return row
+        if not self._first_seq <= seq < self._end_seq:
+            return dict.fromkeys(self.ROW_FIELDS, "")
+
+        direction = self.direction(seq)
+        _, frame_id, pgn, src, dst = self._describe_identifier(self.identifier(seq))
+        j1939_text, uds_text = self._summaries(seq)
+        text_color, background, border = DIRECTION_COLORS.get(direction, DIRECTION_COLORS[DIRECTION_NONE])
+        row = {
+            "time": self._format_time(self.timestamp_us(seq)),
+            "dir": DIRECTION_TEXTS.get(direction, "-"),
+            "frameId": frame_id,
+            "pgn": pgn,
+            "src": src,
+            "dst": dst,
+            "j1939": j1939_text,
+            "dlc": str(self.dlc(seq)),
+            "uds": uds_text,
+            "data": self.payload(seq).hex(" ").upper(),
+            "dirColor": text_color,
+            "dirBg": background,
+            "dirBorder": border,
+        }
+        self._rows[seq] = row
+        if len(self._rows) > self.ROW_CACHE_SIZE:
+            self._rows.popitem(last=False)
+        return row
+
+    def _summaries(self, seq: int) -> tuple[str, str]:
+        pgn = self._describe_identifier(self.identifier(seq))[0]
+        j1939_text, uds_text = self._summarize(pgn, self.payload(seq))
+        return j1939_text or "-", uds_text or "-"
+
+    def _describe_identifier(self, identifier: int) -> tuple[int | None, str, str, str, str]:
+        info = self._identifier_info.get(identifier)
+        if info is None:
+            try:
+                parsed_id = J1939CanIdentifier(identifier)
+                pgn = int(parsed_id.pgn) & 0x3FFFF
+                info = (pgn, f"0x{identifier:08X}", f"0x{pgn & 0xFFFF:04X}",
+                        f"0x{int(parsed_id.src) & 0xFF:02X}", f"0x{int(parsed_id.dst) & 0xFF:02X}")
+            except Exception:
+                info = (None, f"0x{identifier:08X}", "-", "-", "-")
+            self._identifier_info[identifier] = info
+        return info
+
+    def _format_time(self, timestamp_us: int) -> str:
+        # Соседние кадры обычно в одной секунде: datetime нужен только при смене секунды
+        second, microseconds = divmod(timestamp_us, 1000000)
+        if second != self._time_second:
+            try:
+                self._time_second_text = datetime.fromtimestamp(second).strftime("%H:%M:%S")
+            except (OverflowError, OSError, ValueError):
+                return str(timestamp_us)
+            self._time_second = second
+        return f"{self._time_second_text}.{microseconds // 1000:03d}"
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+
+from ui.qml.can_trace_store import CanTraceStore
+
+
+class CanTrafficFilterIndex:
+    """
+    Отфильтрованный вид журнала CAN (порядковые номера строк CanTraceStore) с инвертированными индексами.
+    Для полей, текст которых определяется сырым значением (идентификатор, направление, DLC), хранится:
+    сырое значение -> порядковые номера строк; смена фильтра форматирует только различные значения.
+    Остальные поля (время, данные, разбор J1939 и ISO-TP) проверяются по строкам, оставшимся после индексов.
+    Пока фильтры не заданы, новые строки не форматируются.
+    Строки, вытесненные из кольцевого буфера журнала, убираются из начала вида сдвигом смещения;
+    массивы вида и индексов уплотняются, когда вытесненная часть сравнивается с живой
+    """
+
+    MIN_COMPACTION = 4096
+
+    def __init__(self, store: CanTraceStore, fields: Iterable[str]):
+        self._store = store
+        self._fields = tuple(fields)
+        self._keyed_fields = tuple(field for field in self._fields if field in store.KEYED_FIELDS)
+        # Поля, разделяющие одно сырое значение (frameId/pgn/src/dst), используют общий индекс
+        self._key_kinds = tuple(sorted({store.KEYED_FIELDS[field] for field in self._keyed_fields}))
+        self._kind_fields = {kind: next(field for field in self._keyed_fields if store.KEYED_FIELDS[field] == kind)
+                             for kind in self._key_kinds}
+        self._postings: dict[str, dict[int, array]] = {kind: {} for kind in self._key_kinds}
+        self._postings_floor = store.first_seq  # в индексах могут быть номера, начиная с этого
+        self._filters: dict[str, str] = {}
+        self._filtered = array("q")
+        self._filtered_start = 0  # начало отфильтрованного вида в self._filtered
+
+    @property
+    def store(self) -> CanTraceStore:
+        return self._store
+
+    @property
+    def count(self) -> int:
+        """
+        Число строк отфильтрованного вида
+        """
+        return len(self._filtered) - self._filtered_start
+
+    def seq_at(self, row: int) -> int:
+        """
+        Порядковый номер строки журнала по номеру строки отфильтрованного вида
+        """
+        return self._filtered[self._filtered_start + row]
+
+    @property
+    def has_filters(self) -> bool:
+        return bool(self._filters)
+
+    def append(self, seq: int) -> bool:
+        """
+        Учёт строки, добавленной в журнал
+        :return: True, если строка попала в отфильтрованный вид
+        """
+        store = self._store
+        for kind, postings in self._postings.items():
+            key = store.key(seq, self._kind_fields[kind])
+            seqs = postings.get(key)
+            if seqs is None:
+                postings[key] = array("q", (seq,))
+            else:
+                seqs.append(seq)
+
+        for field, needle in self._filters.items():
+            if needle not in store.text(seq, field).lower():
+                return False
+        self._filtered.append(seq)
+        return True
+
+    def filtered_before(self, seq: int) -> int:
+        """
+        Число строк отфильтрованного вида с порядковым номером меньше seq
+        """
+        return bisect_left(self._filtered, seq, self._filtered_start) - self._filtered_start
+
+    def evict_before(self, seq: int) -> int:
+        """
+        Удаление из вида строк, вытесненных из журнала
+        :param seq: первый порядковый номер, оставшийся в журнале
+        :return: число строк, удалённых из начала вида
+        """
+        start = bisect_left(self._filtered, seq, self._filtered_start)
+        removed = start - self._filtered_start
+        self._filtered_start = start
+        if start >= self.MIN_COMPACTION and start * 2 >= len(self._filtered):
+            del self._filtered[:start]
+            self._filtered_start = 0
+
+        if seq - self._postings_floor >= max(self._store.end_seq - seq, self.MIN_COMPACTION):
+            for postings in self._postings.values():
+                for key in list(postings):
+                    seqs = postings[key]
+                    count = bisect_left(seqs, seq)
+                    if count == len(seqs):
+                        del postings[key]
+                    elif count:
+                        del seqs[:count]
+            self._postings_floor = seq
+        return removed
+
+    def reset(self):
+        """
+        Перестроение индексов и отфильтрованного вида по текущему содержимому журнала
+        """
+        self._postings = {kind: {} for kind in self._key_kinds}
+        self._postings_floor = self._store.first_seq
+        self._filtered = array("q")
+        self._filtered_start = 0
+        for seq in range(self._store.first_seq, self._store.end_seq):
+            self.append(seq)
+
+    def set_filters(self, filters: dict[str, str]) -> array:
+        """
+        Применение фильтров (подстрока без учёта регистра, условия полей объединяются по И)
+        :param filters: поле -> подстрока в нижнем регистре; пустые значения не фильтруют
+        :return: отфильтрованный вид
+        """
+        store = self._store
+        first_seq = store.first_seq
+        self._filters = {field: value for field, value in filters.items() if value and field in self._fields}
+        self._filtered_start = 0
+        if not self._filters:
+            self._filtered = array("q", range(first_seq, store.end_seq))
+            return self._filtered
+
+        candidates: list[array] = []
+        for field, needle in self._filters.items():
+            if field not in self._keyed_fields:
+                continue
+            kind = store.KEYED_FIELDS[field]
+            matched = array("q")
+            for key, seqs in self._postings[kind].items():
+                if needle in store.key_text(field, key).lower():
+                    # Номера вытесненных строк ещё могут оставаться в начале списка до уплотнения
+                    matched.extend(seqs[bisect_left(seqs, first_seq):] if self._postings_floor < first_seq else seqs)
+            if not matched:
+                self._filtered = array("q")
+                return self._filtered
+            candidates.append(matched)
+
+        if candidates:
+            # Пересечение начинается с самого короткого списка совпадений
+            candidates.sort(key=len)
+            selected = set(candidates[0])
+            for other in candidates[1:]:
+                selected.intersection_update(other)
+                if not selected:
+                    break
+            rows: Iterable[int] = sorted(selected)
+        else:
+            rows = range(first_seq, store.end_seq)
+
+        scanned = [(field, needle) for field, needle in self._filters.items() if field not in self._keyed_fields]
+        if scanned:
+            rows = [seq for seq in rows
+                    if all(needle in store.text(seq, field).lower() for field, needle in scanned)]
+        self._filtered = array("q", rows)
+        return self._filtered
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+
+from PySide6.QtCore import QAbstractListModel, QByteArray, QModelIndex, QObject, Qt, Property, Signal
+
+from ui.qml.can_trace_store import CanTraceStore
+from ui.qml.can_traffic_filter import CanTrafficFilterIndex
+
+
+class CanTrafficModel(QAbstractListModel):
+    """
+    Модель журнала CAN для ListView: отфильтрованный вид CanTrafficFilterIndex с ролями по полям строки.
+    Кадры хранятся в колонках CanTraceStore; текст строки формируется, когда представление запрашивает роль.
+    Добавленные строки публикуются пачкой через beginInsertRows/endInsertRows (flush),
+    поэтому в QML передаются только новые строки, а делегаты существующих не пересоздаются;
+    строки, вытесненные из кольцевого буфера журнала, удаляются там же через beginRemoveRows.
+    Смена фильтров, ёмкости и очистка журнала сбрасывают модель
+    """
+
+    ROLE_FIELDS = CanTraceStore.ROW_FIELDS
+
+    countChanged = Signal()
+
+    def __init__(self, filter_fields: Iterable[str], summarize: Callable[[int | None, bytes], tuple[str, str]],
+                 capacity: int = CanTraceStore.DEFAULT_CAPACITY, parent: QObject | None = None):
+        """
+        :param summarize: разбор данных кадра для CanTraceStore
+        :param capacity: ёмкость журнала, кадров
+        """
+        super().__init__(parent)
+        self._store = CanTraceStore(summarize, capacity)
+        self._traffic = CanTrafficFilterIndex(self._store, filter_fields)
+        self._published = 0  # число строк отфильтрованного вида, о которых знают представления
+        self._role_fields = {Qt.ItemDataRole.UserRole + 1 + i: field for i, field in enumerate(self.ROLE_FIELDS)}
+        self._role_names = {role: QByteArray(field.encode()) for role, field in self._role_fields.items()}
+
+    @property
+    def store(self) -> CanTraceStore:
+        return self._store
+
+    @property
+    def traffic(self) -> CanTrafficFilterIndex:
+        return self._traffic
+
+    @Property(int, notify=countChanged)
+    def count(self):
+        return self._published
+
+    @Property(int, notify=countChanged)
+    def totalCount(self):
+        return len(self._store)
+
+    @Property(int, notify=countChanged)
+    def evictedCount(self):
+        return self._store.evicted
+
+    @Property(int, notify=countChanged)
+    def capacity(self):
+        return self._store.capacity
+
+    def roleNames(self):
+        return self._role_names
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._published
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < self._published:
+            return None
+        field = self._role_fields.get(role)
+        if field is None:
+            return None
+        return self._store.row(self._traffic.seq_at(index.row()))[field]
+
+    def append(self, timestamp_us: int, identifier: int, direction: int, dlc: int, payload: bytes) -> int:
+        """
+        Добавление кадра в журнал; в представлениях он появится после flush
+        :return: seq строки в CanTraceStore
+        """
+        seq = self._store.append(timestamp_us, identifier, direction, dlc, payload)
+        self._traffic.append(seq)
+        return seq
+
+    def flush(self):
+        """
+        Удаление из представлений вытесненных строк и публикация строк,
+        попавших в отфильтрованный вид после прошлого вызова
+        """
+        first_seq = self._store.first_seq
+        # Опубликованные строки - начало вида: вытесненные строки сначала уходят из них
+        removed = min(self._traffic.filtered_before(first_seq), self._published)
+        if removed:
+            self.beginRemoveRows(QModelIndex(), 0, removed - 1)
+        self._traffic.evict_before(first_seq)
+        if removed:
+            self._published -= removed
+            self.endRemoveRows()
+
+        available = self._traffic.count
+        if available > self._published:
+            self.beginInsertRows(QModelIndex(), self._published, available - 1)
+            self._published = available
+            self.endInsertRows()
+        self.countChanged.emit()
+
+    def clear(self):
+        """
+        Очистка журнала со сбросом модели
+        """
+        self.beginResetModel()
+        self._store.clear()
+        self._traffic.reset()
+        self._published = 0
+        self.endResetModel()
+        self.countChanged.emit()
+
+    def set_capacity(self, capacity: int):
+        """
+        Смена ёмкости журнала с сохранением последних кадров и сбросом модели
+        """
+        self.beginResetModel()
+        self._store.set_capacity(capacity)
+        self._traffic.reset()
+        self._published = self._traffic.count
+        self.endResetModel()
+        self.countChanged.emit()
+
+    def set_filters(self, filters: dict[str, str]):
+        """
+        Применение фильтров со сбросом модели
+        :param filters: поле -> подстрока в нижнем регистре; пустые значения не фильтруют
+        """
+        self.beginResetModel()
+        self._traffic.set_filters(filters)
+        self._published = self._traffic.count
+        self.endResetModel()
+        self.countChanged.emit()
@@ -118,5 +118,70 @@ Card {
                 onClicked: if (root.appController) root.appController.resetObservedUdsCandidate()
             }
         }
+
+        // Пакетное программирование: найденные узлы прошиваются параллельно на одном канале.
+        Text {
+            text: root.appController ? root.appController.batchTargetsText : "Пакет пуст"
+            color: root.textSoft
+            font.pixelSize: 11
+            font.family: "Bahnschrift"
+            Layout.fillWidth: true
+            wrapMode: Text.WordWrap
+        }
+
+        RowLayout {
+            Layout.fillWidth: true
+            spacing: 8
+
+            FancyButton {
+                Layout.fillWidth: true
+                Layout.minimumWidth: 96
+                text: "В пакет"
+                enabled: root.controlsEnabled
+                         && root.appController !== null
+                         && root.appController.observedUdsCandidateAvailable
+                tone: "#0284c7"
+                toneHover: "#0369a1"
+                tonePressed: "#075985"
+                onClicked: if (root.appController) root.appController.addObservedCandidateToBatch()
+            }
+
+            FancyButton {
+                Layout.fillWidth: true
+                Layout.minimumWidth: 96
+                text: "Все в пакет"
+                enabled: root.controlsEnabled
+                         && root.appController !== null
+                         && root.appController.observedUdsCandidates.length > 0
+                tone: "#0284c7"
+                toneHover: "#0369a1"
+                tonePressed: "#075985"
+                onClicked: if (root.appController) root.appController.addAllObservedCandidatesToBatch()
+            }
+
+            FancyButton {
+                Layout.fillWidth: true
+                Layout.minimumWidth: 96
+                text: "Очистить"
+                enabled: root.controlsEnabled && root.appController !== null && root.appController.batchTargetCount > 0
+                tone: "#64748b"
+                toneHover: "#475569"
+                tonePressed: "#334155"
+                onClicked: if (root.appController) root.appController.clearBatchTargets()
+            }
+        }
+
+        FancyButton {
+            Layout.fillWidth: true
+            text: "Программировать пакет"
+            enabled: root.controlsEnabled
+                     && root.appController !== null
+                     && root.appController.batchTargetCount > 0
+                     && !root.appController.firmwareLoading
+            tone: "#10b981"
+            toneHover: "#059669"
+            tonePressed: "#047857"
+            onClicked: if (root.appController) root.appController.startBatchProgramming()
+        }
     }
 }
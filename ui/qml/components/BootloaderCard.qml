@@ -12,8 +12,9 @@ import "."
   - отображение журнала состояний.
 
   Контракт:
-  - appController предоставляет методы startProgramming/checkState/resetToBootloader/
-    resetToMainProgram/clearLogs и свойства firmwarePath/progressValue/progressMax/logs/programmingActive.
+  - appController предоставляет методы startProgramming/resumeProgramming/checkState/resetToBootloader/
+    resetToMainProgram/clearLogs и свойства firmwarePath/progressValue/progressMax/logs/programmingActive/
+    resumeAvailable.
 
   Сигналы:
   - openFirmwareDialogRequested: пробрасывается в Main.qml,
@@ -199,6 +200,20 @@ Card {
                 tonePressed: "#047857"
                 onClicked: if (root.appController) root.appController.startProgramming()
             }
+
+            // Продолжение прерванной загрузки без очистки памяти (по журналу рядом с BIN).
+            FancyButton {
+                Layout.fillWidth: true
+                text: "Продолжить загрузку"
+                Layout.preferredWidth: 1
+                Layout.minimumWidth: 0
+                visible: root.appController ? root.appController.resumeAvailable : false
+                enabled: root.appController ? (!root.appController.programmingActive && !root.appController.firmwareLoading) : false
+                tone: "#f59e0b"
+                toneHover: "#d97706"
+                tonePressed: "#b45309"
+                onClicked: if (root.appController) root.appController.resumeProgramming()
+            }
         }
 
         // Быстрые reset-команды ЭБУ.
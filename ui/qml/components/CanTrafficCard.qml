@@ -241,7 +241,7 @@ Card {
                                 anchors.bottomMargin: 6
                                 clip: true
                                 spacing: 3
-                                model: root.appController ? root.appController.filteredCanTrafficLogs : []
+                                model: root.appController ? root.appController.canTrafficModel : null
 
                                 onCountChanged: if (count > 0) positionViewAtEnd()
 
@@ -259,34 +259,34 @@ Card {
                                         anchors.rightMargin: root.headerRightPadding
                                         spacing: root.rowSpacing
 
-                                        Text { text: modelData.time ? modelData.time : ""; Layout.preferredWidth: root.colTime; color: root.textSoft; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
+                                        Text { text: model.time ? model.time : ""; Layout.preferredWidth: root.colTime; color: root.textSoft; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
 
                                         Rectangle {
                                             Layout.preferredWidth: root.colDir
                                             Layout.preferredHeight: 20
                                             radius: 8
-                                            color: modelData.dirBg ? modelData.dirBg : "#e2e8f0"
-                                            border.color: modelData.dirBorder ? modelData.dirBorder : "#cbd5e1"
+                                            color: model.dirBg ? model.dirBg : "#e2e8f0"
+                                            border.color: model.dirBorder ? model.dirBorder : "#cbd5e1"
                                             border.width: 1
 
                                             Text {
                                                 anchors.centerIn: parent
-                                                text: modelData.dir ? modelData.dir : "-"
-                                                color: modelData.dirColor ? modelData.dirColor : "#334155"
+                                                text: model.dir ? model.dir : "-"
+                                                color: model.dirColor ? model.dirColor : "#334155"
                                                 font.pixelSize: 11
                                                 font.bold: true
                                                 font.family: "Consolas"
                                             }
                                         }
 
-                                        Text { text: modelData.frameId ? modelData.frameId : ""; Layout.preferredWidth: root.colId; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
-                                        Text { text: modelData.pgn ? modelData.pgn : ""; Layout.preferredWidth: root.colPgn; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
-                                        Text { text: modelData.src ? modelData.src : ""; Layout.preferredWidth: root.colSrc; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
-                                        Text { text: modelData.dst ? modelData.dst : ""; Layout.preferredWidth: root.colDst; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
-                                        Text { text: modelData.j1939 ? modelData.j1939 : ""; Layout.preferredWidth: root.colJ1939; color: "#334155"; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
-                                        Text { text: modelData.dlc ? modelData.dlc : ""; Layout.preferredWidth: root.colDlc; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; horizontalAlignment: Text.AlignHCenter; verticalAlignment: Text.AlignVCenter }
-                                        Text { text: modelData.uds ? modelData.uds : ""; Layout.preferredWidth: root.colUds; color: "#475569"; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
-                                        Text { text: modelData.data ? modelData.data : ""; Layout.fillWidth: true; Layout.minimumWidth: root.minimumDataColumnWidth; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
+                                        Text { text: model.frameId ? model.frameId : ""; Layout.preferredWidth: root.colId; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
+                                        Text { text: model.pgn ? model.pgn : ""; Layout.preferredWidth: root.colPgn; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
+                                        Text { text: model.src ? model.src : ""; Layout.preferredWidth: root.colSrc; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
+                                        Text { text: model.dst ? model.dst : ""; Layout.preferredWidth: root.colDst; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
+                                        Text { text: model.j1939 ? model.j1939 : ""; Layout.preferredWidth: root.colJ1939; color: "#334155"; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
+                                        Text { text: model.dlc ? model.dlc : ""; Layout.preferredWidth: root.colDlc; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; horizontalAlignment: Text.AlignHCenter; verticalAlignment: Text.AlignVCenter }
+                                        Text { text: model.uds ? model.uds : ""; Layout.preferredWidth: root.colUds; color: "#475569"; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
+                                        Text { text: model.data ? model.data : ""; Layout.fillWidth: true; Layout.minimumWidth: root.minimumDataColumnWidth; color: root.textMain; font.pixelSize: 12; font.family: "Consolas"; elide: Text.ElideRight; verticalAlignment: Text.AlignVCenter }
                                     }
                                 }
 
@@ -323,12 +323,94 @@ Card {
             }
 
             Text {
-                text: root.appController ? ("Записей: " + trafficList.count + " / " + root.appController.canTrafficLogs.length) : ("Записей: " + trafficList.count)
+                text: root.appController ? ("Записей: " + trafficList.count + " / " + root.appController.canTrafficModel.totalCount) : ("Записей: " + trafficList.count)
                 color: "#7489a1"
                 font.pixelSize: 10
                 font.family: "Bahnschrift"
             }
 
+            // Журнал - кольцевой буфер: при заполнении самые старые кадры вытесняются по одному.
+            Text {
+                text: "Вытеснено: " + (root.appController ? root.appController.canTrafficModel.evictedCount : 0)
+                visible: root.appController ? root.appController.canTrafficModel.evictedCount > 0 : false
+                color: "#b45309"
+                font.pixelSize: 10
+                font.family: "Bahnschrift"
+            }
+
+            Text {
+                text: "Буфер"
+                color: "#7489a1"
+                font.pixelSize: 10
+                font.family: "Bahnschrift"
+            }
+
+            FilterComboBox {
+                id: capacityCombo
+                Layout.preferredWidth: 90
+                popupMinWidth: 90
+                model: root.appController ? root.appController.canTraceCapacityOptions : []
+                currentIndex: root.appController ? root.appController.canTraceCapacityOptions.indexOf(root.appController.canTraceCapacity) : -1
+                onActivated: if (root.appController) root.appController.setCanTraceCapacity(capacityCombo.model[capacityCombo.currentIndex])
+            }
+
+            Rectangle {
+                id: recordCanButton
+                implicitWidth: 96
+                implicitHeight: 24
+                radius: 7
+                property bool recording: root.appController ? root.appController.traceRecording : false
+                color: recordCanArea.pressed ? "#fde8e8" : (recording ? "#fef2f2" : (recordCanArea.containsMouse ? "#f1f6fd" : "#ffffff"))
+                border.color: recording ? "#fca5a5" : (recordCanArea.containsMouse ? "#a7bdd4" : "#cfdbe7")
+                border.width: 1
+
+                Text {
+                    anchors.centerIn: parent
+                    text: root.appController ? root.appController.traceRecordingButtonText : "Запись"
+                    color: recordCanButton.recording ? "#b91c1c" : (recordCanArea.containsMouse ? "#334155" : "#51657a")
+                    font.pixelSize: 10
+                    font.bold: true
+                    font.family: "Bahnschrift"
+                }
+
+                MouseArea {
+                    id: recordCanArea
+                    anchors.fill: parent
+                    hoverEnabled: true
+                    cursorShape: Qt.PointingHandCursor
+                    onClicked: if (root.appController) root.appController.toggleTraceRecording()
+                }
+            }
+
+            Rectangle {
+                id: exportCanButton
+                implicitWidth: 96
+                implicitHeight: 24
+                radius: 7
+                enabled: root.appController ? root.appController.traceExportAvailable : false
+                opacity: enabled ? 1.0 : 0.5
+                color: exportCanArea.pressed ? "#e8eff8" : (exportCanArea.containsMouse ? "#f1f6fd" : "#ffffff")
+                border.color: exportCanArea.containsMouse ? "#a7bdd4" : "#cfdbe7"
+                border.width: 1
+
+                Text {
+                    anchors.centerIn: parent
+                    text: "Экспорт ASC"
+                    color: exportCanArea.containsMouse ? "#334155" : "#51657a"
+                    font.pixelSize: 10
+                    font.bold: true
+                    font.family: "Bahnschrift"
+                }
+
+                MouseArea {
+                    id: exportCanArea
+                    anchors.fill: parent
+                    hoverEnabled: true
+                    cursorShape: Qt.PointingHandCursor
+                    onClicked: if (root.appController) root.appController.exportTraceRecording()
+                }
+            }
+
             Rectangle {
                 id: clearCanButton
                 implicitWidth: 116
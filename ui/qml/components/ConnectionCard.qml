@@ -137,7 +137,7 @@ Card {
                 tonePressed: "#166534"
                 onClicked: {
                     if (root.appController) {
-                        root.appController.toggleTrace(channelCombo.currentIndex, parseInt(baudCombo.currentText), terminatorSwitch.checked)
+                        root.appController.toggleTrace(channelCombo.currentIndex, parseInt(baudCombo.currentText), terminatorSwitch.checked, fifoSwitch.checked)
                     }
                 }
             }
@@ -243,6 +243,33 @@ Card {
             }
         }
 
+        // Режим приёма: callback драйвера на каждый кадр или пакетное чтение FIFO в отдельном потоке.
+        RowLayout {
+            Layout.fillWidth: true
+            spacing: 8
+
+            Text {
+                text: "Пакетное чтение FIFO (высокая загрузка шины)"
+                color: root.textSoft
+                font.pixelSize: 12
+                font.family: "Bahnschrift"
+                wrapMode: Text.WordWrap
+                Layout.fillWidth: true
+            }
+
+            FancySwitch {
+                id: fifoSwitch
+                trackWidth: 48
+                trackHeight: 26
+                onColor: "#0ea5e9"
+                offColor: "#e4ecf7"
+                borderOnColor: "#0284c7"
+                borderOffColor: "#c0d1e4"
+                checked: false
+                enabled: root.appController ? !root.appController.tracing : true
+            }
+        }
+
         // Техническая информация о выбранном устройстве.
         Rectangle {
             Layout.fillWidth: true
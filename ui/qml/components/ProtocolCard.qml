@@ -7,7 +7,8 @@ import "."
   Карточка параметров протокола UDS.
   Назначение:
   - изменение Source Address (CAN SA) через WriteDataById;
-  - выбор порядка байтов для передачи блоков bootloader-сессии.
+  - выбор порядка байтов для передачи блоков bootloader-сессии;
+  - ограничение размера блока TransferData (по умолчанию - maxNumberOfBlockLength от ЭБУ).
 */
 Card {
     id: root
@@ -140,6 +141,29 @@ Card {
             onActivated: if (root.appController) root.appController.setTransferByteOrderIndex(currentIndex)
         }
 
+        Text {
+            text: "Макс. размер блока TransferData, байт (пусто - по ответу ЭБУ)"
+            color: root.textSoft
+            font.pixelSize: 12
+            font.family: "Bahnschrift"
+            wrapMode: Text.WordWrap
+            Layout.fillWidth: true
+        }
+
+        FancyTextField {
+            id: blockLimitField
+            Layout.fillWidth: true
+            Layout.minimumWidth: 0
+            text: root.appController ? root.appController.transferBlockLimitText : ""
+            placeholderText: "3..4095"
+            enabled: root.appController ? !root.appController.programmingActive : false
+            textColor: root.textMain
+            bgColor: root.inputBg
+            borderColor: root.inputBorder
+            focusBorderColor: root.inputFocus
+            onEditingFinished: if (root.appController) root.appController.setTransferBlockLimit(text)
+        }
+
     }
 
     Connections {
@@ -153,5 +177,14 @@ Card {
                 sourceAddressField.text = root.appController.sourceAddressText
             }
         }
+
+        function onTransferBlockLimitTextChanged() {
+            if (!root.appController) {
+                return
+            }
+            if (blockLimitField.text !== root.appController.transferBlockLimitText) {
+                blockLimitField.text = root.appController.transferBlockLimitText
+            }
+        }
     }
 }
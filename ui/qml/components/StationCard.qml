@@ -0,0 +1,146 @@
+import QtQuick 2.15
+import QtQuick.Controls 2.15
+import QtQuick.Layouts 1.15
+import "."
+
+/*
+  Карточка станции программирования.
+  Назначение:
+  - поиск всех каналов CAN на всех подключенных адаптерах;
+  - одновременное программирование узлов пакета (или узла из UDS идентификаторов) на каждом канале.
+
+  Контракт:
+  - appController предоставляет методы scanStationChannels/startStationProgramming/stopStationProgramming
+    и свойства stationChannels/batchTargetsText/programmingActive/firmwareLoading.
+*/
+Card {
+    id: root
+
+    property var appController
+    property color textMain: "#1f2d3d"
+    property color textSoft: "#607084"
+    property color inputBg: "#f7fbff"
+    property color inputBorder: "#c8d9ea"
+    property color inputFocus: "#0ea5e9"
+    readonly property int contentPadding: 12
+
+    readonly property bool busy: root.appController
+        ? (root.appController.programmingActive || root.appController.firmwareLoading) : true
+
+    Layout.fillWidth: true
+    implicitHeight: contentColumn.implicitHeight + (root.contentPadding * 2)
+
+    ColumnLayout {
+        id: contentColumn
+        anchors.left: parent.left
+        anchors.right: parent.right
+        anchors.top: parent.top
+        anchors.margins: root.contentPadding
+        spacing: 8
+
+        Text {
+            text: "Каждый канал программируется в своём потоке. Trace в окне должен быть остановлен."
+            color: root.textSoft
+            font.pixelSize: 12
+            font.family: "Bahnschrift"
+            wrapMode: Text.WordWrap
+            Layout.fillWidth: true
+        }
+
+        Text {
+            text: {
+                if (!root.appController || root.appController.stationChannels.length === 0) {
+                    return "Каналы не найдены"
+                }
+                return root.appController.stationChannels.join("\n")
+            }
+            color: root.textMain
+            font.pixelSize: 12
+            font.family: "Bahnschrift"
+            wrapMode: Text.WordWrap
+            Layout.fillWidth: true
+        }
+
+        Text {
+            text: root.appController ? root.appController.batchTargetsText : ""
+            color: root.textSoft
+            font.pixelSize: 11
+            font.family: "Bahnschrift"
+            wrapMode: Text.WordWrap
+            Layout.fillWidth: true
+        }
+
+        RowLayout {
+            Layout.fillWidth: true
+            spacing: 8
+
+            FancyComboBox {
+                id: stationBaudCombo
+                Layout.fillWidth: true
+                Layout.preferredWidth: 1
+                Layout.minimumWidth: 0
+                model: ["125", "250", "500", "1000"]
+                currentIndex: 2
+                textColor: root.textMain
+                bgColor: root.inputBg
+                borderColor: root.inputBorder
+                focusBorderColor: root.inputFocus
+            }
+
+            Text {
+                text: "Терминатор"
+                color: root.textSoft
+                font.pixelSize: 12
+                font.family: "Bahnschrift"
+            }
+
+            FancySwitch {
+                id: stationTerminatorSwitch
+                checked: true
+                enabled: !root.busy
+            }
+        }
+
+        RowLayout {
+            Layout.fillWidth: true
+            spacing: 8
+
+            FancyButton {
+                Layout.fillWidth: true
+                Layout.preferredWidth: 1
+                Layout.minimumWidth: 0
+                text: "Найти каналы"
+                enabled: !root.busy
+                tone: "#3b82f6"
+                toneHover: "#2563eb"
+                tonePressed: "#1d4ed8"
+                onClicked: if (root.appController) root.appController.scanStationChannels()
+            }
+
+            FancyButton {
+                Layout.fillWidth: true
+                Layout.preferredWidth: 1
+                Layout.minimumWidth: 0
+                text: "Запустить станцию"
+                enabled: !root.busy && root.appController && root.appController.stationChannels.length > 0
+                tone: "#10b981"
+                toneHover: "#059669"
+                tonePressed: "#047857"
+                onClicked: if (root.appController) root.appController.startStationProgramming(
+                    parseInt(stationBaudCombo.currentText), stationTerminatorSwitch.checked)
+            }
+
+            FancyButton {
+                Layout.fillWidth: true
+                Layout.preferredWidth: 1
+                Layout.minimumWidth: 0
+                text: "Остановить"
+                enabled: root.appController ? root.appController.programmingActive : false
+                tone: "#ef4444"
+                toneHover: "#dc2626"
+                tonePressed: "#b91c1c"
+                onClicked: if (root.appController) root.appController.stopStationProgramming()
+            }
+        }
+    }
+}